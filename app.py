@@ -1,278 +1,125 @@
-from flask import Flask, request, jsonify, render_template, send_from_directory, redirect, send_file
+from flask import Flask, Request, request, abort
 from flask_cors import CORS  # Allow WebGL CORS requests
 import os
-# import datetime
+import gc
 import logging
-import json
-from screenshot_handler import start_screenshot_capture, stop_screenshot_capture, get_screenshots_zip
-from datetime import datetime
+import importlib
+from precompress import precompress_tree
+from static_manifest import build_manifest
+from page_cache import compile_templates
+import request_metrics
+from routes import bp
 
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
+# Configure logging (set LOG_LEVEL=DEBUG and REQUEST_LOG_SAMPLE_RATE for verbose request logs)
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper())
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__, static_folder="static", template_folder="templates")
-CORS(app, resources={r"/*": {"origins": "*"}})  # Allow all CORS requests
-
-# Configure app
-app.config['PROPAGATE_EXCEPTIONS'] = True
-app.config['TEMPLATES_AUTO_RELOAD'] = True
-app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 0
-
-# Store received parameters - updated with default values for simulator page
-simulation_data = {
-    "SC": 800,
-    "BF": 300,
-    "AmpX": 0.2,
-    "AmpY": 1.0,
-    "AmpZ": 0.2,
-    "freqX": 1.0,
-    "freqY": 2.0,
-    "freqZ": 1.0,
-    "sphereCount": 0,
-    "rectangleCount": 0,
-    "quartersphereCount": 0,
-    "airfoilCount": 0,
-    "halfsphereCount": 0,
-    "pyramidCount": 0
-}
-
-@app.before_request
-def before_request():
-    """Automatically upgrade HTTP to HTTPS in production and log request info"""
-    logger.debug(f"Request URL: {request.url}")
-    logger.debug(f"Request path: {request.path}")
-    
-    if "localhost" not in request.url and "127.0.0.1" not in request.url and request.headers.get("X-Forwarded-Proto", "http") == "http":
-        url = request.url.replace("http://", "https://", 1)
-        return redirect(url, code=301)
-    
-@app.context_processor
-def inject_now():
-    return {'now': datetime.now()}
-
-# Error handler for bad requests
-@app.errorhandler(404)
-def handle_not_found(e):
-    logger.error(f"Not found: {request.path}")
-    return "", 404
-
-# Serve the Self-Organization page (main landing page)
-@app.route('/')
-def index():
-    logger.info("Index route accessed!")
-    return render_template('index.html')
-
-# Serve the simulator introduction page with "Go to Simulator Form" button
-@app.route('/simulator')
-def simulator():
-    return render_template('simulator.html')
-
-# Serve the simulator configuration form page
-@app.route('/simulator_form')
-def simulator_form():
-    return render_template('simulator-form.html', params=simulation_data)
-
-# Handle form submission and redirect to Unity WebGL game
-@app.route('/set-data', methods=['POST'])
-def set_data():
-    global simulation_data
-    simulation_data = request.json
-    print("Received Data:", simulation_data)
-    return jsonify({"message": "Data received!", "redirect_url": "/game"})
-
-# Unity WebGL fetches stored parameters
-@app.route('/get-data', methods=['GET'])
-def get_data():
-    return jsonify(simulation_data)
-
-# ✅ Serve Unity WebGL `index.html`
-@app.route('/game')
-def game():
-    return send_from_directory("static/Try_web_build", "index.html")
-
-# Allow direct access to favicon.ico
-@app.route('/favicon.ico')
-def favicon():
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Comma-separated origins allowed by CORS ("*" allows all, as the WebGL build needs by default)
+CORS_ORIGINS = os.environ.get('CORS_ORIGINS', '*')
+MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH', 16 * 1024 * 1024)) or None  # bytes; 0 means no limit
+# Upload routes that stream their bodies and enforce their own limits (MAX_UPLOAD_BYTES,
+# MAX_CHUNK_BYTES, MAX_FRAME_BYTES/MAX_MULTIPART_BYTES), so MAX_CONTENT_LENGTH does not apply to them
+STREAMING_ENDPOINTS = {'main.upload_frames', 'main.upload_chunk', 'main.upload_run_chunk'}
+# 'production' compiles templates once and serves cached renders; 'development' reloads templates
+RENDER_MODE = os.environ.get('RENDER_MODE', 'production')
+# Subsystems imported by create_app(warm=True) so preforked workers share them copy-on-write
+WARM_MODULES = [name for name in os.environ.get(
+    'WARM_MODULES',
+    'screenshot_handler,frame_ingest,run_store,metrics_ingest,run_analytics,cluster_timeline,'
+    'result_cache,telemetry,sweeps,surrogate,zip_stream,timelapse,video_upload,thumbnails'
+).split(',') if name]
+
+
+def warm_subsystems():
+    """Import the heavy subsystems now instead of on their first request"""
+    for name in WARM_MODULES:
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            logger.error(f"Error preloading {name}: {str(e)}")
+    # Keep everything loaded so far out of the collector, so gc passes in forked workers
+    # do not touch (and so copy) the pages these objects live on
+    gc.freeze()
+
+
+class AppRequest(Request):
+    @property
+    def max_content_length(self):
+        if self.endpoint in STREAMING_ENDPOINTS:
+            return None
+        return super().max_content_length
+
+
+def limit_request_size():
+    """413 for bodies over the limit up front; Werkzeug only applies it to form parsing"""
+    limit = request.max_content_length
+    if limit is not None and (request.content_length or 0) > limit:
+        abort(413)
+
+
+def create_app(socketio=None, warm=False, cors_origins=None, render_mode=None):
+    """Build the app; socketio defaults to the SOCKETIO env var, render_mode to RENDER_MODE, warm preloads WARM_MODULES"""
+    app = Flask(__name__,
+                static_folder=os.path.join(BASE_DIR, "static"),
+                template_folder=os.path.join(BASE_DIR, "templates"))
+
+    # Configure app
+    app.config['PROPAGATE_EXCEPTIONS'] = True
+    app.config['RENDER_MODE'] = render_mode or RENDER_MODE
+    app.config['TEMPLATES_AUTO_RELOAD'] = app.config['RENDER_MODE'] != 'production'
+    app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 0
+    app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
+    app.request_class = AppRequest
+
+    if cors_origins is None:
+        cors_origins = "*" if CORS_ORIGINS == "*" else CORS_ORIGINS.split(',')
+    CORS(app, resources={r"/*": {"origins": cors_origins}})
+    request_metrics.init_app(app)  # Latency/status/bytes counters, exported at /metrics
+    app.before_request(limit_request_size)
+
+    # Create .br/.gz siblings of the Unity build once per start (no-op when they are current)
     try:
-        logger.debug("Serving favicon.ico")
-        return send_from_directory(os.path.join(app.static_folder, "Try_web_build", "TemplateData"), "favicon.ico")
+        precompress_tree(os.path.join(app.static_folder, "Try_web_build"))
     except Exception as e:
-        logger.error(f"Error serving favicon: {str(e)}")
-        return "", 404
+        logger.error(f"Error precompressing Unity build: {str(e)}")
 
-# Serve style.css directly 
-@app.route('/style.css')
-def style_css():
-    try:
-        logger.debug("Serving style.css")
-        return send_from_directory(os.path.join(app.static_folder, "Try_web_build", "TemplateData"), "style.css")
-    except Exception as e:
-        logger.error(f"Error serving style.css: {str(e)}")
-        return "", 404
+    # Index static/ once so file routes are dict lookups instead of filesystem probes
+    build_manifest(app.static_folder)
 
-# Serve Try_web_build.loader.js directly (noted in your error screenshot)
-@app.route('/Try_web_build.loader.js')
-def loader_js():
-    try:
-        logger.debug("Serving Try_web_build.loader.js")
-        return send_from_directory(os.path.join(app.static_folder, "Try_web_build"), "Try_web_build.loader.js")
-    except Exception as e:
-        logger.error(f"Error serving loader: {str(e)}")
-        return "", 404
+    app.register_blueprint(bp)
 
-# Serve Unity WebGL files with proper prefixes
-@app.route('/Build/<path:filename>')
-def serve_build_files_direct(filename):
-    try:
-        logger.debug(f"Serving build file: {filename}")
-        return send_from_directory(os.path.join(app.static_folder, "Try_web_build", "Build"), filename)
-    except Exception as e:
-        logger.error(f"Error serving build file {filename}: {str(e)}")
-        return "", 404
+    if app.config['RENDER_MODE'] == 'production':
+        # Before any fork, so workers share the compiled templates
+        try:
+            compile_templates(app)
+        except Exception as e:
+            logger.error(f"Error compiling templates: {str(e)}")
 
-@app.route('/TemplateData/<path:filename>')
-def serve_template_files_direct(filename):
-    try:
-        logger.debug(f"Serving template file: {filename}")
-        return send_from_directory(os.path.join(app.static_folder, "Try_web_build", "TemplateData"), filename)
-    except Exception as e:
-        logger.error(f"Error serving template file {filename}: {str(e)}")
-        return "", 404
+    if socketio is None:
+        socketio = os.environ.get('SOCKETIO') == '1'
+    if socketio:
+        # Imported here so apps without Socket.IO never load Flask-SocketIO
+        from sockets import init_socketio
+        init_socketio(app)
 
-# The original routes with /game prefix
-@app.route('/game/Build/<path:filename>')
-def serve_build_files(filename):
-    try:
-        return send_from_directory(os.path.join(app.static_folder, "Try_web_build", "Build"), filename)
-    except Exception as e:
-        logger.error(f"Error serving build file {filename}: {str(e)}")
-        return "", 404
+    if warm:
+        warm_subsystems()
+    return app
 
-@app.route('/game/TemplateData/<path:filename>')
-def serve_template_files(filename):
-    try:
-        return send_from_directory(os.path.join(app.static_folder, "Try_web_build", "TemplateData"), filename)
-    except Exception as e:
-        logger.error(f"Error serving template file {filename}: {str(e)}")
-        return "", 404
-
-@app.route('/game/<path:filename>')
-def serve_game_root_files(filename):
-    try:
-        return send_from_directory(os.path.join(app.static_folder, "Try_web_build"), filename)
-    except Exception as e:
-        logger.error(f"Error serving game file {filename}: {str(e)}")
-        return "", 404
-
-# Catch-all route for other static files
-@app.route('/<path:filename>')
-def serve_static_root_files(filename):
-    try:
-        # Check if it's an existing static file
-        potential_path = os.path.join(app.static_folder, filename)
-        if os.path.exists(potential_path) and os.path.isfile(potential_path):
-            logger.debug(f"Serving static file: {filename}")
-            return send_from_directory(app.static_folder, filename)
-        
-        # Check if it's a Unity build file
-        potential_unity_path = os.path.join(app.static_folder, "Try_web_build", filename)
-        if os.path.exists(potential_unity_path) and os.path.isfile(potential_unity_path):
-            logger.debug(f"Serving Unity root file: {filename}")
-            return send_from_directory(os.path.join(app.static_folder, "Try_web_build"), filename)
-            
-        logger.warning(f"File not found: {filename}")
-        return "", 404
-    except Exception as e:
-        logger.error(f"Error serving file {filename}: {str(e)}")
-        return "", 404
-
-@app.route('/start-capture', methods=['POST'])
-def start_capture():
-    """Start capturing screenshots at regular intervals"""
-    result = start_screenshot_capture()
-    return jsonify(result)
-
-@app.route('/stop-capture', methods=['POST'])
-def stop_capture():
-    """Stop capturing screenshots"""
-    result = stop_screenshot_capture()
-    return jsonify(result)
-
-@app.route('/static/js/UnityVideoRecorder.js')
-def serve_video_recorder_js():
-    """Serve the UnityVideoRecorder.js file"""
-    return send_from_directory('static/js', 'UnityVideoRecorder.js')
-
-# If using a custom FindGameObjects script to help locate GameManager
-@app.route('/static/js/FindGameObjects.js')
-def serve_find_gameobjects_js():
-    """Serve the FindGameObjects.js helper file"""
-    return send_from_directory('static/js', 'FindGameObjects.js')
-
-@app.route('/download-screenshots', methods=['GET'])
-def download_screenshots():
-    """Download all captured screenshots as a ZIP file"""
-    zip_file = get_screenshots_zip()
-    
-    if not zip_file:
-        return jsonify({"error": "No screenshots available"}), 400
-    
-    # Return the ZIP file
-    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-    return send_file(
-        zip_file,
-        mimetype='application/zip',
-        as_attachment=True,
-        download_name=f'simulation_screenshots_{timestamp}.zip'
-    )
-
-@app.route('/download-metrics', methods=['POST'])
-def download_metrics():
-    """Receive metrics data and return it as a downloadable file"""
-    try:
-        # Get JSON data from request
-        metrics_data = request.json
-        
-        if not metrics_data:
-            return jsonify({"error": "No metrics data received"}), 400
-        
-        # Log the incoming data
-        logger.info(f"Received metrics data: {len(str(metrics_data))} bytes")
-        
-        # Generate a unique filename with timestamp
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"vibration_simulation_metrics_{timestamp}.json"
-        
-        # Create response with JSON file attachment
-        response = make_response(json.dumps(metrics_data, indent=2))
-        response.headers["Content-Disposition"] = f"attachment; filename={filename}"
-        response.headers["Content-Type"] = "application/json"
-        
-        logger.info(f"Returning downloadable metrics file: {filename}")
-        return response
-        
-    except Exception as e:
-        logger.error(f"Error processing metrics download: {str(e)}")
-        return jsonify({"error": str(e)}), 500
-
-@app.route('/healthz')
-def health_check():
-    try:
-        return jsonify({"status": "healthy"}), 200
-    except Exception as e:
-        return jsonify({"status": "unhealthy", "error": str(e)}), 500
 
 if __name__ == '__main__':
+    app = create_app(render_mode='development')
+
     # Print info about where we're serving from
     logger.info(f"Static folder: {app.static_folder}")
     logger.info(f"Template folder: {app.template_folder}")
-    
+
     # Check key paths exist
     unity_path = os.path.join(app.static_folder, "Try_web_build")
     if not os.path.exists(unity_path):
         logger.error(f"Unity build path does not exist: {unity_path}")
-    
+
     # Start the app on localhost for better security
-    app.run(host="0.0.0.0", port=5000, debug=True)
\ No newline at end of file
+    app.run(host="0.0.0.0", port=5000, debug=True)
@@ -0,0 +1,372 @@
+import os
+import fcntl
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from run_store import SERIES_DTYPES, run_dir, load_series
+
+logger = logging.getLogger(__name__)
+
+# Rebuilds cluster-size distributions from bond events. Agents are nodes, live bonds are
+# edges; the disjoint-set forest is a NumPy parent array whose roots are looked up (and
+# compressed) only for the nodes a window touches, unions are applied a whole window at
+# a time, and a break only rebuilds the components it touched.
+# Component sizes and the size census are kept up to date as windows are applied, so a
+# sample costs the number of distinct sizes rather than the number of agents.
+#
+# The default resolution is computed as runs are ingested and persisted per run (tracker
+# state plus append-only sample files); coarser multiples of it are read off those samples
+# and any other resolution is a replay limited to MAX_WINDOWS sampled windows.
+DEFAULT_RESOLUTION = float(os.environ.get('CLUSTER_TIMELINE_RESOLUTION', 1.0))
+TIMELINE_CACHE_SIZE = int(os.environ.get('TIMELINE_CACHE_SIZE', 64))
+MAX_WINDOWS = int(os.environ.get('CLUSTER_TIMELINE_MAX_WINDOWS', 1000))  # per replayed timeline
+
+TIMELINE_DTYPE = SERIES_DTYPES["cluster_sizes"]
+HISTOGRAM_DTYPE = np.dtype([('sample', '<u4'), ('size', '<i4'), ('count', '<i4')])
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class ClusterTracker:
+    """Incremental connected components over a stream of bond formed/broken events"""
+
+    def __init__(self, resolution=DEFAULT_RESOLUTION):
+        self.resolution = float(resolution)
+        self.agent_ids = np.zeros(0, dtype='<i4')      # dense index -> agent code, in arrival order
+        self.parent = np.zeros(0, dtype=np.intp)       # forest; a root is its own parent
+        self.size = np.zeros(0, dtype=np.intp)         # component size, valid at roots
+        self.census = {}                               # component size (> 1) -> number of components
+        self.edge_keys = np.zeros(0, dtype=np.int64)   # sorted live bonds (lo << 32 | hi)
+        self.edge_counts = np.zeros(0, dtype=np.int32)
+        self.edge_tree = np.zeros(0, dtype=bool)       # bonds forming a spanning forest
+        self.window = None                             # window of the events applied last
+        self.processed = 0                             # bond events consumed so far
+        self.timeline = []                             # emitted TIMELINE_DTYPE records not yet saved
+        self.histograms = []                           # emitted HISTOGRAM_DTYPE records not yet saved
+        self.emitted = 0                               # samples emitted, saved or not
+        self.directory = None                          # where saved samples live
+        self.saved = 0                                 # samples in the directory's timeline file
+        self.saved_rows = 0                            # records in its histogram file
+
+    def _dense(self, agents):
+        """Map agent codes to dense node indices, adding unseen agents as singletons"""
+        unique, inverse = np.unique(agents, return_inverse=True)
+        known = len(self.agent_ids)
+        sorter = np.argsort(self.agent_ids, kind='stable')
+        position = np.searchsorted(self.agent_ids, unique, sorter=sorter).clip(max=max(known - 1, 0))
+        found = self.agent_ids[sorter[position]] == unique if known else np.zeros(len(unique), dtype=bool)
+        dense = np.empty(len(unique), dtype=np.intp)
+        dense[found] = sorter[position[found]]
+        dense[~found] = np.arange(known, known + (~found).sum())
+        if not found.all():
+            self.agent_ids = np.concatenate((self.agent_ids, unique[~found].astype('<i4')))
+            self.parent = np.concatenate((self.parent, dense[~found]))
+            self.size = np.concatenate((self.size, np.ones((~found).sum(), dtype=np.intp)))
+        return dense[inverse]
+
+    def _tally(self, roots, sign):
+        """Add (sign 1) or remove (sign -1) the given components from the size census"""
+        sizes, counts = np.unique(self.size[roots], return_counts=True)
+        for size, count in zip(sizes.tolist(), counts.tolist()):
+            if size > 1:
+                total = self.census.get(size, 0) + sign * count
+                if total:
+                    self.census[size] = total
+                else:
+                    self.census.pop(size, None)
+
+    def _find(self, nodes):
+        """Roots of the given nodes, pointing each of them straight at its root"""
+        parent = self.parent
+        roots = parent[nodes]
+        while True:
+            grand = parent[roots]
+            if np.array_equal(grand, roots):
+                break
+            roots = grand
+        parent[nodes] = roots
+        return roots
+
+    def _union(self, keys):
+        """Union the endpoints of the given bonds; return a mask of those that joined two components"""
+        parent = self.parent
+        u, v = (keys >> 32).astype(np.intp), (keys & 0xFFFFFFFF).astype(np.intp)
+        index = np.arange(len(keys))
+        hooked = np.zeros(len(keys), dtype=bool)
+        while len(index):
+            ru, rv = self._find(u), self._find(v)
+            split = ru != rv
+            if not split.any():
+                break
+            index, u, v, ru, rv = index[split], u[split], v[split], ru[split], rv[split]
+            # Every root hooks under a smaller one (last write wins); the bonds whose write
+            # landed are spanning-forest bonds. Parallel winners only over-mark, which is safe.
+            high, low = np.maximum(ru, rv), np.minimum(ru, rv)
+            parent[high] = low
+            hooked[index[parent[high] == low]] = True
+        return hooked
+
+    def _apply_window(self, u, v, formed):
+        """Apply one window's events: net bond counts, then unions and rebuild-on-break"""
+        lo, hi = np.minimum(u, v), np.maximum(u, v)
+        keys, inverse = np.unique((lo.astype(np.int64) << 32) | hi, return_inverse=True)
+        delta = np.bincount(inverse, weights=np.where(formed, 1, -1), minlength=len(keys)).astype(np.int32)
+
+        # The bond table only holds live bonds, so a match means the bond was alive before
+        position = np.searchsorted(self.edge_keys, keys)
+        exists = position < len(self.edge_keys)
+        exists[exists] = self.edge_keys[position[exists]] == keys[exists]
+        rows = position[exists]
+        after = np.maximum(self.edge_counts[rows] + delta[exists], 0)
+        self.edge_counts[rows] = after
+
+        broken = None
+        removed = rows[after == 0]
+        if len(removed):
+            # Only losing a spanning-forest bond can split a cluster
+            lost = self.edge_keys[removed[self.edge_tree[removed]]]
+            if len(lost):
+                broken = np.unique(self._find(np.concatenate((lost >> 32, lost & 0xFFFFFFFF))))
+            live = np.ones(len(self.edge_keys), dtype=bool)
+            live[removed] = False
+            self.edge_keys, self.edge_counts, self.edge_tree = (
+                self.edge_keys[live], self.edge_counts[live], self.edge_tree[live])
+
+        fresh = ~exists & (delta > 0)
+        added = keys[fresh]
+        if len(added):
+            at = np.searchsorted(self.edge_keys, added)
+            self.edge_keys = np.insert(self.edge_keys, at, added)
+            self.edge_counts = np.insert(self.edge_counts, at, delta[fresh])
+            self.edge_tree = np.insert(self.edge_tree, at, False)
+
+        if broken is not None:
+            # Reset the split components, rebuild them from their remaining forest bonds,
+            # then bridge the pieces with any other bond they still have
+            self._tally(broken, -1)
+            mark = np.zeros(len(self.parent), dtype=bool)
+            mark[broken] = True
+            affected = mark[self._find(np.arange(len(self.parent)))]
+            members = np.flatnonzero(affected)
+            self.parent[members] = members
+            # Bonds new in this window may reach outside; they are unioned with the other additions
+            inside = np.flatnonzero(affected[self.edge_keys >> 32] & affected[self.edge_keys & 0xFFFFFFFF])
+            forest = inside[self.edge_tree[inside]]
+            self._union(self.edge_keys[forest])
+            others = inside[~self.edge_tree[inside]]
+            self.edge_tree[others[self._union(self.edge_keys[others])]] = True
+            roots, sizes = np.unique(self._find(members), return_counts=True)
+            self.size[roots] = sizes
+            self._tally(roots, 1)
+
+        if len(added):
+            before = np.unique(self._find(np.concatenate((added >> 32, added & 0xFFFFFFFF))))
+            self._tally(before, -1)
+            rows = np.searchsorted(self.edge_keys, added)
+            self.edge_tree[rows[self._union(added)]] = True
+            # Merged components add up under their new root
+            after, inverse = np.unique(self._find(before), return_inverse=True)
+            self.size[after] = np.bincount(inverse, weights=self.size[before]).astype(np.intp)
+            self._tally(after, 1)
+
+    def _distribution(self, window, sample):
+        """The cluster-size distribution as of the end of a window"""
+        sizes = sorted(self.census)
+        record = np.zeros(1, dtype=TIMELINE_DTYPE)
+        record['time'] = (window + 1) * self.resolution
+        record['max_size'] = sizes[-1] if sizes else 1 if len(self.parent) else 0
+        record['cluster_count'] = sum(self.census.values())
+
+        histogram = np.zeros(len(sizes), dtype=HISTOGRAM_DTYPE)
+        histogram['sample'] = sample
+        histogram['size'] = sizes
+        histogram['count'] = [self.census[size] for size in sizes]
+        return record, histogram
+
+    def _emit(self, window):
+        record, histogram = self._distribution(window, self.emitted)
+        self.timeline.append(record)
+        self.histograms.append(histogram)
+        self.emitted += 1
+
+    def feed(self, events):
+        """Consume the next slice of a run's bond events (time order, any chunking)"""
+        if len(events) == 0:
+            return
+        windows = np.floor(events['time'].astype(np.float64) / self.resolution).astype(np.int64)
+        if self.window is not None:
+            # Late events join the open window; history that was already emitted is not rewritten
+            windows = np.maximum(windows, self.window)
+        windows = np.maximum.accumulate(windows)
+
+        nodes = self._dense(np.concatenate((events['agent1'], events['agent2'])))
+        u, v = nodes[:len(events)], nodes[len(events):]
+        formed = events['formed'].astype(bool)
+
+        starts = np.flatnonzero(np.diff(windows, prepend=windows[0] - 1))
+        bounds = np.append(starts, len(events))
+        for begin, end in zip(bounds[:-1], bounds[1:]):
+            window = windows[begin]
+            if self.window is not None and window != self.window:
+                self._emit(self.window)
+            self._apply_window(u[begin:end], v[begin:end], formed[begin:end])
+            self.window = window
+        self.processed += len(events)
+
+    def _saved_samples(self):
+        if self.directory is None or not self.saved:
+            return np.zeros(0, TIMELINE_DTYPE), np.zeros(0, HISTOGRAM_DTYPE)
+        return (np.fromfile(os.path.join(self.directory, 'clusters_timeline.bin'), TIMELINE_DTYPE, self.saved),
+                np.fromfile(os.path.join(self.directory, 'clusters_histograms.bin'), HISTOGRAM_DTYPE,
+                            self.saved_rows))
+
+    def samples(self):
+        """(timeline, histogram) record arrays, including the still-open window"""
+        saved_timeline, saved_histograms = self._saved_samples()
+        timeline, histograms = [saved_timeline, *self.timeline], [saved_histograms, *self.histograms]
+        if self.window is not None:
+            record, histogram = self._distribution(self.window, self.emitted)
+            timeline.append(record)
+            histograms.append(histogram)
+        return np.concatenate(timeline), np.concatenate(histograms)
+
+    def save(self, directory):
+        """Append the samples emitted since the last save, then write the tracker state atomically"""
+        for name, records, committed, dtype in (("clusters_timeline.bin", self.timeline, self.saved, TIMELINE_DTYPE),
+                                                ("clusters_histograms.bin", self.histograms, self.saved_rows,
+                                                 HISTOGRAM_DTYPE)):
+            with open(os.path.join(directory, name), 'ab') as f:
+                # Drop any tail written by a save whose state never made it to disk
+                f.truncate(committed * dtype.itemsize)
+                for chunk in records:
+                    f.write(chunk.tobytes())
+        saved, saved_rows = self.emitted, self.saved_rows + sum(len(chunk) for chunk in self.histograms)
+
+        census = np.array(sorted(self.census.items()), dtype=np.int64).reshape(-1, 2)
+        path = os.path.join(directory, 'clusters_state.npz')
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            np.savez(f, resolution=self.resolution, agent_ids=self.agent_ids, parent=self.parent, size=self.size,
+                     census=census, edge_keys=self.edge_keys, edge_counts=self.edge_counts,
+                     edge_tree=self.edge_tree, window=-1 if self.window is None else self.window,
+                     processed=self.processed, saved=saved, saved_rows=saved_rows)
+        os.replace(tmp, path)
+        self.timeline, self.histograms = [], []
+        self.directory, self.saved, self.saved_rows = directory, saved, saved_rows
+
+    @classmethod
+    def load(cls, directory):
+        with np.load(os.path.join(directory, 'clusters_state.npz')) as state:
+            tracker = cls(float(state['resolution']))
+            tracker.agent_ids = state['agent_ids']
+            tracker.parent = state['parent'].astype(np.intp)
+            tracker.size = state['size'].astype(np.intp)
+            tracker.census = {int(size): int(count) for size, count in state['census']}
+            tracker.edge_keys = state['edge_keys']
+            tracker.edge_counts = state['edge_counts']
+            tracker.edge_tree = state['edge_tree']
+            tracker.window = None if int(state['window']) < 0 else int(state['window'])
+            tracker.processed = int(state['processed'])
+            tracker.directory = directory
+            tracker.emitted = tracker.saved = int(state['saved'])
+            tracker.saved_rows = int(state['saved_rows'])
+        return tracker
+
+
+def update_run(run_id, resolution=DEFAULT_RESOLUTION):
+    """Bring a run's persisted tracker up to date with newly appended bond events"""
+    directory = run_dir(run_id)
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, 'clusters.lock'), 'w') as lock:
+        # Chunks of one run may land on different gunicorn workers
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if os.path.exists(os.path.join(directory, 'clusters_state.npz')):
+            tracker = ClusterTracker.load(directory)
+        else:
+            tracker = ClusterTracker(resolution)
+        events = load_series(run_id, "bond_events")
+        if len(events) > tracker.processed:
+            tracker.feed(events[tracker.processed:])
+            tracker.save(directory)
+    return tracker
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='cluster-timeline')
+        return _executor
+
+
+def _precompute(run_id):
+    try:
+        update_run(run_id)
+    except Exception as e:
+        logger.error(f"Error computing cluster timeline for run {run_id}: {str(e)}")
+
+
+def precompute(run_id):
+    """Bring a freshly ingested run's timeline up to date in the background"""
+    _get_executor().submit(_precompute, run_id)
+
+
+def _coarsen(timeline, histograms, base, resolution, factor):
+    """Samples at a whole multiple of the base resolution: the last base sample of each coarse window"""
+    if len(timeline) == 0:
+        return timeline, histograms
+    windows = (np.rint(timeline['time'] / base).astype(np.int64) - 1) // factor
+    last = np.flatnonzero(np.diff(windows, append=windows[-1] + 1))
+    coarse = timeline[last]
+    coarse['time'] = (windows[last] + 1) * resolution
+    kept = histograms[np.isin(histograms['sample'], last)]
+    kept['sample'] = np.searchsorted(last, kept['sample'])
+    return coarse, kept
+
+
+def get_timeline(run_id, resolution=None):
+    """Return (timeline, histograms) for a run at any resolution"""
+    resolution = float(resolution or DEFAULT_RESOLUTION)
+    if resolution <= 0:
+        raise ValueError("resolution must be positive")
+    stored = update_run(run_id)
+    factor = round(resolution / stored.resolution)
+    if factor >= 1 and abs(resolution - factor * stored.resolution) <= 1e-9 * resolution:
+        return _coarsen(*stored.samples(), stored.resolution, resolution, factor)
+
+    # Other resolutions are a fresh replay, cached until more events arrive
+    events = load_series(run_id, "bond_events")
+    key = (run_id, resolution, len(events))
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+    if len(events):
+        windows = np.maximum.accumulate(np.floor(events['time'].astype(np.float64) / resolution))
+        if np.count_nonzero(np.diff(windows)) >= MAX_WINDOWS:
+            raise ValueError(f"Resolution too fine for this run (more than {MAX_WINDOWS} samples)")
+    tracker = ClusterTracker(resolution)
+    tracker.feed(events)
+    result = tracker.samples()
+    with _cache_lock:
+        _cache[key] = result
+        while len(_cache) > TIMELINE_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return result
+
+
+def timeline_json(timeline, histograms):
+    """Shape tracker output for the API: one entry per sample with its sparse size histogram"""
+    bounds = np.searchsorted(histograms['sample'], np.arange(len(timeline) + 1))
+    sizes, counts = histograms['size'].tolist(), histograms['count'].tolist()
+    return [
+        {"time": float(t), "max_size": m, "cluster_count": c,
+         "histogram": [[sizes[j], counts[j]] for j in range(bounds[i], bounds[i + 1])]}
+        for i, (t, m, c) in enumerate(zip(timeline['time'].tolist(), timeline['max_size'].tolist(),
+                                          timeline['cluster_count'].tolist()))
+    ]
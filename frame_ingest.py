@@ -0,0 +1,114 @@
+import os
+import io
+import struct
+from PIL import Image
+from screenshot_handler import enqueue_frame, get_session
+
+# Length-prefixed batch (Content-Type: application/x-frame-batch): each frame is a
+# 9-byte little-endian header (kind: u8, width: u16, height: u16, length: u32) + payload.
+FRAME_HEADER = struct.Struct('<BHHI')
+FRAME_KINDS = {0: 'rgba', 1: 'png', 2: 'webp'}
+BATCH_CONTENT_TYPE = 'application/x-frame-batch'
+
+MAX_FRAME_DIMENSION = int(os.environ.get('MAX_FRAME_DIMENSION', 4096))  # pixels per side
+MAX_FRAME_BYTES = MAX_FRAME_DIMENSION * MAX_FRAME_DIMENSION * 4
+# Werkzeug spools a whole multipart body before the first part is seen, so it is capped up front
+MAX_MULTIPART_BYTES = int(os.environ.get('MAX_MULTIPART_BYTES', 256 * 1024 * 1024))
+
+
+class FrameTooLargeError(ValueError):
+    """A frame or multipart upload over the size limits"""
+
+
+def _read_exact(stream, n):
+    chunks = []
+    while n > 0:
+        chunk = stream.read(n)
+        if not chunk:
+            raise ValueError("Frame batch ended in the middle of a frame")
+        chunks.append(chunk)
+        n -= len(chunk)
+    return b''.join(chunks)
+
+
+def decode_frame(kind, data, width=0, height=0):
+    """Turn one uploaded frame (raw RGBA, PNG or WebP bytes) into a PIL image"""
+    if kind == 'rgba':
+        if not (0 < width <= MAX_FRAME_DIMENSION and 0 < height <= MAX_FRAME_DIMENSION):
+            raise ValueError(f"Invalid raw frame size {width}x{height}")
+        if len(data) != width * height * 4:
+            raise ValueError(f"Raw frame is {len(data)} bytes, expected {width * height * 4}")
+        # Rows top-down, as returned by CanvasRenderingContext2D.getImageData
+        return Image.frombuffer('RGBA', (width, height), data, 'raw', 'RGBA', 0, 1)
+
+    img = Image.open(io.BytesIO(data))
+    if img.format.lower() != kind:
+        raise ValueError(f"Expected a {kind} frame, got {img.format}")
+    # Only the header has been read so far; refuse huge canvases before decoding a pixel
+    width, height = img.size
+    if not (0 < width <= MAX_FRAME_DIMENSION and 0 < height <= MAX_FRAME_DIMENSION):
+        raise ValueError(f"Invalid {kind} frame size {width}x{height}")
+    img.load()
+    return img
+
+
+def iter_batch_frames(stream):
+    """Yield (kind, data, width, height) from a length-prefixed batch, one frame in memory at a time"""
+    while True:
+        header = stream.read(FRAME_HEADER.size)
+        if not header:
+            return
+        if len(header) < FRAME_HEADER.size:
+            header += _read_exact(stream, FRAME_HEADER.size - len(header))
+        kind_id, width, height, length = FRAME_HEADER.unpack(header)
+        if kind_id not in FRAME_KINDS:
+            raise ValueError(f"Unknown frame kind {kind_id}")
+        if length > MAX_FRAME_BYTES:
+            raise FrameTooLargeError(f"Frame of {length} bytes exceeds the limit")
+        yield FRAME_KINDS[kind_id], _read_exact(stream, length), width, height
+
+
+def iter_multipart_frames(files, form):
+    """Yield (kind, data, width, height) from multipart parts; raw parts use the width/height fields"""
+    width = int(form.get('width', 0))
+    height = int(form.get('height', 0))
+    for _, storage in files.items(multi=True):
+        mimetype = storage.mimetype or ''
+        if mimetype == 'image/png':
+            kind = 'png'
+        elif mimetype == 'image/webp':
+            kind = 'webp'
+        else:
+            kind = 'rgba'
+        data = storage.read(MAX_FRAME_BYTES + 1)
+        if len(data) > MAX_FRAME_BYTES:
+            raise FrameTooLargeError(f"Frame {storage.filename or kind} exceeds the limit of {MAX_FRAME_BYTES} bytes")
+        yield kind, data, width, height
+
+
+def ingest_frames(req, session_id):
+    """Decode every frame in an upload request and hand it to the session's screenshot pipeline"""
+    if req.mimetype == BATCH_CONTENT_TYPE:
+        frames = iter_batch_frames(req.stream)
+    elif req.mimetype == 'multipart/form-data':
+        if req.content_length is None or req.content_length > MAX_MULTIPART_BYTES:
+            raise FrameTooLargeError(f"Multipart uploads need a Content-Length of at most {MAX_MULTIPART_BYTES} bytes")
+        frames = iter_multipart_frames(req.files, req.form)
+    else:
+        raise ValueError(f"Unsupported content type {req.mimetype}")
+
+    # Uploaded frames must not be dropped silently, so the request waits on a full queue instead
+    session = get_session(session_id)
+    options = dict(session.options, queue_policy='block')
+    accepted, rejected = 0, []
+    for index, (kind, data, width, height) in enumerate(frames):
+        try:
+            img = decode_frame(kind, data, width, height)
+        except Exception as e:
+            rejected.append({"index": index, "error": str(e)})
+            continue
+        session.count("captured")
+        enqueue_frame(session, img, options)
+        accepted += 1
+
+    return {"status": "ok", "accepted": accepted, "rejected": rejected}
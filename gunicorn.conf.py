@@ -0,0 +1,37 @@
+import os
+
+if os.environ.get('SOCKETIO') == '1':
+    # Socket.IO needs cooperative sockets; patch before anything imports threading or ssl
+    from gevent import monkey
+    monkey.patch_all()
+
+import request_metrics
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 4))
+# Build the app (and import the warmed subsystems) once in the master, then fork: workers
+# start instantly and share those pages until they write to them
+preload_app = True
+if os.environ.get('SOCKETIO') == '1':
+    worker_class = 'geventwebsocket.gunicorn.workers.GeventWebSocketWorker'
+    # Socket.IO clients must reach the worker holding their session and gunicorn cannot route
+    # them there, so run one (gevent) worker per instance. Scale out with more instances behind
+    # a sticky load balancer sharing SOCKETIO_MESSAGE_QUEUE.
+    workers = 1
+
+
+def on_starting(server):
+    """Drop per-worker metric files left over from a previous master"""
+    request_metrics.reset_worker_files()
+
+
+def post_worker_init(worker):
+    """Start every worker's housekeeping threads and sweep runner; leases let one worker act where needed"""
+    import param_store
+    import result_cache
+    import screenshot_catalog
+    import sweeps
+    param_store.start_expiry()
+    result_cache.start_maintenance()
+    screenshot_catalog.start_retention()
+    sweeps.start_runner()
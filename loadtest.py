@@ -0,0 +1,377 @@
+import os
+import io
+import sys
+import json
+import time
+import uuid
+import random
+import shutil
+import struct
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+import http.client
+from urllib.parse import urlsplit
+import numpy as np
+
+# Local load test: starts gunicorn (wsgi:app, gunicorn.conf.py) on a scratch DATA_DIR, drives a
+# weighted mix of scenarios from concurrent virtual users for a fixed time and reports
+# throughput, p50/p95/p99 latency per request and the RSS of each worker. Results can be
+# saved as a baseline and later runs compared against it:
+#   python loadtest.py --save-baseline           # record benchmarks/baseline.json
+#   python loadtest.py --compare                 # exit 1 when p95 or throughput regress
+BASELINE_PATH = os.environ.get('BENCH_BASELINE', os.path.join('benchmarks', 'baseline.json'))
+DEFAULT_MIX = 'unity_boot=1,params=4,download=1,metrics=2'
+MIN_COMPARE_SAMPLES = 100  # requests an endpoint needs before its p95 is compared
+HEADERS = {'X-Forwarded-Proto': 'https', 'Accept-Encoding': 'br, gzip'}
+
+# What the Unity loader fetches after /game, in order
+UNITY_BOOT = ['/game', '/game/TemplateData/style.css', '/game/Build/Try_web_build.loader.js',
+              '/game/Build/Try_web_build.framework.js', '/game/TemplateData/unity-logo-dark.png',
+              '/game/TemplateData/progress-bar-empty-dark.png', '/game/TemplateData/progress-bar-full-dark.png',
+              '/game/TemplateData/favicon.ico']
+
+PARAMS = {"SC": 0.5, "BF": 0.2, "AmpX": 1.0, "AmpY": 0.0, "AmpZ": 0.5, "freqX": 2.0, "freqY": 0.0, "freqZ": 1.0,
+          "sphereCount": 20, "rectangleCount": 5, "quartersphereCount": 0, "airfoilCount": 0,
+          "halfsphereCount": 0, "pyramidCount": 3}
+
+
+class Client:
+    """One virtual user: a keep-alive connection, a session ID and its own latency records"""
+
+    def __init__(self, base_url, seed):
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.conn = None
+        self.session = uuid.uuid4().hex
+        self.random = random.Random(seed)
+        self.samples = {}  # label -> [seconds]
+        self.errors = {}   # label -> count
+        self.bytes = 0
+
+    def request(self, method, path, body=None, headers=None, label=None):
+        """Send a request, read the whole body and record its latency under label (default: path)"""
+        label = label or path
+        headers = dict(HEADERS, **{'X-Session-ID': self.session}, **(headers or {}))
+        started = time.perf_counter()
+        for attempt in (0, 1):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            try:
+                self.conn.request(method, path, body=body, headers=headers)
+                response = self.conn.getresponse()
+                data = response.read()
+                break
+            except (http.client.HTTPException, ConnectionError):
+                # The server closed the idle keep-alive connection; retry once on a new one
+                self.conn.close()
+                self.conn = None
+                if attempt:
+                    self.errors[label] = self.errors.get(label, 0) + 1
+                    return None, b''
+        self.samples.setdefault(label, []).append(time.perf_counter() - started)
+        self.bytes += len(data)
+        if response.status >= 400:
+            self.errors[label] = self.errors.get(label, 0) + 1
+        return response, data
+
+    def get(self, path, headers=None, label=None):
+        return self.request('GET', path, headers=headers, label=label)
+
+    def post_json(self, path, payload, label=None):
+        return self.request('POST', path, json.dumps(payload), {'Content-Type': 'application/json'}, label)
+
+
+def unity_boot(client, options):
+    """A player opening the game: the page, the loader and the build assets"""
+    for path in UNITY_BOOT:
+        client.get(path)
+
+
+def params(client, options):
+    """The form posts parameters, then Unity polls /get-data (304 while unchanged)"""
+    payload = dict(PARAMS, SC=round(client.random.uniform(0.1, 1.0), 3))
+    client.post_json('/set-data', payload)
+    etag = None
+    for _ in range(options.polls):
+        response, _ = client.get('/get-data', headers={'If-None-Match': etag} if etag else None)
+        if response is not None:
+            etag = response.getheader('ETag') or etag
+
+
+def download(client, options):
+    """Download the session's screenshots as a ZIP (frames are uploaded once per user)"""
+    if not getattr(client, 'frames_ready', False):
+        upload_frames(client, options.frames)
+        client.frames_ready = True
+    client.get('/download-screenshots')
+
+
+def metrics(client, options):
+    """MetricsDownloader: create a run, stream NDJSON chunks, finish it"""
+    _, data = client.post_json('/runs', dict(PARAMS, metrics={}), label='/runs')
+    try:
+        run_id = json.loads(data)['run_id']
+    except (ValueError, KeyError):
+        return
+    t = 0.0
+    for seq in range(options.chunks):
+        lines = []
+        for _ in range(options.chunk_events):
+            t += 0.01
+            lines.append(json.dumps({"time": round(t, 3), "event_type": client.random.choice(("formed", "broken")),
+                                     "agent1": f"sphere_{client.random.randrange(20)}",
+                                     "agent2": f"sphere_{client.random.randrange(20)}"}))
+        lines.append(json.dumps({"time": round(t, 3), "max_size": client.random.randrange(1, 20),
+                                 "cluster_count": client.random.randrange(1, 10)}))
+        client.request('POST', f'/runs/{run_id}/chunks/{seq}', '\n'.join(lines),
+                       {'Content-Type': 'application/x-ndjson'}, label='/runs/<id>/chunks/<seq>')
+    client.post_json(f'/runs/{run_id}/finish', {"metrics": {"total_bonds": options.chunks * options.chunk_events}},
+                     label='/runs/<id>/finish')
+
+
+SCENARIOS = {"unity_boot": unity_boot, "params": params, "download": download, "metrics": metrics}
+
+
+def upload_frames(client, count, size=(320, 240)):
+    """Upload count distinct PNG frames in one length-prefixed batch and wait until they are encoded"""
+    from PIL import Image
+
+    batch = io.BytesIO()
+    for index in range(count):
+        img = Image.new('RGB', size, ((index * 37) % 256, (index * 91) % 256, (index * 53) % 256))
+        png = io.BytesIO()
+        img.save(png, format='PNG')
+        batch.write(struct.pack('<BHHI', 1, size[0], size[1], png.tell()))
+        batch.write(png.getvalue())
+    client.request('POST', '/upload-frames', batch.getvalue(), {'Content-Type': 'application/x-frame-batch'},
+                   label='/upload-frames')
+    # Only the worker that took the upload knows the session, so poll until one reports it done
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        _, data = client.get('/capture-stats', label='/capture-stats')
+        try:
+            stats = json.loads(data)
+        except ValueError:
+            return
+        if not stats["queued"] and stats["encoded"] + stats["duplicates"] + stats["errors"] >= count:
+            return
+        time.sleep(0.05)
+
+
+def parse_mix(text):
+    mix = {}
+    for item in text.split(','):
+        name, _, weight = item.partition('=')
+        if name not in SCENARIOS:
+            raise ValueError(f"Unknown scenario {name!r} (choose from {', '.join(SCENARIOS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def worker_rss(master_pid):
+    """RSS in MB of each direct child of the gunicorn master (Linux /proc)"""
+    rss = {}
+    for pid in os.listdir('/proc'):
+        if not pid.isdigit():
+            continue
+        try:
+            with open(f'/proc/{pid}/status') as f:
+                fields = dict(line.split(':', 1) for line in f if ':' in line)
+        except OSError:
+            continue
+        if int(fields.get('PPid', '0')) == master_pid and 'VmRSS' in fields:
+            rss[int(pid)] = int(fields['VmRSS'].split()[0]) / 1024
+    return rss
+
+
+def start_server(options):
+    """Start gunicorn on a free port with a fresh data directory; returns (process, base URL, data directory)"""
+    import socket
+
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    data_dir = tempfile.mkdtemp(prefix='loadtest-')
+    # Frames go to the scratch directory too, so a run leaves nothing in static/screenshots
+    env = dict(os.environ, PORT=str(port), WEB_CONCURRENCY=str(options.workers), DATA_DIR=data_dir,
+               SCREENSHOT_DIR=os.path.join(data_dir, 'screenshots'), LOG_LEVEL='WARNING')
+    process = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'],
+                               cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("gunicorn exited during startup")
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/healthz', headers=HEADERS)
+            if conn.getresponse().status == 200:
+                return process, base_url, data_dir
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    shutil.rmtree(data_dir, ignore_errors=True)
+    raise RuntimeError("gunicorn did not become healthy within 60s")
+
+
+def run_users(base_url, options, mix, duration, seed):
+    """Run options.users virtual users for duration seconds; returns their clients"""
+    names, weights = list(mix), list(mix.values())
+    stop = time.perf_counter() + duration
+    clients = [Client(base_url, seed * 1000 + i) for i in range(options.users)]
+
+    def user(client):
+        while time.perf_counter() < stop:
+            SCENARIOS[client.random.choices(names, weights)[0]](client, options)
+
+    threads = [threading.Thread(target=user, args=(client,), daemon=True) for client in clients]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return clients
+
+
+def summarize(clients, elapsed):
+    """Throughput and latency percentiles per request label, plus the overall totals"""
+    merged, errors = {}, {}
+    for client in clients:
+        for label, samples in client.samples.items():
+            merged.setdefault(label, []).extend(samples)
+        for label, count in client.errors.items():
+            errors[label] = errors.get(label, 0) + count
+
+    def describe(samples):
+        ms = np.array(samples) * 1000
+        return {"count": len(ms), "rps": len(ms) / elapsed, "mean_ms": float(ms.mean()),
+                "p50_ms": float(np.percentile(ms, 50)), "p95_ms": float(np.percentile(ms, 95)),
+                "p99_ms": float(np.percentile(ms, 99)), "max_ms": float(ms.max())}
+
+    endpoints = {label: dict(describe(samples), errors=errors.get(label, 0))
+                 for label, samples in sorted(merged.items())}
+    everything = [s for samples in merged.values() for s in samples]
+    total = dict(describe(everything) if everything else {"count": 0, "rps": 0.0},
+                 errors=sum(errors.values()), mb_per_s=sum(c.bytes for c in clients) / elapsed / 1024 ** 2)
+    return {"total": total, "endpoints": endpoints}
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(result, baseline, tolerance):
+    """Regressions beyond tolerance: lower throughput, or higher p95 on any shared endpoint"""
+    problems = []
+    if result["total"]["rps"] < baseline["total"]["rps"] * (1 - tolerance):
+        problems.append(f"throughput {result['total']['rps']:.1f} req/s vs baseline {baseline['total']['rps']:.1f}")
+    for label, stats in result["endpoints"].items():
+        before = baseline["endpoints"].get(label)
+        # p95 of a handful of samples, or a sub-millisecond shift, is noise rather than a regression
+        if stats["count"] < MIN_COMPARE_SAMPLES or not before or before["count"] < MIN_COMPARE_SAMPLES:
+            continue
+        if stats["p95_ms"] > max(before["p95_ms"] * (1 + tolerance), before["p95_ms"] + 1.0):
+            problems.append(f"{label} p95 {stats['p95_ms']:.1f}ms vs baseline {before['p95_ms']:.1f}ms")
+    for name, mb in result.get("worker_rss_mb", {}).items():
+        before = baseline.get("worker_rss_mb", {}).get(name)
+        if before and mb > before * (1 + tolerance):
+            problems.append(f"worker RSS {name} {mb:.0f}MB vs baseline {before:.0f}MB")
+    return problems
+
+
+def print_report(result):
+    total = result["total"]
+    print(f"{total['count']} requests in {result['config']['duration']}s: {total['rps']:.1f} req/s,"
+          f" {total['mb_per_s']:.1f} MB/s, {total['errors']} errors")
+    print(f"{'request':<40}{'count':>8}{'req/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'errors':>8}")
+    for label, stats in result["endpoints"].items():
+        print(f"{label[:39]:<40}{stats['count']:>8}{stats['rps']:>9.1f}{stats['p50_ms']:>8.1f}ms"
+              f"{stats['p95_ms']:>7.1f}ms{stats['p99_ms']:>7.1f}ms{stats['errors']:>8}")
+    if result.get("worker_rss_mb"):
+        print("worker RSS (peak): " + ", ".join(f"{name} {mb:.0f}MB" for name, mb in result["worker_rss_mb"].items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the HTTP surface and compare against a baseline")
+    parser.add_argument('--url', help="test an already running server instead of starting gunicorn")
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('WEB_CONCURRENCY', 4)))
+    parser.add_argument('--users', type=int, default=16, help="concurrent virtual users")
+    parser.add_argument('--duration', type=float, default=20, help="measured seconds")
+    parser.add_argument('--warmup', type=float, default=3, help="unmeasured seconds first")
+    parser.add_argument('--mix', default=DEFAULT_MIX, help="weighted scenarios, e.g. params=4,download=1")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--polls', type=int, default=10, help="/get-data polls per params scenario")
+    parser.add_argument('--frames', type=int, default=50, help="screenshots per download")
+    parser.add_argument('--chunks', type=int, default=5, help="chunks per metrics upload")
+    parser.add_argument('--chunk-events', type=int, default=200, help="bond events per chunk")
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true', help="store this run as the baseline")
+    parser.add_argument('--compare', action='store_true', help="fail on regressions against the baseline")
+    parser.add_argument('--tolerance', type=float, default=0.15, help="allowed relative regression")
+    parser.add_argument('--output', help="also write the result JSON here")
+    options = parser.parse_args()
+    mix = parse_mix(options.mix)
+
+    process, base_url, data_dir = (None, options.url, None) if options.url else start_server(options)
+    try:
+        if options.warmup:
+            run_users(base_url, options, mix, options.warmup, options.seed + 1)
+        rss, sampling = {}, threading.Event()
+
+        def sample_rss():
+            while not sampling.wait(0.5):
+                for index, mb in enumerate(sorted(worker_rss(process.pid).values())):
+                    rss[f"worker{index}"] = max(rss.get(f"worker{index}", 0), mb)
+
+        sampler = threading.Thread(target=sample_rss, daemon=True) if process else None
+        if sampler:
+            sampler.start()
+        started = time.perf_counter()
+        clients = run_users(base_url, options, mix, options.duration, options.seed)
+        elapsed = time.perf_counter() - started
+        sampling.set()
+    finally:
+        if process:
+            process.terminate()
+            process.wait(30)
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    result = summarize(clients, elapsed)
+    result["worker_rss_mb"] = rss
+    result["config"] = {"mix": mix, "users": options.users, "workers": None if options.url else options.workers,
+                        "duration": options.duration, "seed": options.seed, "polls": options.polls,
+                        "frames": options.frames, "chunks": options.chunks, "chunk_events": options.chunk_events}
+    result["environment"] = {"commit": git_commit(), "python": platform.python_version(),
+                             "platform": platform.platform(), "cpus": os.cpu_count(), "time": time.time()}
+    print_report(result)
+
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump(result, f, indent=2)
+    if options.save_baseline:
+        os.makedirs(os.path.dirname(options.baseline) or '.', exist_ok=True)
+        with open(options.baseline, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f"Saved baseline to {options.baseline}")
+    if options.compare:
+        with open(options.baseline) as f:
+            baseline = json.load(f)
+        if baseline["config"] != result["config"]:
+            print("Warning: baseline was recorded with a different configuration")
+        problems = compare(result, baseline, options.tolerance)
+        for problem in problems:
+            print(f"REGRESSION {problem}")
+        if problems:
+            sys.exit(1)
+        print(f"No regressions against {options.baseline} (tolerance {options.tolerance:.0%})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+import os
+import json
+import zlib
+import struct
+import logging
+import numpy as np
+from run_store import SERIES_DTYPES, append_chunk
+import cluster_timeline
+
+logger = logging.getLogger(__name__)
+
+# Binary chunk (Content-Type: application/x-run-chunk): an 8-byte little-endian header
+# (bond event count: u32, cluster sample count: u32) followed by the packed records
+# of each series in run_store.SERIES_DTYPES layout.
+CHUNK_HEADER = struct.Struct('<II')
+BINARY_CONTENT_TYPE = 'application/x-run-chunk'
+NDJSON_CONTENT_TYPES = ('application/x-ndjson', 'application/jsonl', 'application/json')
+
+# Decompressed size limit, so a small gzip body cannot expand without bound
+MAX_CHUNK_BYTES = int(os.environ.get('MAX_CHUNK_BYTES', 64 * 1024 * 1024))
+READ_BLOCK = 64 * 1024
+
+
+class ChunkTooLargeError(ValueError):
+    """A chunk body (or its inflated form) over MAX_CHUNK_BYTES"""
+
+
+def read_body(req):
+    """Return the request body, inflating gzip/deflate Content-Encoding"""
+    # This route is exempt from MAX_CONTENT_LENGTH, so the declared length is the only bound
+    if req.content_length is None:
+        raise ValueError("Chunks must be sent with a Content-Length")
+    if req.content_length > MAX_CHUNK_BYTES:
+        raise ChunkTooLargeError("Chunk exceeds the size limit")
+    encoding = (req.headers.get('Content-Encoding') or 'identity').lower()
+    if encoding == 'identity':
+        parts = []
+        while True:
+            block = req.stream.read(READ_BLOCK)
+            if not block:
+                break
+            parts.append(block)
+        return b''.join(parts)
+    if encoding not in ('gzip', 'deflate'):
+        raise ValueError(f"Unsupported Content-Encoding {encoding}")
+
+    decompressor = zlib.decompressobj(31 if encoding == 'gzip' else 15)
+    parts, size = [], 0
+    while True:
+        block = req.stream.read(READ_BLOCK)
+        if not block:
+            break
+        try:
+            part = decompressor.decompress(block, MAX_CHUNK_BYTES + 1 - size)
+        except zlib.error as e:
+            raise ValueError(f"Corrupt {encoding} body: {e}")
+        size += len(part)
+        if size > MAX_CHUNK_BYTES or decompressor.unconsumed_tail:
+            raise ChunkTooLargeError("Chunk exceeds the size limit")
+        parts.append(part)
+    parts.append(decompressor.flush())
+    return b''.join(parts)
+
+
+def parse_ndjson(data):
+    """Split NDJSON lines into (bond_events, cluster_sizes) dict lists"""
+    bond_events, cluster_sizes = [], []
+    for number, line in enumerate(data.splitlines(), 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            raise ValueError(f"Line {number} is not valid JSON")
+        if not isinstance(record, dict):
+            raise ValueError(f"Line {number} is not an object")
+        if 'event_type' in record:
+            bond_events.append(record)
+        elif 'max_size' in record:
+            cluster_sizes.append(record)
+        else:
+            raise ValueError(f"Line {number} is neither a bond event nor a cluster sample")
+    return bond_events, cluster_sizes
+
+
+def parse_binary(data):
+    """Split a binary chunk into (bond_events, cluster_sizes) record arrays"""
+    if len(data) < CHUNK_HEADER.size:
+        raise ValueError("Binary chunk is missing its header")
+    bond_count, cluster_count = CHUNK_HEADER.unpack_from(data)
+    bond_dtype, cluster_dtype = SERIES_DTYPES["bond_events"], SERIES_DTYPES["cluster_sizes"]
+    expected = CHUNK_HEADER.size + bond_count * bond_dtype.itemsize + cluster_count * cluster_dtype.itemsize
+    if len(data) != expected:
+        raise ValueError(f"Binary chunk is {len(data)} bytes, expected {expected}")
+    bond_events = np.frombuffer(data, bond_dtype, bond_count, CHUNK_HEADER.size)
+    cluster_sizes = np.frombuffer(data, cluster_dtype, cluster_count,
+                                  CHUNK_HEADER.size + bond_count * bond_dtype.itemsize)
+    return bond_events, cluster_sizes
+
+
+def ingest_chunk(req, run_id, seq):
+    """Parse one uploaded chunk and append it to the run; replays of a stored seq are no-ops"""
+    if req.mimetype == BINARY_CONTENT_TYPE:
+        bond_events, cluster_sizes = parse_binary(read_body(req))
+    elif req.mimetype in NDJSON_CONTENT_TYPES:
+        bond_events, cluster_sizes = parse_ndjson(read_body(req))
+    else:
+        raise ValueError(f"Unsupported content type {req.mimetype}")
+
+    result = append_chunk(run_id, seq, bond_events, cluster_sizes)
+    if not result["duplicate"] and len(bond_events):
+        # Keep the cluster timeline current as chunks land; a failure here must not lose the chunk
+        try:
+            cluster_timeline.update_run(run_id)
+        except Exception as e:
+            logger.error(f"Error updating cluster timeline for run {run_id}: {str(e)}")
+    return dict(result, status="ok", run_id=run_id, seq=seq)
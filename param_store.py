@@ -0,0 +1,171 @@
+import os
+import json
+import uuid
+import time
+import hashlib
+import sqlite3
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# SQLite database shared by every gunicorn worker on the host
+DATA_DIR = os.environ.get('DATA_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data'))
+PARAM_STORE_PATH = os.environ.get('PARAM_STORE_PATH', os.path.join(DATA_DIR, 'params.db'))
+
+SESSION_COOKIE = 'sim_session'
+SESSION_HEADER = 'X-Session-ID'
+# Sessions untouched this long are pruned by each process's expiry thread (start_expiry)
+SESSION_MAX_AGE_S = float(os.environ.get('SESSION_MAX_AGE_S', 7 * 24 * 3600))  # 0 keeps sessions forever
+SESSION_PRUNE_INTERVAL = float(os.environ.get('SESSION_PRUNE_INTERVAL', 3600))  # seconds between passes
+
+# Default parameters served to sessions that have not submitted the form yet
+DEFAULT_PARAMS = {
+    "SC": 800,
+    "BF": 300,
+    "AmpX": 0.2,
+    "AmpY": 1.0,
+    "AmpZ": 0.2,
+    "freqX": 1.0,
+    "freqY": 2.0,
+    "freqZ": 1.0,
+    "sphereCount": 0,
+    "rectangleCount": 0,
+    "quartersphereCount": 0,
+    "airfoilCount": 0,
+    "halfsphereCount": 0,
+    "pyramidCount": 0
+}
+DEFAULT_PAYLOAD = json.dumps(DEFAULT_PARAMS)
+
+# One connection per thread (and per forked worker), opened lazily
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_ready_pid = None
+_expiry_lock = threading.Lock()
+_expiry_pid = None
+
+
+def _connect():
+    """Return this thread's connection to the parameter store"""
+    global _schema_ready_pid
+
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and _local.pid == os.getpid():
+        return conn
+
+    os.makedirs(os.path.dirname(PARAM_STORE_PATH), exist_ok=True)
+    conn = sqlite3.connect(PARAM_STORE_PATH, timeout=5.0, isolation_level=None, check_same_thread=False)
+    # WAL lets /get-data readers run without blocking on /set-data writers
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+
+    with _schema_lock:
+        if _schema_ready_pid != os.getpid():
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS params ("
+                " session_id TEXT PRIMARY KEY,"
+                " payload TEXT NOT NULL,"
+                " version INTEGER NOT NULL,"
+                " updated_at REAL NOT NULL"
+                ") WITHOUT ROWID"
+            )
+            _schema_ready_pid = os.getpid()
+
+    _local.conn = conn
+    _local.pid = os.getpid()
+    return conn
+
+
+def new_session_id():
+    """Generate a fresh, unguessable session identifier"""
+    return uuid.uuid4().hex
+
+
+def resolve_session_id(req, default=None):
+    """Find the caller's session ID in the header, query string or cookie"""
+    session_id = (req.headers.get(SESSION_HEADER)
+                  or req.args.get('session')
+                  or req.cookies.get(SESSION_COOKIE))
+    if session_id and len(session_id) <= 64 and session_id.isalnum():
+        return session_id
+    return default
+
+
+def make_etag(payload):
+    """Build the ETag for a parameter payload from its content (versions restart when a session is pruned)"""
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def get_params_payload(session_id):
+    """Return (json_payload, version) for a session, falling back to defaults"""
+    if not session_id:
+        return DEFAULT_PAYLOAD, 0
+
+    row = _connect().execute(
+        "SELECT payload, version FROM params WHERE session_id = ?", (session_id,)
+    ).fetchone()
+    if row is None:
+        return DEFAULT_PAYLOAD, 0
+    return row[0], row[1]
+
+
+def get_params(session_id):
+    """Return the parameter dict stored for a session"""
+    payload, _ = get_params_payload(session_id)
+    return json.loads(payload)
+
+
+def set_params(session_id, params):
+    """Store a session's parameters and return the new version number"""
+    start_expiry()
+    payload = json.dumps(params)
+    conn = _connect()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute(
+            "INSERT INTO params (session_id, payload, version, updated_at) VALUES (?, ?, 1, ?) "
+            "ON CONFLICT(session_id) DO UPDATE SET payload = excluded.payload,"
+            " version = params.version + 1, updated_at = excluded.updated_at",
+            (session_id, payload, time.time())
+        )
+        version = conn.execute(
+            "SELECT version FROM params WHERE session_id = ?", (session_id,)
+        ).fetchone()[0]
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return version
+
+
+def prune_sessions(max_age=None):
+    """Delete sessions that have not been updated for max_age seconds"""
+    max_age = SESSION_MAX_AGE_S if max_age is None else max_age
+    if not max_age:
+        return 0
+    cursor = _connect().execute(
+        "DELETE FROM params WHERE updated_at < ?", (time.time() - max_age,)
+    )
+    return cursor.rowcount
+
+
+def expiry_loop():
+    while True:
+        try:
+            pruned = prune_sessions()
+            if pruned:
+                logger.info(f"Pruned {pruned} stale parameter sessions")
+        except Exception as e:
+            logger.error(f"Error pruning parameter sessions: {str(e)}")
+        time.sleep(SESSION_PRUNE_INTERVAL)
+
+
+def start_expiry():
+    """Start this process's session expiry thread (once per process, so forked workers start their own)"""
+    global _expiry_pid
+    with _expiry_lock:
+        if _expiry_pid == os.getpid():
+            return
+        _expiry_pid = os.getpid()
+    threading.Thread(target=expiry_loop, name='session-expiry', daemon=True).start()
@@ -0,0 +1,99 @@
+import os
+import gzip
+import logging
+import mimetypes
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional, gzip siblings are always produced
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+UNITY_BUILD_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'Try_web_build')
+
+# Unity's loader needs the real types, not whatever the host's mime.types says
+mimetypes.add_type('application/wasm', '.wasm')
+mimetypes.add_type('application/javascript', '.js')
+mimetypes.add_type('application/octet-stream', '.data')
+
+# Images are already compressed; everything else Unity ships is worth compressing
+COMPRESSIBLE_EXTENSIONS = {'.js', '.wasm', '.data', '.html', '.css', '.json', '.svg', '.txt', '.ico'}
+MIN_COMPRESS_SIZE = 1024  # bytes
+
+# Preferred order when the client accepts several encodings
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+# Absolute source path -> {encoding: absolute sibling path}
+_variants = {}
+
+
+def _write_atomic(path, data):
+    """Write data next to path and rename it into place, safe with concurrent workers"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def compress(encoding, data, brotli_quality=11):
+    """Compress data for a Content-Encoding in ENCODINGS (deterministic, so ETags stay stable)"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=brotli_quality)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def precompress_tree(root=UNITY_BUILD_DIR):
+    """Create .br/.gz siblings for every compressible file under root and register them"""
+    created = 0
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            _, ext = os.path.splitext(name)
+            if ext in ('.br', '.gz') or ext.lower() not in COMPRESSIBLE_EXTENSIONS:
+                continue
+
+            source = os.path.join(dirpath, name)
+            source_stat = os.stat(source)
+            if source_stat.st_size < MIN_COMPRESS_SIZE:
+                continue
+
+            data = None
+            variants = {}
+            for encoding, suffix in ENCODINGS:
+                if encoding == 'br' and brotli is None:
+                    continue
+                target = source + suffix
+                # Reuse an existing sibling unless the source changed after it was written
+                if not os.path.exists(target) or os.stat(target).st_mtime < source_stat.st_mtime:
+                    if data is None:
+                        with open(source, 'rb') as f:
+                            data = f.read()
+                    compressed = compress(encoding, data)
+                    if len(compressed) >= source_stat.st_size * 0.95:
+                        continue
+                    _write_atomic(target, compressed)
+                    created += 1
+                variants[encoding] = target
+
+            if variants:
+                _variants[os.path.abspath(source)] = variants
+
+    logger.info(f"Precompressed assets under {root}: {len(_variants)} files, {created} siblings written")
+    return created
+
+
+def variants_for(path):
+    """Return {encoding: sibling path} for a registered source whose siblings are still current"""
+    variants = _variants.get(os.path.abspath(path))
+    if not variants:
+        return {}
+    source_mtime = os.stat(path).st_mtime
+    return {encoding: target for encoding, target in variants.items()
+            if os.path.exists(target) and os.stat(target).st_mtime >= source_mtime}
+
+
+if __name__ == '__main__':
+    # Build-time step: python precompress.py [directory]
+    import sys
+    logging.basicConfig(level=logging.INFO)
+    precompress_tree(sys.argv[1] if len(sys.argv) > 1 else UNITY_BUILD_DIR)
@@ -0,0 +1,211 @@
+import os
+import json
+import time
+import random
+import bisect
+import logging
+import threading
+from flask import request
+
+logger = logging.getLogger(__name__)
+
+# Each worker periodically dumps its counters here; /metrics sums every worker's file
+METRICS_DIR = os.environ.get('METRICS_DIR', os.path.join(
+    os.environ.get('DATA_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')), 'metrics'))
+FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', '1.0'))  # seconds
+
+# Fraction of requests whose details are logged at DEBUG (0 disables verbose request logging)
+REQUEST_LOG_SAMPLE_RATE = float(os.environ.get('REQUEST_LOG_SAMPLE_RATE', '0'))
+
+LATENCY_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+# Per-worker state; keys are "METHOD route" or "METHOD route status" strings
+_lock = threading.Lock()
+_latency = {}    # key -> [bucket counts..., +Inf count, sum]
+_statuses = {}   # key -> count
+_bytes_sent = {}  # key -> bytes
+_in_flight = 0
+_last_flush = 0.0
+
+
+def should_log_request():
+    """Decide whether this request gets verbose (sampled) debug logging"""
+    return REQUEST_LOG_SAMPLE_RATE > 0 and random.random() < REQUEST_LOG_SAMPLE_RATE
+
+
+def _route_label():
+    rule = request.url_rule
+    return rule.rule if rule is not None else 'unmatched'
+
+
+def _before_request():
+    global _in_flight
+    request.environ['metrics.start'] = time.perf_counter()
+    with _lock:
+        _in_flight += 1
+
+
+def _after_request(response):
+    start = request.environ.get('metrics.start')
+    if start is None:
+        return response
+
+    elapsed = time.perf_counter() - start
+    key = f"{request.method} {_route_label()}"
+    status_key = f"{key} {response.status_code}"
+    size = response.content_length or 0
+
+    with _lock:
+        series = _latency.get(key)
+        if series is None:
+            series = _latency[key] = [0] * (len(LATENCY_BUCKETS) + 2)
+        series[bisect.bisect_left(LATENCY_BUCKETS, elapsed)] += 1
+        series[-1] += elapsed
+        _statuses[status_key] = _statuses.get(status_key, 0) + 1
+        _bytes_sent[key] = _bytes_sent.get(key, 0) + size
+
+    if time.monotonic() - _last_flush > FLUSH_INTERVAL:
+        flush()
+    return response
+
+
+def _teardown_request(exc):
+    global _in_flight
+    if 'metrics.start' in request.environ:
+        with _lock:
+            _in_flight -= 1
+
+
+def _worker_file(pid):
+    return os.path.join(METRICS_DIR, f"worker-{pid}.json")
+
+
+def flush():
+    """Write this worker's counters to its file in METRICS_DIR"""
+    global _last_flush
+
+    with _lock:
+        _last_flush = time.monotonic()
+        snapshot = {
+            "pid": os.getpid(),
+            "latency": {k: list(v) for k, v in _latency.items()},
+            "statuses": dict(_statuses),
+            "bytes_sent": dict(_bytes_sent),
+            "in_flight": _in_flight,
+        }
+
+    try:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        path = _worker_file(os.getpid())
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.error(f"Error flushing request metrics: {str(e)}")
+
+
+def reset_worker_files():
+    """Remove every worker file; call from the gunicorn master before workers start"""
+    if not os.path.isdir(METRICS_DIR):
+        return
+    for name in os.listdir(METRICS_DIR):
+        if name.startswith('worker-'):
+            os.remove(os.path.join(METRICS_DIR, name))
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _collect():
+    """Merge every worker's file; counters of exited workers are kept, their gauges are not"""
+    latency, statuses, bytes_sent, in_flight = {}, {}, {}, 0
+
+    for name in os.listdir(METRICS_DIR) if os.path.isdir(METRICS_DIR) else []:
+        if not (name.startswith('worker-') and name.endswith('.json')):
+            continue
+        try:
+            with open(os.path.join(METRICS_DIR, name)) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue
+
+        for key, series in snapshot["latency"].items():
+            merged = latency.setdefault(key, [0] * len(series))
+            for i, value in enumerate(series):
+                merged[i] += value
+        for key, count in snapshot["statuses"].items():
+            statuses[key] = statuses.get(key, 0) + count
+        for key, size in snapshot["bytes_sent"].items():
+            bytes_sent[key] = bytes_sent.get(key, 0) + size
+        if _pid_alive(snapshot["pid"]):
+            in_flight += snapshot["in_flight"]
+
+    return latency, statuses, bytes_sent, in_flight
+
+
+def _labels(key, with_status=False):
+    parts = key.split(' ')
+    method, route = parts[0], parts[1]
+    route = route.replace('\\', '\\\\').replace('"', '\\"')
+    labels = f'method="{method}",route="{route}"'
+    if with_status:
+        labels += f',status="{parts[2]}"'
+    return labels
+
+
+def render_metrics():
+    """Render metrics from all workers in the Prometheus text exposition format"""
+    flush()
+    latency, statuses, bytes_sent, in_flight = _collect()
+
+    lines = [
+        "# HELP http_request_duration_seconds Time spent handling requests, by route.",
+        "# TYPE http_request_duration_seconds histogram",
+    ]
+    for key in sorted(latency):
+        series = latency[key]
+        labels = _labels(key)
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS, series):
+            cumulative += count
+            lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+        cumulative += series[len(LATENCY_BUCKETS)]
+        lines.append(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {cumulative}')
+        lines.append(f'http_request_duration_seconds_sum{{{labels}}} {series[-1]:.6f}')
+        lines.append(f'http_request_duration_seconds_count{{{labels}}} {cumulative}')
+
+    lines += [
+        "# HELP http_requests_total Requests handled, by route and status code.",
+        "# TYPE http_requests_total counter",
+    ]
+    for key in sorted(statuses):
+        lines.append(f'http_requests_total{{{_labels(key, with_status=True)}}} {statuses[key]}')
+
+    lines += [
+        "# HELP http_response_bytes_total Response body bytes sent, by route.",
+        "# TYPE http_response_bytes_total counter",
+    ]
+    for key in sorted(bytes_sent):
+        lines.append(f'http_response_bytes_total{{{_labels(key)}}} {bytes_sent[key]}')
+
+    lines += [
+        "# HELP http_requests_in_flight Requests currently being handled across live workers.",
+        "# TYPE http_requests_in_flight gauge",
+        f"http_requests_in_flight {in_flight}",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def init_app(app):
+    """Register the timing hooks; call before any other before_request handler"""
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
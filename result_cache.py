@@ -0,0 +1,334 @@
+import os
+import json
+import time
+import shutil
+import sqlite3
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+import numpy as np
+from param_store import DATA_DIR
+from run_store import METRIC_COLUMNS, canonical_params, params_hash, get_run, params_generation, runs_by_params_hash
+
+logger = logging.getLogger(__name__)
+
+# Results addressed by the hash of the canonical simulation parameters, so "800" and 800.0
+# (or the same preset in another key order) land on the same entry. Metrics and analytics
+# come from the runs stored under that hash; screenshots are linked into RESULT_DIR/<hash>.<version>,
+# a fresh directory per stored set, so replacing a set is a single row update and readers
+# never see the directory missing.
+RESULT_DB_PATH = os.environ.get('RESULT_DB_PATH', os.path.join(DATA_DIR, 'results.db'))
+RESULT_DIR = os.environ.get('RESULT_DIR', os.path.join(DATA_DIR, 'results'))
+RESULT_CACHE_SIZE = int(os.environ.get('RESULT_CACHE_SIZE', 256))  # assembled results kept per worker
+RESULT_CACHE_MAX_BYTES = int(os.environ.get('RESULT_CACHE_MAX_BYTES', 2 * 1024 ** 3))  # screenshot storage
+RESULT_MAX_AGE_S = float(os.environ.get('RESULT_MAX_AGE_S', 30 * 24 * 3600))  # unused entries expire; 0 never
+# Hit/miss counters and last-used times are gathered per worker and written by its maintenance thread
+USAGE_FLUSH_INTERVAL = float(os.environ.get('RESULT_USAGE_FLUSH_INTERVAL', 10))
+EXPIRY_INTERVAL = float(os.environ.get('RESULT_EXPIRY_INTERVAL', 3600))  # seconds between expiry passes
+
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_ready_pid = None
+_memory = OrderedDict()  # params hash -> (token, result)
+_memory_lock = threading.Lock()
+_usage = {"hits": 0, "misses": 0, "used": {}}  # not yet flushed; used: params hash -> (params JSON, last used, hits)
+_usage_lock = threading.Lock()
+_maintenance_lock = threading.Lock()
+_maintenance_pid = None
+
+
+def _connect():
+    """Return this thread's connection to the result cache database"""
+    global _schema_ready_pid
+
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and _local.pid == os.getpid():
+        return conn
+
+    os.makedirs(os.path.dirname(RESULT_DB_PATH), exist_ok=True)
+    conn = sqlite3.connect(RESULT_DB_PATH, timeout=5.0, isolation_level=None, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+
+    with _schema_lock:
+        if _schema_ready_pid != os.getpid():
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                " params_hash TEXT PRIMARY KEY,"
+                " params TEXT NOT NULL,"
+                " screenshot_count INTEGER NOT NULL DEFAULT 0,"
+                " bytes INTEGER NOT NULL DEFAULT 0,"
+                " updated_at REAL NOT NULL,"
+                " last_used REAL NOT NULL,"
+                " hits INTEGER NOT NULL DEFAULT 0,"
+                " version TEXT"
+                ") WITHOUT ROWID"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)")
+            conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+                         " WITHOUT ROWID")
+            _schema_ready_pid = os.getpid()
+
+    _local.conn = conn
+    _local.pid = os.getpid()
+    return conn
+
+
+def _count(conn, name, n=1):
+    conn.execute("INSERT INTO counters (name, value) VALUES (?, ?)"
+                 " ON CONFLICT(name) DO UPDATE SET value = value + excluded.value", (name, n))
+
+
+def result_dir(key, version):
+    if len(key) != 64 or not key.isalnum():
+        raise ValueError(f"Invalid params hash {key!r}")
+    return os.path.join(RESULT_DIR, f"{key}.{version}")
+
+
+def _summarize(runs):
+    """Per-metric count/mean/std/min/max over the finished runs of one parameter set"""
+    summary = {"runs": len(runs)}
+    for name in METRIC_COLUMNS:
+        values = np.array([run[name] for run in runs if run[name] is not None], dtype=np.float64)
+        if len(values):
+            summary[name] = {"count": len(values), "mean": float(values.mean()), "std": float(values.std()),
+                             "min": float(values.min()), "max": float(values.max())}
+    return summary
+
+
+def _assemble(key, entry):
+    """Build the cached result for a hash from its runs and stored screenshots"""
+    runs = runs_by_params_hash(key)
+    if not runs and entry is None:
+        return None
+    return {
+        "params_hash": key,
+        "params": canonical_params(runs[0]) if runs else json.loads(entry["params"]),
+        "run": get_run(runs[0]["run_id"]) if runs else None,
+        "run_ids": [run["run_id"] for run in runs],
+        "analytics": _summarize(runs),
+        "screenshots": {
+            "count": entry["screenshot_count"] if entry is not None else 0,
+            "url": f"/results/{key}/screenshots" if entry is not None and entry["screenshot_count"] else None,
+        },
+    }
+
+
+def lookup_hash(key):
+    """Return the stored result for a params hash (counting a hit or a miss), or None"""
+    start_maintenance()
+    conn = _connect()
+    entry = conn.execute("SELECT params, screenshot_count, updated_at FROM results WHERE params_hash = ?",
+                         (key,)).fetchone()
+    if entry is not None and not entry["screenshot_count"]:
+        entry = None
+    # Valid until a run of this hash changes or its screenshots are replaced
+    token = (params_generation(key), entry["updated_at"] if entry is not None else None)
+
+    with _memory_lock:
+        cached = _memory.get(key)
+        if cached is not None and cached[0] == token:
+            _memory.move_to_end(key)
+            result = cached[1]
+        else:
+            result = None
+    if result is None:
+        result = _assemble(key, entry)
+        if result is not None:
+            with _memory_lock:
+                _memory[key] = (token, result)
+                while len(_memory) > RESULT_CACHE_SIZE:
+                    _memory.popitem(last=False)
+
+    with _usage_lock:
+        if result is None:
+            _usage["misses"] += 1
+        else:
+            _usage["hits"] += 1
+            _, _, hits = _usage["used"].get(key, (None, None, 0))
+            _usage["used"][key] = (result["params"], time.time(), hits + 1)
+    return result
+
+
+def flush_usage():
+    """Write this worker's pending hit/miss counts and last-used times in one transaction"""
+    with _usage_lock:
+        hits, misses, used = _usage["hits"], _usage["misses"], _usage["used"]
+        _usage.update(hits=0, misses=0, used={})
+    if not (hits or misses or used):
+        return
+    conn = _connect()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        _count(conn, "hits", hits)
+        _count(conn, "misses", misses)
+        conn.executemany(
+            "INSERT INTO results (params_hash, params, updated_at, last_used, hits) VALUES (?, ?, ?, ?, ?)"
+            " ON CONFLICT(params_hash) DO UPDATE SET last_used = MAX(last_used, excluded.last_used),"
+            " hits = hits + excluded.hits",
+            [(key, json.dumps(params), last_used, last_used, count) for key, (params, last_used, count) in used.items()]
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def lookup(params):
+    """Canonicalize a simulation_data payload and return (params_hash, result or None)"""
+    key = params_hash(params)
+    return key, lookup_hash(key)
+
+
+def store_screenshots(params, paths):
+    """Keep a capture's screenshots under its parameter hash, replacing any earlier set"""
+    if not paths:
+        return None
+    key = params_hash(params)
+    os.makedirs(RESULT_DIR, exist_ok=True)
+    directory = tempfile.mkdtemp(prefix=f"{key}.", dir=RESULT_DIR)
+    os.chmod(directory, 0o755)
+    version = os.path.basename(directory)[len(key) + 1:]
+    size = 0
+    try:
+        for path in paths:
+            target = os.path.join(directory, os.path.basename(path))
+            try:
+                # Hard links cost no space while the capture session still holds the frames
+                os.link(path, target)
+            except OSError:
+                shutil.copy2(path, target)
+            size += os.path.getsize(target)
+    except Exception:
+        shutil.rmtree(directory, ignore_errors=True)
+        raise
+
+    # The row points readers at the new set; concurrent stores serialize here and the last one stands
+    now = time.time()
+    conn = _connect()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        previous = conn.execute("SELECT version FROM results WHERE params_hash = ?", (key,)).fetchone()
+        conn.execute(
+            "INSERT INTO results (params_hash, params, screenshot_count, bytes, updated_at, last_used, version)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT(params_hash) DO UPDATE SET params = excluded.params,"
+            " screenshot_count = excluded.screenshot_count, bytes = excluded.bytes,"
+            " updated_at = excluded.updated_at, last_used = excluded.last_used, version = excluded.version",
+            (key, json.dumps(canonical_params(params)), len(paths), size, now, now, version)
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        shutil.rmtree(directory, ignore_errors=True)
+        raise
+    if previous is not None and previous["version"]:
+        shutil.rmtree(result_dir(key, previous["version"]), ignore_errors=True)
+    evict()
+    return key
+
+
+def _stored_version(key):
+    row = _connect().execute("SELECT version FROM results WHERE params_hash = ?", (key,)).fetchone()
+    return row["version"] if row is not None else None
+
+
+def screenshot_paths(key):
+    """Sorted paths of the screenshots stored for a params hash"""
+    version = _stored_version(key)
+    while version:
+        directory = result_dir(key, version)
+        try:
+            names = os.listdir(directory)
+        except FileNotFoundError:
+            names = None
+        # A set is only deleted after the row moves off it, so an unchanged row means a complete listing
+        current = _stored_version(key)
+        if current == version:
+            return sorted(os.path.join(directory, name) for name in names or [])
+        version = current
+    return []
+
+
+def evict(max_bytes=None):
+    """Drop the least recently used screenshot sets until the store fits in max_bytes"""
+    max_bytes = RESULT_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    conn = _connect()
+    total = conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM results").fetchone()[0]
+    evicted = 0
+    if total > max_bytes:
+        rows = conn.execute(
+            "SELECT params_hash, bytes, version FROM results WHERE bytes > 0 ORDER BY last_used").fetchall()
+        for row in rows:
+            if total <= max_bytes:
+                break
+            # Only the set that was selected; one stored since then stays
+            cursor = conn.execute(
+                "UPDATE results SET screenshot_count = 0, bytes = 0, updated_at = ?, version = NULL"
+                " WHERE params_hash = ? AND version = ?", (time.time(), row["params_hash"], row["version"]))
+            if cursor.rowcount:
+                shutil.rmtree(result_dir(row["params_hash"], row["version"]), ignore_errors=True)
+                evicted += 1
+            total -= row["bytes"]
+        _count(conn, "evictions", evicted)
+        logger.info(f"Evicted {evicted} screenshot sets from the result cache")
+    return evicted
+
+
+def expire(max_age=None):
+    """Delete entries (and their screenshots) not used for max_age seconds"""
+    max_age = RESULT_MAX_AGE_S if max_age is None else max_age
+    if not max_age:
+        return 0
+    conn = _connect()
+    cutoff = time.time() - max_age
+    expired = 0
+    for row in conn.execute("SELECT params_hash, version FROM results WHERE last_used < ?", (cutoff,)).fetchall():
+        cursor = conn.execute("DELETE FROM results WHERE params_hash = ? AND last_used < ? AND version IS ?",
+                              (row["params_hash"], cutoff, row["version"]))
+        if cursor.rowcount:
+            if row["version"]:
+                shutil.rmtree(result_dir(row["params_hash"], row["version"]), ignore_errors=True)
+            expired += 1
+    if expired:
+        logger.info(f"Expired {expired} result cache entries")
+    return expired
+
+
+def stats():
+    """Hit/miss/eviction counters (all workers, flushed every USAGE_FLUSH_INTERVAL) and the current store size"""
+    flush_usage()
+    conn = _connect()
+    counters = dict(conn.execute("SELECT name, value FROM counters").fetchall())
+    entries, stored, size = conn.execute(
+        "SELECT COUNT(*), COALESCE(SUM(screenshot_count > 0), 0), COALESCE(SUM(bytes), 0) FROM results").fetchone()
+    hits, misses = counters.get("hits", 0), counters.get("misses", 0)
+    with _memory_lock:
+        memory = len(_memory)
+    return {"hits": hits, "misses": misses, "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            "evictions": counters.get("evictions", 0), "entries": entries, "screenshot_sets": stored,
+            "bytes": size, "max_bytes": RESULT_CACHE_MAX_BYTES, "memory_entries": memory}
+
+
+def maintenance_loop():
+    last_expiry = 0.0
+    while True:
+        try:
+            flush_usage()
+            if time.monotonic() - last_expiry >= EXPIRY_INTERVAL:
+                last_expiry = time.monotonic()
+                expire()
+        except Exception as e:
+            logger.error(f"Error maintaining the result cache: {str(e)}")
+        time.sleep(USAGE_FLUSH_INTERVAL)
+
+
+def start_maintenance():
+    """Start this process's usage flush/expiry thread (once per process, so forked workers start their own)"""
+    global _maintenance_pid
+    with _maintenance_lock:
+        if _maintenance_pid == os.getpid():
+            return
+        _maintenance_pid = os.getpid()
+    threading.Thread(target=maintenance_loop, name='result-cache-maintenance', daemon=True).start()
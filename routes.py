@@ -0,0 +1,738 @@
+import os
+import json
+import logging
+from datetime import datetime
+from flask import (Blueprint, Response, current_app, request, jsonify, redirect, make_response,
+                   send_file, stream_with_context)
+from werkzeug.exceptions import HTTPException
+from param_store import (SESSION_COOKIE, get_params, get_params_payload, set_params,
+                         resolve_session_id, new_session_id, make_etag)
+from static_manifest import send_static
+from page_cache import render_page
+import request_metrics
+
+logger = logging.getLogger(__name__)
+
+# Every HTTP route of the site. Subsystems that pull in Pillow, NumPy or XGBoost are
+# imported inside the views that need them, so a worker that only serves pages and the
+# Unity build never loads them (unless create_app(warm=True) preloaded them pre-fork).
+bp = Blueprint('main', __name__)
+
+
+def push(event, data, room):
+    """Emit to a Socket.IO room when the app runs with Socket.IO (no-op otherwise)"""
+    socketio = current_app.extensions.get('socketio')
+    if socketio is not None:
+        socketio.emit(event, data, to=room)
+
+
+@bp.before_app_request
+def before_request():
+    """Automatically upgrade HTTP to HTTPS in production and log request info"""
+    if request_metrics.should_log_request():
+        logger.debug(f"Request URL: {request.url}")
+        logger.debug(f"Request Headers: {request.headers}")
+
+    if "localhost" not in request.url and "127.0.0.1" not in request.url and request.headers.get("X-Forwarded-Proto", "http") == "http":
+        url = request.url.replace("http://", "https://", 1)
+        return redirect(url, code=301)
+
+@bp.app_context_processor
+def inject_now():
+    return {'now': datetime.now()}
+
+# Error handler for bad requests
+@bp.app_errorhandler(400)
+def handle_bad_request(e):
+    logger.error(f"Bad request: {e}")
+    return jsonify({"error": "Bad request", "message": str(e)}), 400
+
+@bp.app_errorhandler(404)
+def handle_not_found(e):
+    logger.error(f"Not found: {request.path}")
+    return "", 404
+
+@bp.app_errorhandler(Exception)
+def handle_exception(e):
+    """Log unhandled errors and answer with JSON instead of an HTML error page"""
+    if isinstance(e, HTTPException):
+        return e
+    logger.error(f"Error handling {request.method} {request.path}: {str(e)}")
+    return jsonify({"error": str(e)}), 500
+
+# Serve the Self-Organization page (main landing page)
+@bp.route('/')
+def index():
+    logger.info("Index route accessed!")
+    return render_page('index.html')
+
+@bp.route('/test')
+def test():
+    return "Test route is working!"
+
+# Serve the simulator introduction page with "Go to Simulator Form" button
+@bp.route('/simulator')
+def simulator():
+    return render_page('simulator.html')
+
+# Serve the simulator configuration form page
+@bp.route('/simulator_form')
+def simulator_form():
+    session_id = resolve_session_id(request)
+    response = render_page('simulator-form.html', params=get_params(session_id))
+    response.vary.add('Cookie')
+    if not session_id:
+        response.set_cookie(SESSION_COOKIE, new_session_id(), httponly=True, samesite='Lax')
+    return response
+
+# Handle form submission and redirect to Unity WebGL game
+@bp.route('/set-data', methods=['POST'])
+def set_data():
+    import result_cache
+
+    params = request.get_json(silent=True)
+    if not isinstance(params, dict):
+        return jsonify({"error": "Expected a JSON object of simulation parameters"}), 400
+
+    session_id = resolve_session_id(request) or new_session_id()
+    version = set_params(session_id, params)
+    logger.info(f"Received Data for session {session_id} (v{version}): {params}")
+    push('params_updated', {"session_id": session_id, "version": version, "params": params}, session_id)
+    # Presets are re-run constantly; hand back whatever is already known for these parameters
+    key, cached = result_cache.lookup(params)
+    response = jsonify({"message": "Data received!", "redirect_url": "/game",
+                        "session_id": session_id, "version": version,
+                        "params_hash": key, "cached": cached})
+    response.set_cookie(SESSION_COOKIE, session_id, httponly=True, samesite='Lax')
+    return response
+
+# Unity WebGL fetches stored parameters (polled, so answer with 304 when unchanged)
+@bp.route('/get-data', methods=['GET'])
+def get_data():
+    session_id = resolve_session_id(request)
+    payload, _ = get_params_payload(session_id)
+    etag = make_etag(payload)
+
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(payload, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+# ✅ Serve Unity WebGL `index.html`
+@bp.route('/game')
+def game():
+    return send_static("Try_web_build/index.html")
+
+# Allow direct access to favicon.ico
+@bp.route('/favicon.ico')
+def favicon():
+    return send_static("Try_web_build/TemplateData/favicon.ico")
+
+# Serve style.css directly
+@bp.route('/style.css')
+def style_css():
+    return send_static("Try_web_build/TemplateData/style.css")
+
+# Serve Try_web_build.loader.js directly (noted in your error screenshot)
+@bp.route('/Try_web_build.loader.js')
+def loader_js():
+    return send_static("Try_web_build/Try_web_build.loader.js", "Try_web_build/Build/Try_web_build.loader.js")
+
+# Serve Unity WebGL files with proper prefixes
+@bp.route('/Build/<path:filename>')
+def serve_build_files_direct(filename):
+    return send_static(f"Try_web_build/Build/{filename}")
+
+@bp.route('/TemplateData/<path:filename>')
+def serve_template_files_direct(filename):
+    return send_static(f"Try_web_build/TemplateData/{filename}")
+
+# The original routes with /game prefix
+@bp.route('/game/Build/<path:filename>')
+def serve_build_files(filename):
+    return send_static(f"Try_web_build/Build/{filename}")
+
+@bp.route('/game/TemplateData/<path:filename>')
+def serve_template_files(filename):
+    return send_static(f"Try_web_build/TemplateData/{filename}")
+
+@bp.route('/game/<path:filename>')
+def serve_game_root_files(filename):
+    return send_static(f"Try_web_build/{filename}")
+
+# Catch-all route for other static files: a static file, else a Unity build root file.
+# Both are manifest lookups, so unknown paths 404 without touching the filesystem.
+@bp.route('/<path:filename>')
+def serve_static_root_files(filename):
+    return send_static(filename, f"Try_web_build/{filename}")
+
+def capture_session_id():
+    """Capture sessions follow the parameter session; clients without one share 'default'"""
+    return resolve_session_id(request, default='default')
+
+def run_start_capture(session_id, options):
+    """Start a session's capture and push start_capture to every client in its room"""
+    from screenshot_handler import start_screenshot_capture
+
+    result = start_screenshot_capture(session_id, options)
+    if result["status"] == "started":
+        push('start_capture', dict(result, session_id=session_id), session_id)
+    return result
+
+def run_stop_capture(session_id):
+    """Stop a session's capture, keep its frames in the result cache and push stop_capture"""
+    from screenshot_handler import stop_screenshot_capture, get_screenshot_paths
+    import result_cache
+
+    result = stop_screenshot_capture(session_id)
+    if result["screenshot_count"]:
+        result["params_hash"] = result_cache.store_screenshots(get_params(session_id),
+                                                               get_screenshot_paths(session_id))
+    push('stop_capture', dict(result, session_id=session_id), session_id)
+    return result
+
+@bp.route('/start-capture', methods=['POST'])
+def start_capture():
+    """Start capturing screenshots at regular intervals"""
+    options = request.get_json(silent=True)
+    if options is not None and not isinstance(options, dict):
+        return jsonify({"error": "Capture options must be a JSON object"}), 400
+    try:
+        result = run_start_capture(capture_session_id(), options)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(result)
+
+@bp.route('/stop-capture', methods=['POST'])
+def stop_capture():
+    """Stop capturing screenshots"""
+    result = run_stop_capture(capture_session_id())
+    return jsonify(result)
+
+@bp.route('/upload-frames', methods=['POST'])
+def upload_frames():
+    """Store a batch of browser canvas frames (multipart or length-prefixed binary)"""
+    from frame_ingest import FrameTooLargeError, ingest_frames
+
+    try:
+        return jsonify(ingest_frames(request, capture_session_id()))
+    except FrameTooLargeError as e:
+        logger.error(f"Rejected frame upload: {str(e)}")
+        return jsonify({"error": str(e)}), 413
+    except ValueError as e:
+        logger.error(f"Rejected frame upload: {str(e)}")
+        return jsonify({"error": str(e)}), 400
+
+@bp.route('/capture-stats', methods=['GET'])
+def capture_stats():
+    """Report screenshot pipeline counters (dropped/late frames, queue depth)"""
+    from screenshot_handler import get_capture_stats
+
+    return jsonify(get_capture_stats(capture_session_id()))
+
+@bp.route('/static/js/UnityVideoRecorder.js')
+def serve_video_recorder_js():
+    """Serve the UnityVideoRecorder.js file"""
+    return send_static('js/UnityVideoRecorder.js')
+
+# If using a custom FindGameObjects script to help locate GameManager
+@bp.route('/static/js/FindGameObjects.js')
+def serve_find_gameobjects_js():
+    """Serve the FindGameObjects.js helper file"""
+    return send_static('js/FindGameObjects.js')
+
+@bp.route('/download-screenshots', methods=['GET'])
+def download_screenshots():
+    """Download all captured screenshots as a ZIP file"""
+    from screenshot_handler import get_screenshots_zip
+    from zip_stream import zip_response
+
+    zip_plan = get_screenshots_zip(capture_session_id())
+
+    if not zip_plan:
+        return jsonify({"error": "No screenshots available"}), 400
+
+    # Stream the ZIP file (supports Range requests for resuming)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return zip_response(zip_plan, f'simulation_screenshots_{timestamp}.zip')
+
+def _page_args():
+    offset, limit = int(request.args.get('offset', 0)), int(request.args.get('limit', 200))
+    if offset < 0 or not 1 <= limit <= 1000:
+        raise ValueError("offset must be >= 0 and limit between 1 and 1000")
+    return offset, limit
+
+@bp.route('/screenshots', methods=['GET'])
+def list_screenshots():
+    """A page of the session's frames with their preview URLs, for galleries"""
+    from screenshot_handler import get_screenshot_paths
+
+    try:
+        offset, limit = _page_args()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    paths = get_screenshot_paths(capture_session_id())
+    frames = [{"name": os.path.basename(path), "url": f"/screenshots/{os.path.basename(path)}/thumbnail"}
+              for path in paths[offset:offset + limit]]
+    return jsonify({"count": len(paths), "offset": offset, "frames": frames,
+                    "contact_sheet": f"/screenshots/contact-sheet?offset={offset}&limit={min(limit, 64)}"})
+
+@bp.route('/screenshots/catalog', methods=['GET'])
+def screenshot_catalog_frames():
+    """The session's cataloged frames across captures (?since=&until= epoch seconds, ?capture=, paging)"""
+    import screenshot_catalog
+    from screenshot_handler import get_session
+
+    session_id = capture_session_id()
+    try:
+        offset, limit = _page_args()
+        since, until = (float(request.args[name]) if request.args.get(name) else None for name in ('since', 'until'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    get_session(session_id, create=False)  # catalogs frames stored before the catalog existed
+    rows = screenshot_catalog.query_frames(session_id, since, until, request.args.get('capture'), limit, offset)
+    frames = [{"name": os.path.basename(row["path"]), "capture_id": row["capture_id"],
+               "created_at": row["created_at"], "size": row["size"], "sha256": row["sha256"]} for row in rows]
+    return jsonify({"offset": offset, "frames": frames, "captures": screenshot_catalog.list_captures(session_id)})
+
+@bp.route('/screenshots/catalog/stats', methods=['GET'])
+def screenshot_catalog_stats():
+    """Stored frame totals, retention limits and the last retention pass"""
+    import screenshot_catalog
+
+    return jsonify(screenshot_catalog.stats())
+
+@bp.route('/screenshots/<name>/thumbnail', methods=['GET'])
+def screenshot_thumbnail(name):
+    """A downscaled preview of one frame (?width=320&format=webp|jpeg&quality=75)"""
+    import thumbnails
+
+    try:
+        options = thumbnails.parse_options(request.args)
+        key, path = thumbnails.thumbnail(capture_session_id(), name, options)
+    except KeyError:
+        return jsonify({"error": "Unknown frame"}), 404
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return send_file(path, mimetype=thumbnails.FORMATS[options["format"]][0], conditional=True, etag=key)
+
+@bp.route('/screenshots/contact-sheet', methods=['GET'])
+def screenshot_contact_sheet():
+    """A grid of frame previews (?offset=0&limit=64&columns=8&width=160)"""
+    from screenshot_handler import get_screenshot_paths
+    import thumbnails
+
+    try:
+        options = thumbnails.parse_options(request.args, default_width=160)
+        offset, limit = _page_args()
+        paths = get_screenshot_paths(capture_session_id())[offset:offset + min(limit, thumbnails.MAX_SHEET_TILES)]
+        key, path = thumbnails.contact_sheet(capture_session_id(), paths, options,
+                                             int(request.args.get('columns', 8)))
+    except KeyError:
+        return jsonify({"error": "Unknown frame"}), 404
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return send_file(path, mimetype=thumbnails.FORMATS[options["format"]][0], conditional=True, etag=key)
+
+@bp.route('/timelapse', methods=['GET'])
+def timelapse():
+    """Stream the session's screenshots as a GIF, WebP or MJPEG timelapse (cached per settings)"""
+    from screenshot_handler import get_screenshot_paths
+    import timelapse
+
+    try:
+        settings = timelapse.parse_settings(request.args)
+        session_id = capture_session_id()
+        paths = get_screenshot_paths(session_id)
+        if not paths:
+            return jsonify({"error": "No screenshots available"}), 400
+        key, path, mimetype, chunks = timelapse.build_timelapse(session_id, paths, settings)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    download_name = f"simulation_timelapse_{datetime.now():%Y%m%d_%H%M%S}.{timelapse.FORMATS[settings['format']][1]}"
+    as_attachment = request.args.get('download') == '1'
+    hit = chunks is None
+    if hit:
+        response = send_file(path, mimetype=mimetype, conditional=True, etag=key, as_attachment=as_attachment,
+                             download_name=download_name)
+    else:
+        response = Response(chunks, content_type=mimetype)
+        response.set_etag(key)
+        if as_attachment:
+            response.headers['Content-Disposition'] = f'attachment; filename="{download_name}"'
+    response.headers['X-Cache'] = 'hit' if hit else 'miss'
+    return response
+
+@bp.route('/uploads', methods=['POST'])
+def create_upload():
+    """Start a resumable video upload: {filename, content_type, size (optional)}"""
+    import video_upload
+
+    data = request.get_json(silent=True) or {}
+    try:
+        upload = video_upload.create_upload(data.get('filename'), data.get('content_type'), data.get('size'),
+                                            resolve_session_id(request))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(upload), 201
+
+@bp.route('/uploads', methods=['GET'])
+def list_uploads():
+    """The session's uploads (?status=uploading finds recordings left by a crashed tab)"""
+    import video_upload
+
+    return jsonify({"uploads": video_upload.list_uploads(resolve_session_id(request), request.args.get('status'))})
+
+@bp.route('/uploads/<upload_id>', methods=['GET'])
+def upload_status(upload_id):
+    """Where to resume: the number of bytes stored"""
+    import video_upload
+
+    upload = video_upload.get_upload(upload_id)
+    if upload is None:
+        return jsonify({"error": "Unknown upload"}), 404
+    return jsonify(upload)
+
+@bp.route('/uploads/<upload_id>/chunks/<int:offset>', methods=['PUT', 'POST'])
+def upload_chunk(upload_id, offset):
+    """Append raw bytes at offset, streamed to disk; 409 carries the offset to resume from"""
+    import video_upload
+    from werkzeug.exceptions import ClientDisconnected
+
+    try:
+        upload = video_upload.append_chunk(upload_id, offset, request.stream, request.content_length)
+    except KeyError:
+        return jsonify({"error": "Unknown upload"}), 404
+    except (video_upload.OffsetError, video_upload.UploadBusyError) as e:
+        upload = video_upload.get_upload(upload_id)
+        return jsonify({"error": str(e), "offset": upload["offset"] if upload else 0}), 409
+    except ClientDisconnected:
+        logger.info(f"Upload {upload_id} interrupted; the bytes received are kept")
+        return jsonify({"error": "Connection dropped"}), 400
+    except ValueError as e:
+        logger.error(f"Rejected chunk at {offset} for upload {upload_id}: {str(e)}")
+        return jsonify({"error": str(e)}), 400
+    return jsonify(upload)
+
+@bp.route('/uploads/<upload_id>/complete', methods=['POST'])
+def complete_upload(upload_id):
+    import video_upload
+
+    try:
+        return jsonify(video_upload.complete_upload(upload_id))
+    except KeyError:
+        return jsonify({"error": "Unknown upload"}), 404
+    except video_upload.OffsetError as e:
+        return jsonify({"error": f"Upload is incomplete: {str(e)}", "offset": e.expected}), 409
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+@bp.route('/uploads/<upload_id>', methods=['DELETE'])
+def abort_upload(upload_id):
+    import video_upload
+
+    if not video_upload.abort_upload(upload_id):
+        return jsonify({"error": "Unknown upload"}), 404
+    return jsonify({"status": "deleted"})
+
+@bp.route('/uploads/<upload_id>/file', methods=['GET'])
+def uploaded_video(upload_id):
+    """Download a completed recording (supports Range requests)"""
+    import video_upload
+
+    upload = video_upload.get_upload(upload_id)
+    if upload is None or upload["status"] != 'complete':
+        return jsonify({"error": "Unknown upload"}), 404
+    return send_file(video_upload.video_path(upload), mimetype=upload["content_type"], conditional=True,
+                     download_name=upload["filename"])
+
+@bp.route('/runs', methods=['POST'])
+def ingest_metrics():
+    """Persist a simulation run's parameters and metrics to the run store"""
+    from run_store import ingest_run
+    import cluster_timeline
+
+    metrics_data = request.get_json(silent=True)
+    if not isinstance(metrics_data, dict):
+        return jsonify({"error": "No metrics data received"}), 400
+
+    try:
+        run_id = ingest_run(metrics_data, resolve_session_id(request))
+    except ValueError as e:
+        logger.error(f"Rejected metrics run: {str(e)}")
+        return jsonify({"error": str(e)}), 400
+    cluster_timeline.precompute(run_id)
+    return jsonify({"status": "ok", "run_id": run_id}), 201
+
+@bp.route('/runs', methods=['GET'])
+def runs():
+    """List the most recent runs (only the caller's when a session is given)"""
+    from run_store import list_runs
+
+    limit = request.args.get('limit', 100, type=int)
+    return jsonify(list_runs(resolve_session_id(request), limit=limit))
+
+@bp.route('/runs/<run_id>', methods=['GET'])
+def run_detail(run_id):
+    """Return one run's parameters and summary metrics"""
+    from run_store import get_run
+
+    run = get_run(run_id)
+    if run is None:
+        return jsonify({"error": "Unknown run"}), 404
+    return jsonify(run)
+
+@bp.route('/runs/<run_id>/chunks/<int:seq>', methods=['POST'])
+def upload_run_chunk(run_id, seq):
+    """Append a numbered NDJSON or binary chunk (optionally gzip-encoded) to a run"""
+    from run_store import SequenceError
+    from metrics_ingest import ChunkTooLargeError, ingest_chunk
+
+    try:
+        return jsonify(ingest_chunk(request, run_id, seq))
+    except KeyError:
+        return jsonify({"error": "Unknown run"}), 404
+    except SequenceError as e:
+        return jsonify({"error": str(e), "next_seq": e.expected}), 409
+    except ChunkTooLargeError as e:
+        return jsonify({"error": str(e)}), 413
+    except ValueError as e:
+        logger.error(f"Rejected chunk {seq} for run {run_id}: {str(e)}")
+        return jsonify({"error": str(e)}), 400
+
+@bp.route('/runs/<run_id>/finish', methods=['POST'])
+def finish_run(run_id):
+    """Store the summary metrics of a run whose series were streamed in chunks"""
+    from run_store import get_run, update_run_metrics
+
+    data = request.get_json(silent=True) or {}
+    if not update_run_metrics(run_id, data.get("metrics") or {}, end_time=data.get("end_time")):
+        return jsonify({"error": "Unknown run"}), 404
+    return jsonify(get_run(run_id))
+
+@bp.route('/runs/<run_id>/clusters', methods=['GET'])
+def run_clusters(run_id):
+    """Cluster-size distribution over time, rebuilt from the run's bond events"""
+    from run_store import get_run
+    from cluster_timeline import get_timeline, timeline_json
+
+    if not run_id.isalnum() or get_run(run_id) is None:
+        return jsonify({"error": "Unknown run"}), 404
+    try:
+        timeline, histograms = get_timeline(run_id, request.args.get('resolution', type=float))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"run_id": run_id, "samples": timeline_json(timeline, histograms)})
+
+@bp.route('/runs/<run_id>/telemetry', methods=['GET'])
+def run_telemetry(run_id):
+    """Recent bond/cluster series of a run, downsampled (?points=500&method=lttb|minmax)"""
+    import telemetry
+
+    try:
+        result = telemetry.snapshot(run_id, request.args.get('points', type=int), request.args.get('method'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if result is None:
+        return jsonify({"error": "Unknown run"}), 404
+    return jsonify(result)
+
+@bp.route('/runs/<run_id>/export', methods=['GET'])
+def export_run(run_id):
+    """Stream a stored run back as a metrics JSON file"""
+    from run_store import get_run, iter_run_export
+
+    if not run_id.isalnum() or get_run(run_id) is None:
+        return jsonify({"error": "Unknown run"}), 404
+
+    response = Response(stream_with_context(iter_run_export(run_id)), mimetype='application/json')
+    response.headers["Content-Disposition"] = f"attachment; filename=vibration_simulation_metrics_{run_id}.json"
+    return response
+
+@bp.route('/analytics/runs', methods=['GET', 'POST'])
+def analytics_runs():
+    """Group/bin runs by parameters and summarize a metric (percentiles, histograms)"""
+    from run_analytics import cached_query, parse_query_args
+
+    query = request.get_json(silent=True) if request.method == 'POST' else parse_query_args(request.args)
+    if not isinstance(query, dict):
+        return jsonify({"error": "Query must be a JSON object"}), 400
+    try:
+        key, result = cached_query(query)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Results only change when runs do, so dashboards can revalidate with If-None-Match
+    if request.method == 'GET' and request.if_none_match.contains(key):
+        response = Response(status=304)
+    else:
+        response = jsonify(result)
+    response.set_etag(key)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@bp.route('/surrogate', methods=['GET'])
+def surrogate_status():
+    """Report the surrogate model currently loaded by this worker"""
+    import surrogate
+
+    return jsonify(surrogate.status())
+
+@bp.route('/surrogate/train', methods=['POST'])
+def surrogate_train():
+    """Retrain the surrogate on all stored runs; workers pick the new model up on their own"""
+    import surrogate
+
+    try:
+        return jsonify(surrogate.train())
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+@bp.route('/surrogate/predict', methods=['POST'])
+def surrogate_predict():
+    """Predict run outcomes for a batch of points and/or a parameter grid"""
+    import surrogate
+
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Expected a JSON object"}), 400
+    try:
+        return jsonify(surrogate.predict(data.get("points"), data.get("grid"), data.get("base")))
+    except LookupError as e:
+        return jsonify({"error": str(e)}), 503
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+@bp.route('/sweeps', methods=['POST'])
+def create_sweep():
+    """Expand a grid/random/LHS design into jobs and start running them"""
+    import sweeps
+
+    spec = request.get_json(silent=True)
+    if not isinstance(spec, dict):
+        return jsonify({"error": "Expected a JSON object"}), 400
+    try:
+        return jsonify(sweeps.create_sweep(spec)), 201
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+
+@bp.route('/sweeps', methods=['GET'])
+def list_sweeps():
+    """List recent sweeps"""
+    import sweeps
+
+    return jsonify(sweeps.list_sweeps())
+
+@bp.route('/sweeps/<sweep_id>', methods=['GET'])
+def sweep_status(sweep_id):
+    """Report a sweep's progress (?jobs=1 includes every job)"""
+    import sweeps
+
+    sweep = sweeps.get_sweep(sweep_id, include_jobs=request.args.get('jobs') == '1')
+    if sweep is None:
+        return jsonify({"error": "Unknown sweep"}), 404
+    return jsonify(sweep)
+
+@bp.route('/sweeps/<sweep_id>/cancel', methods=['POST'])
+def cancel_sweep(sweep_id):
+    """Cancel a sweep's queued jobs"""
+    import sweeps
+
+    sweep = sweeps.cancel_sweep(sweep_id)
+    if sweep is None:
+        return jsonify({"error": "Unknown sweep"}), 404
+    return jsonify(sweep)
+
+@bp.route('/results/lookup', methods=['POST'])
+def lookup_result():
+    """Return stored metrics, analytics and screenshots for a simulation_data payload"""
+    import result_cache
+
+    params = request.get_json(silent=True)
+    if not isinstance(params, dict):
+        return jsonify({"error": "Expected a JSON object of simulation parameters"}), 400
+    key, cached = result_cache.lookup(params)
+    if cached is None:
+        return jsonify({"params_hash": key, "cached": False}), 404
+    return jsonify(cached)
+
+@bp.route('/results/stats', methods=['GET'])
+def result_cache_stats():
+    """Result cache hit/miss/eviction counters and size"""
+    import result_cache
+
+    return jsonify(result_cache.stats())
+
+@bp.route('/results/<params_hash>', methods=['GET'])
+def cached_result(params_hash):
+    """Return the stored result for a parameter hash"""
+    import result_cache
+
+    cached = result_cache.lookup_hash(params_hash) if len(params_hash) == 64 and params_hash.isalnum() else None
+    if cached is None:
+        return jsonify({"error": "No stored result for these parameters"}), 404
+    return jsonify(cached)
+
+@bp.route('/results/<params_hash>/screenshots', methods=['GET'])
+def cached_screenshots(params_hash):
+    """Download the screenshots stored for a parameter hash as a ZIP file"""
+    import result_cache
+    from zip_stream import build_zip_plan, zip_response
+
+    try:
+        paths = result_cache.screenshot_paths(params_hash)
+    except ValueError:
+        paths = []
+    if not paths:
+        return jsonify({"error": "No screenshots available"}), 404
+    return zip_response(build_zip_plan(paths), f'simulation_screenshots_{params_hash[:12]}.zip')
+
+@bp.route('/download-metrics', methods=['POST'])
+def download_metrics():
+    """Persist the posted metrics and return them as a downloadable file"""
+    from run_store import ingest_run
+    import cluster_timeline
+
+    # Get JSON data from request
+    metrics_data = request.get_json(silent=True)
+
+    if not isinstance(metrics_data, dict):
+        return jsonify({"error": "No metrics data received"}), 400
+
+    # Keep the run server-side instead of throwing it away after the download
+    try:
+        run_id = ingest_run(metrics_data, resolve_session_id(request))
+    except ValueError as e:
+        logger.error(f"Rejected metrics run: {str(e)}")
+        return jsonify({"error": str(e)}), 400
+    cluster_timeline.precompute(run_id)
+    logger.info(f"Stored metrics run {run_id}")
+
+    # Generate a unique filename with timestamp
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    filename = f"vibration_simulation_metrics_{timestamp}.json"
+
+    # Create response with JSON file attachment
+    response = make_response(json.dumps(metrics_data, indent=2))
+    response.headers["Content-Disposition"] = f"attachment; filename={filename}"
+    response.headers["Content-Type"] = "application/json"
+    response.headers["X-Run-ID"] = run_id
+
+    logger.info(f"Returning downloadable metrics file: {filename}")
+    return response
+
+@bp.route('/metrics')
+def metrics():
+    """Prometheus scrape endpoint, aggregated over all gunicorn workers"""
+    return Response(request_metrics.render_metrics(), mimetype='text/plain; version=0.0.4')
+
+@bp.route('/healthz')
+def health_check():
+    try:
+        return jsonify({"status": "healthy"}), 200
+    except Exception as e:
+        return jsonify({"status": "unhealthy", "error": str(e)}), 500
@@ -0,0 +1,253 @@
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+from run_store import PARAM_COLUMNS, METRIC_COLUMNS, runs_generation, load_run_columns
+
+# Cross-run analytics: every statistic is computed over all matching runs at once with
+# NumPy (bincount/lexsort/searchsorted), never with a Python loop over runs.
+ANALYTICS_CACHE_SIZE = int(os.environ.get('ANALYTICS_CACHE_SIZE', 256))
+DEFAULT_STATS = ["count", "mean", "std", "min", "max", "p50"]
+MAX_GROUPS = 10000
+MAX_BINS = 1000
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_snapshot = {"generation": None, "columns": None}
+
+
+def _columns(generation):
+    """All run columns as arrays, reloaded only when the run table has changed"""
+    with _cache_lock:
+        if _snapshot["generation"] == generation:
+            return _snapshot["columns"]
+    columns = load_run_columns(list(PARAM_COLUMNS) + list(METRIC_COLUMNS))
+    # Runs written while loading make these columns newer than generation; don't label them with it
+    if runs_generation() == generation:
+        with _cache_lock:
+            _snapshot.update(generation=generation, columns=columns)
+    return columns
+
+
+def _number(value, name):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be a number")
+
+
+def normalize_query(query):
+    """Validate a query dict and return it in canonical form (used as the cache key)"""
+    metric = query.get("metric", "bond_formation_rate")
+    if not isinstance(metric, str) or metric not in METRIC_COLUMNS:
+        raise ValueError(f"Unknown metric {metric}")
+
+    group_by = query.get("group_by") or []
+    bins = query.get("bins") or {}
+    if not isinstance(group_by, list) or not all(isinstance(name, str) for name in group_by):
+        raise ValueError("group_by must be a list of parameter names")
+    if not isinstance(bins, dict):
+        raise ValueError("bins must be an object")
+    bins = dict(bins)
+    for name in group_by + list(bins):
+        if name not in PARAM_COLUMNS:
+            raise ValueError(f"Unknown parameter {name}")
+    for name, spec in bins.items():
+        if isinstance(spec, list):
+            edges = sorted(_number(edge, f"bins.{name}") for edge in spec)
+            if len(edges) < 2 or len(edges) > MAX_BINS + 1:
+                raise ValueError(f"bins.{name} needs between 2 and {MAX_BINS + 1} edges")
+            bins[name] = edges
+        else:
+            count = int(_number(spec, f"bins.{name}"))
+            if not 1 <= count <= MAX_BINS:
+                raise ValueError(f"bins.{name} must be between 1 and {MAX_BINS}")
+            bins[name] = count
+
+    stats = query.get("stats") or DEFAULT_STATS
+    if not isinstance(stats, list) or not all(isinstance(stat, str) for stat in stats):
+        raise ValueError("stats must be a list of statistic names")
+    for stat in stats:
+        if stat not in ("count", "mean", "std", "min", "max") and not (
+                stat[:1] == "p" and 0 <= _number(stat[1:], stat) <= 100):
+            raise ValueError(f"Unknown statistic {stat}")
+
+    filters = {}
+    if not isinstance(query.get("filters") or {}, dict):
+        raise ValueError("filters must be an object")
+    for name, bounds in (query.get("filters") or {}).items():
+        if name not in PARAM_COLUMNS and name not in METRIC_COLUMNS:
+            raise ValueError(f"Unknown filter column {name}")
+        if not isinstance(bounds, (list, tuple)) or len(bounds) != 2:
+            raise ValueError(f"filters.{name} must be [low, high]")
+        low, high = bounds
+        filters[name] = [None if low is None else _number(low, name), None if high is None else _number(high, name)]
+
+    histogram = int(_number(query.get("histogram") or 0, "histogram"))
+    if not 0 <= histogram <= MAX_BINS:
+        raise ValueError(f"histogram must be between 0 and {MAX_BINS}")
+
+    return {
+        "metric": metric,
+        "group_by": [name for name in group_by if name not in bins],
+        "bins": dict(sorted(bins.items())),
+        "stats": list(stats),
+        "filters": dict(sorted(filters.items())),
+        "histogram": histogram,
+    }
+
+
+def parse_query_args(args):
+    """Build a query from URL arguments, e.g.
+    ?metric=max_cluster_size&group_by=AmpX,freqY&bins=AmpY:10&stats=mean,p95&filter=SC:500:900&histogram=20"""
+    query = {"metric": args.get("metric", "bond_formation_rate"), "bins": {}, "filters": {}}
+    if args.get("group_by"):
+        query["group_by"] = args["group_by"].split(",")
+    for spec in args.getlist("bins"):
+        name, _, count = spec.partition(":")
+        query["bins"][name] = count
+        query.setdefault("group_by", []).append(name)
+    if args.get("stats"):
+        query["stats"] = args["stats"].split(",")
+    for spec in args.getlist("filter"):
+        name, _, bounds = spec.partition(":")
+        low, _, high = bounds.partition(":")
+        query["filters"][name] = [low or None, high or None]
+    query["histogram"] = args.get("histogram", 0)
+    return query
+
+
+def _group_codes(columns, query, mask):
+    """Assign each selected run a dense group index; return (codes, group keys)"""
+    names = query["group_by"] + list(query["bins"])
+    if not names:
+        return np.zeros(mask.sum(), dtype=np.intp), [{}]
+
+    codes, dims, labels = [], [], []
+    for name in names:
+        values = columns[name][mask]
+        if name in query["bins"]:
+            spec = query["bins"][name]
+            if isinstance(spec, list):
+                edges = np.asarray(spec)
+            else:
+                low, high = (values.min(), values.max()) if len(values) else (0.0, 1.0)
+                edges = np.linspace(low, high if high > low else low + 1, spec + 1)
+            codes.append(np.clip(np.searchsorted(edges, values, side='right') - 1, 0, len(edges) - 2))
+            dims.append(len(edges) - 1)
+            labels.append([[float(edges[i]), float(edges[i + 1])] for i in range(len(edges) - 1)])
+        else:
+            uniques, inverse = np.unique(values, return_inverse=True)
+            codes.append(inverse)
+            dims.append(len(uniques))
+            labels.append([float(u) for u in uniques])
+
+    flat = np.ravel_multi_index(codes, dims)
+    present, dense = np.unique(flat, return_inverse=True)
+    if len(present) > MAX_GROUPS:
+        raise ValueError(f"Query produces {len(present)} groups (limit {MAX_GROUPS})")
+    keys = [
+        {name: labels[d][i] for d, (name, i) in enumerate(zip(names, index))}
+        for index in zip(*np.unravel_index(present, dims))
+    ]
+    return dense, keys
+
+
+def run_query(query, generation=None):
+    """Compute per-group statistics of one metric over all matching runs (as of generation)"""
+    columns = _columns(runs_generation() if generation is None else generation)
+    metric = columns[query["metric"]]
+
+    # Runs still streaming (or missing a grouping parameter) have NaNs and are left out
+    mask = ~np.isnan(metric)
+    for name in query["group_by"] + list(query["bins"]):
+        mask &= ~np.isnan(columns[name])
+    for name, (low, high) in query["filters"].items():
+        if low is not None:
+            mask &= columns[name] >= low
+        if high is not None:
+            mask &= columns[name] <= high
+
+    values = metric[mask]
+    groups, keys = _group_codes(columns, query, mask)
+    n_groups = len(keys)
+
+    counts = np.bincount(groups, minlength=n_groups)
+    sums = np.bincount(groups, weights=values, minlength=n_groups)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = sums / counts
+        variances = np.bincount(groups, weights=values * values, minlength=n_groups) / counts - means * means
+
+    # Sort by (group, value) once; order statistics then index straight into each group's slice
+    order = np.lexsort((values, groups))
+    ordered = values[order]
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    nonempty = counts > 0
+
+    result_stats = {}
+    for stat in query["stats"]:
+        if stat == "count":
+            result_stats[stat] = counts.astype(float)
+        elif stat == "mean":
+            result_stats[stat] = means
+        elif stat == "std":
+            result_stats[stat] = np.sqrt(np.maximum(variances, 0))
+        elif stat in ("min", "max") or stat[0] == "p":
+            q = {"min": 0.0, "max": 100.0}.get(stat) if stat in ("min", "max") else float(stat[1:])
+            position = starts + (np.maximum(counts, 1) - 1) * (q / 100.0)
+            low = np.floor(position).astype(np.intp)
+            high = np.ceil(position).astype(np.intp)
+            frac = position - low
+            column = np.full(n_groups, np.nan)
+            if len(ordered):
+                column[nonempty] = (ordered[low] * (1 - frac) + ordered[high] * frac)[nonempty]
+            result_stats[stat] = column
+
+    result = {"metric": query["metric"], "runs": int(mask.sum()), "groups": []}
+
+    histograms = None
+    if query["histogram"]:
+        edges = np.histogram_bin_edges(values, bins=query["histogram"]) if len(values) else np.linspace(0, 1, query["histogram"] + 1)
+        buckets = np.clip(np.searchsorted(edges, values, side='right') - 1, 0, len(edges) - 2)
+        histograms = np.bincount(groups * query["histogram"] + buckets,
+                                 minlength=n_groups * query["histogram"]).reshape(n_groups, query["histogram"])
+        result["histogram_edges"] = edges.tolist()
+
+    for g, key in enumerate(keys):
+        group = {"key": key}
+        for stat, column in result_stats.items():
+            value = float(column[g])
+            group[stat] = None if np.isnan(value) else value
+        if histograms is not None:
+            group["histogram"] = histograms[g].tolist()
+        result["groups"].append(group)
+    return result
+
+
+def query_key(query, generation):
+    """ETag-style key for a normalized query at one state of the run table"""
+    digest = hashlib.sha1(json.dumps(query, sort_keys=True).encode()).hexdigest()[:16]
+    return f"{generation}-{digest}"
+
+
+def cached_query(query):
+    """Return (key, result) for a raw query dict, reusing results until the runs change"""
+    query = normalize_query(query)
+    generation = runs_generation()
+    key = query_key(query, generation)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return key, _cache[key]
+
+    result = run_query(query, generation)
+    if runs_generation() != generation:
+        # Computed from runs newer than the key; answer with it but leave the cache alone
+        return key, result
+    with _cache_lock:
+        _cache[key] = result
+        while len(_cache) > ANALYTICS_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return key, result
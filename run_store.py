@@ -0,0 +1,446 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import sqlite3
+import threading
+import numpy as np
+from param_store import DATA_DIR, DEFAULT_PARAMS
+
+# Run parameters and summary metrics live in an indexed SQLite table; the per-event
+# series live next to it as packed little-endian record files, one per series.
+RUN_DB_PATH = os.environ.get('RUN_DB_PATH', os.path.join(DATA_DIR, 'runs.db'))
+RUN_DATA_DIR = os.environ.get('RUN_DATA_DIR', os.path.join(DATA_DIR, 'runs'))
+
+PARAM_COLUMNS = {
+    "SC": float, "BF": float,
+    "AmpX": float, "AmpY": float, "AmpZ": float,
+    "freqX": float, "freqY": float, "freqZ": float,
+    "sphereCount": int, "rectangleCount": int, "quartersphereCount": int,
+    "airfoilCount": int, "halfsphereCount": int, "pyramidCount": int,
+}
+METRIC_COLUMNS = {
+    "simulation_duration": float, "total_bonds": int, "bonds_formed": int, "bonds_broken": int,
+    "max_cluster_size": int, "final_cluster_count": int, "bond_formation_rate": float,
+}
+
+# Runs produced by stand-in workers (sweeps run with sweep_workers.local_worker) are kept
+# for their sweeps but left out of analytics, surrogate training and result lookups.
+SYNTHETIC_PREFIX = 'synthetic:'
+REAL_RUNS = f"COALESCE(source, '') NOT LIKE '{SYNTHETIC_PREFIX}%'"
+
+# Unity's clock is single precision, so float32 times lose nothing; 13 bytes per bond event
+# instead of ~130 bytes of pretty-printed JSON.
+SERIES_DTYPES = {
+    "bond_events": np.dtype([('time', '<f4'), ('formed', 'u1'), ('agent1', '<i4'), ('agent2', '<i4')]),
+    "cluster_sizes": np.dtype([('time', '<f4'), ('max_size', '<i4'), ('cluster_count', '<i4')]),
+}
+SERIES_COUNTS = {"bond_events": "bond_event_count", "cluster_sizes": "cluster_sample_count"}
+
+
+class SequenceError(ValueError):
+    """A chunk arrived ahead of the run's next expected sequence number"""
+
+    def __init__(self, expected, received):
+        super().__init__(f"Expected chunk {expected}, got {received}")
+        self.expected = expected
+
+
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_ready_pid = None
+
+
+def _connect():
+    """Return this thread's connection to the run database"""
+    global _schema_ready_pid
+
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and _local.pid == os.getpid():
+        return conn
+
+    os.makedirs(os.path.dirname(RUN_DB_PATH), exist_ok=True)
+    conn = sqlite3.connect(RUN_DB_PATH, timeout=5.0, isolation_level=None, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+
+    with _schema_lock:
+        if _schema_ready_pid != os.getpid():
+            columns = ", ".join(
+                f"{name} {'INTEGER' if kind is int else 'REAL'}"
+                for name, kind in {**PARAM_COLUMNS, **METRIC_COLUMNS}.items()
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS runs ("
+                " run_id TEXT PRIMARY KEY,"
+                " session_id TEXT,"
+                " source TEXT,"
+                " params_hash TEXT,"
+                " created_at REAL NOT NULL,"
+                " updated_at REAL NOT NULL,"
+                " start_time TEXT, end_time TEXT,"
+                f" {columns},"
+                " bond_event_count INTEGER NOT NULL DEFAULT 0,"
+                " cluster_sample_count INTEGER NOT NULL DEFAULT 0,"
+                " next_seq INTEGER NOT NULL DEFAULT 0,"
+                " extra TEXT"
+                ")"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS runs_session ON runs (session_id, created_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS runs_params_hash ON runs (params_hash, updated_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS runs_created ON runs (created_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS runs_updated ON runs (updated_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS runs_springs ON runs (SC, BF)")
+            conn.execute("CREATE INDEX IF NOT EXISTS runs_amplitude ON runs (AmpX, AmpY, AmpZ)")
+            conn.execute("CREATE INDEX IF NOT EXISTS runs_frequency ON runs (freqX, freqY, freqZ)")
+            _schema_ready_pid = os.getpid()
+
+    _local.conn = conn
+    _local.pid = os.getpid()
+    return conn
+
+
+def _coerce(kind, value):
+    """Convert form/JSON values (often strings) to the column type, or None"""
+    if value is None or value == '':
+        return None
+    try:
+        return kind(float(value)) if kind is int else float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def canonical_params(params):
+    """Typed, defaulted copy of the simulation parameters (strings from the form become numbers)"""
+    canonical = {}
+    for name, kind in PARAM_COLUMNS.items():
+        value = _coerce(kind, params.get(name))
+        if value is None:
+            value = kind(DEFAULT_PARAMS.get(name, 0))
+        canonical[name] = round(value, 6) + 0.0 if kind is float else value
+    return canonical
+
+
+def params_hash(params):
+    """Stable content hash of a parameter set, independent of key order and value formatting"""
+    payload = json.dumps(canonical_params(params), sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def run_dir(run_id):
+    if not run_id.isalnum():
+        raise ValueError(f"Invalid run ID {run_id!r}")
+    return os.path.join(RUN_DATA_DIR, run_id)
+
+
+def _agent_encoding(run_id):
+    """(encoding, names) of a run's agents: 'ids' or 'names', or None before its first bond events"""
+    path = os.path.join(run_dir(run_id), 'agents.json')
+    if not os.path.exists(path):
+        return None, []
+    with open(path) as f:
+        state = json.load(f)
+    return state["encoding"], state.get("names", [])
+
+
+def _save_agents(run_id, encoding, names=()):
+    os.makedirs(run_dir(run_id), exist_ok=True)
+    path = os.path.join(run_dir(run_id), 'agents.json')
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump({"encoding": encoding, "names": list(names)}, f)
+    os.replace(tmp, path)
+
+
+def _agent_codes(run_id, values):
+    """Map agent identifiers to int32 in the run's encoding, fixed by its first bond events:
+    numeric IDs are stored as-is, anything else as per-run codes into agents.json"""
+    encoding, names = _agent_encoding(run_id)
+    if encoding != 'names':
+        try:
+            # float64 holds every int32 exactly, so whole numbers can be told from 1.5
+            ids = np.asarray(values, dtype=np.float64)
+        except (TypeError, ValueError):
+            ids = None
+        if ids is not None and (len(ids) == 0 or (np.isfinite(ids).all() and (ids == np.floor(ids)).all()
+                                                  and ids.min() >= -2 ** 31 and ids.max() < 2 ** 31)):
+            if encoding is None:
+                _save_agents(run_id, 'ids')
+            return ids.astype('<i4')
+        if encoding == 'ids':
+            raise ValueError("This run stores numeric agent IDs; agent names cannot be added to it")
+
+    index = {name: i for i, name in enumerate(names)}
+    codes = np.empty(len(values), dtype='<i4')
+    for i, value in enumerate(values):
+        key = str(value)
+        if key not in index:
+            index[key] = len(names)
+            names.append(key)
+        codes[i] = index[key]
+    _save_agents(run_id, 'names', names)
+    return codes
+
+
+def pack_bond_events(run_id, events):
+    """Convert a list of bond event dicts into the packed record array"""
+    if not all(isinstance(e, dict) for e in events):
+        raise ValueError("Bond events must be objects")
+    records = np.zeros(len(events), dtype=SERIES_DTYPES["bond_events"])
+    if not events:
+        return records
+    records['time'] = [e.get('time', 0) for e in events]
+    records['formed'] = [e.get('event_type') == 'formed' for e in events]
+    # Both endpoints in one call, so the chunk settles on a single encoding
+    codes = _agent_codes(run_id, [e.get('agent1', 0) for e in events] + [e.get('agent2', 0) for e in events])
+    records['agent1'] = codes[:len(events)]
+    records['agent2'] = codes[len(events):]
+    return records
+
+
+def pack_cluster_sizes(samples):
+    """Convert a list of cluster size samples into the packed record array"""
+    if not all(isinstance(s, dict) for s in samples):
+        raise ValueError("Cluster size samples must be objects")
+    records = np.zeros(len(samples), dtype=SERIES_DTYPES["cluster_sizes"])
+    if not samples:
+        return records
+    records['time'] = [s.get('time', 0) for s in samples]
+    records['max_size'] = [s.get('max_size', 0) for s in samples]
+    records['cluster_count'] = [s.get('cluster_count', 0) for s in samples]
+    return records
+
+
+def _append_records(run_id, name, records, committed):
+    """Append packed records after the first `committed` ones; earlier data is never re-read"""
+    if len(records) == 0:
+        return
+    dtype = SERIES_DTYPES[name]
+    os.makedirs(run_dir(run_id), exist_ok=True)
+    with open(os.path.join(run_dir(run_id), f"{name}.bin"), 'ab') as f:
+        # Drop any tail left by a chunk whose transaction never committed
+        f.truncate(committed * dtype.itemsize)
+        f.write(records.astype(dtype, copy=False).tobytes())
+
+
+def load_series(run_id, name, mmap=True):
+    """Return a run's committed series as a structured NumPy array (memory-mapped by default)"""
+    path = os.path.join(run_dir(run_id), f"{name}.bin")
+    dtype = SERIES_DTYPES[name]
+    row = _connect().execute(f"SELECT {SERIES_COUNTS[name]} FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+    # The file may end in records of a chunk that is still being (or never was) committed
+    count = min(row[0] if row else 0, os.path.getsize(path) // dtype.itemsize if os.path.exists(path) else 0)
+    if count == 0:
+        return np.zeros(0, dtype=dtype)
+    if mmap:
+        return np.memmap(path, dtype=dtype, mode='r', shape=(count,))
+    return np.fromfile(path, dtype=dtype, count=count)
+
+
+def create_run(params, session_id=None, run_id=None, start_time=None, extra=None, source=None):
+    """Insert a run row with its parameters and return the run ID (source None means a browser run)"""
+    run_id = run_id or uuid.uuid4().hex
+    now = time.time()
+    values = {name: _coerce(kind, params.get(name)) for name, kind in PARAM_COLUMNS.items()}
+    columns = ", ".join(values)
+    placeholders = ", ".join("?" for _ in values)
+    _connect().execute(
+        "INSERT OR IGNORE INTO runs (run_id, session_id, source, params_hash, created_at, updated_at, start_time,"
+        f" extra, {columns}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, {placeholders})",
+        (run_id, session_id, source, params_hash(params), now, now, start_time,
+         json.dumps(extra) if extra else None, *values.values())
+    )
+    return run_id
+
+
+def update_run_metrics(run_id, metrics, end_time=None):
+    """Store a run's summary metrics (the series counts are kept by append_chunk)"""
+    values = {name: _coerce(kind, metrics.get(name)) for name, kind in METRIC_COLUMNS.items()
+              if metrics.get(name) is not None}
+    assignments = "".join(f", {name} = ?" for name in values)
+    cursor = _connect().execute(
+        f"UPDATE runs SET updated_at = ?, end_time = COALESCE(?, end_time){assignments} WHERE run_id = ?",
+        (time.time(), end_time, *values.values(), run_id)
+    )
+    return cursor.rowcount > 0
+
+
+def append_chunk(run_id, seq, bond_events=(), cluster_sizes=()):
+    """Append one numbered chunk of series data to a run; retried chunks are ignored"""
+    conn = _connect()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute(
+            "SELECT next_seq, bond_event_count, cluster_sample_count FROM runs WHERE run_id = ?", (run_id,)
+        ).fetchone()
+        if row is None:
+            raise KeyError(run_id)
+        if seq < row["next_seq"]:
+            conn.execute("ROLLBACK")
+            return {"duplicate": True, "next_seq": row["next_seq"]}
+        if seq > row["next_seq"]:
+            raise SequenceError(row["next_seq"], seq)
+
+        if not isinstance(bond_events, np.ndarray):
+            bond_events = pack_bond_events(run_id, list(bond_events))
+        elif len(bond_events):
+            # Binary chunks carry numeric agent IDs
+            encoding, _ = _agent_encoding(run_id)
+            if encoding == 'names':
+                raise ValueError("This run stores agent names; binary chunks cannot be added to it")
+            if encoding is None:
+                _save_agents(run_id, 'ids')
+        if not isinstance(cluster_sizes, np.ndarray):
+            cluster_sizes = pack_cluster_sizes(list(cluster_sizes))
+        _append_records(run_id, "bond_events", bond_events, row["bond_event_count"])
+        _append_records(run_id, "cluster_sizes", cluster_sizes, row["cluster_sample_count"])
+
+        conn.execute(
+            "UPDATE runs SET updated_at = ?, next_seq = ?, bond_event_count = bond_event_count + ?,"
+            " cluster_sample_count = cluster_sample_count + ? WHERE run_id = ?",
+            (time.time(), seq + 1, len(bond_events), len(cluster_sizes), run_id)
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return {"duplicate": False, "next_seq": seq + 1, "bond_events": len(bond_events),
+            "cluster_sizes": len(cluster_sizes)}
+
+
+def ingest_run(payload, session_id=None, source=None):
+    """Persist a complete MetricsDownloader payload and return the new run ID"""
+    metrics = payload.get("metrics") or {}
+    if not isinstance(metrics, dict):
+        raise ValueError("metrics must be an object")
+    bond_events = metrics.get("bond_events") or []
+    cluster_sizes = metrics.get("cluster_sizes") or []
+    if not isinstance(bond_events, list) or not isinstance(cluster_sizes, list):
+        raise ValueError("bond_events and cluster_sizes must be lists")
+    extra = {k: v for k, v in payload.items()
+             if k not in PARAM_COLUMNS and k not in ("metrics", "start_time", "end_time")}
+    run_id = create_run(payload, session_id=session_id, start_time=payload.get("start_time"), extra=extra,
+                        source=source)
+
+    try:
+        if bond_events or cluster_sizes:
+            append_chunk(run_id, 0, bond_events, cluster_sizes)
+        update_run_metrics(run_id, metrics, end_time=payload.get("end_time"))
+    except Exception:
+        # A payload that fails to pack leaves no half-stored run behind
+        _connect().execute("DELETE FROM runs WHERE run_id = ?", (run_id,))
+        shutil.rmtree(run_dir(run_id), ignore_errors=True)
+        raise
+    return run_id
+
+
+def get_run(run_id):
+    """Return a run's row as a dict, or None"""
+    row = _connect().execute("SELECT * FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+    if row is None:
+        return None
+    run = dict(row)
+    run["extra"] = json.loads(run["extra"]) if run["extra"] else {}
+    return run
+
+
+def runs_generation():
+    """Cheap token that changes whenever any run is added or updated"""
+    count, updated = _connect().execute("SELECT COUNT(*), MAX(updated_at) FROM runs").fetchone()
+    return f"{count}-{updated or 0:.6f}"
+
+
+def params_generation(key):
+    """Like runs_generation, but only over the runs of one parameter hash"""
+    count, updated = _connect().execute(
+        "SELECT COUNT(*), MAX(updated_at) FROM runs WHERE params_hash = ?", (key,)).fetchone()
+    return f"{count}-{updated or 0:.6f}"
+
+
+def runs_by_params_hash(key, limit=1000):
+    """Finished real runs (any summary metric stored) of one parameter hash, newest first"""
+    rows = _connect().execute(
+        f"SELECT * FROM runs WHERE params_hash = ? AND {REAL_RUNS}"
+        f" AND COALESCE({', '.join(METRIC_COLUMNS)}) IS NOT NULL"
+        " ORDER BY updated_at DESC LIMIT ?", (key, limit))
+    return [{k: v for k, v in dict(row).items() if k != "extra"} for row in rows]
+
+
+def load_run_columns(names):
+    """Return {column: float64 array} over all real runs, with NaN for missing values"""
+    for name in names:
+        if name not in PARAM_COLUMNS and name not in METRIC_COLUMNS:
+            raise ValueError(f"Unknown run column {name}")
+    rows = _connect().execute(f"SELECT {', '.join(names)} FROM runs WHERE {REAL_RUNS}").fetchall()
+    table = np.array([tuple(row) for row in rows], dtype=np.float64).reshape(len(rows), len(names))
+    return {name: table[:, i] for i, name in enumerate(names)}
+
+
+def list_runs(session_id=None, limit=100):
+    """Most recent runs: one session's (a sweep's runs are under its sweep ID), else all real runs"""
+    if session_id:
+        rows = _connect().execute(
+            "SELECT * FROM runs WHERE session_id = ? ORDER BY created_at DESC LIMIT ?", (session_id, limit))
+    else:
+        rows = _connect().execute(f"SELECT * FROM runs WHERE {REAL_RUNS} ORDER BY created_at DESC LIMIT ?",
+                                  (limit,))
+    return [{k: v for k, v in dict(row).items() if k != "extra"} for row in rows]
+
+
+def _finite(value):
+    """value with NaN/Infinity floats (not valid JSON) replaced by None, at any depth"""
+    if isinstance(value, float):
+        return value if np.isfinite(value) else None
+    if isinstance(value, dict):
+        return {k: _finite(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_finite(v) for v in value]
+    return value
+
+
+def _time_strings(times):
+    # float32 -> str gives the shortest round-tripping repr (0.01, not 0.009999999776)
+    return np.where(np.isfinite(times), times.astype(str), 'null')
+
+
+def iter_run_export(run_id, batch_size=10000):
+    """Yield a stored run as MetricsDownloader-style JSON text, one batch of records at a time"""
+    run = get_run(run_id)
+    if run is None:
+        raise KeyError(run_id)
+
+    encoding, names = _agent_encoding(run_id)
+
+    header = {name: run[name] for name in PARAM_COLUMNS if run[name] is not None}
+    header.update(run["extra"], run_id=run_id, start_time=run["start_time"], end_time=run["end_time"])
+    metrics = _finite({name: run[name] for name in METRIC_COLUMNS})
+    yield json.dumps(_finite(header))[:-1] + ', "metrics": ' + json.dumps(metrics)[:-1] + ', "bond_events": ['
+
+    events = load_series(run_id, "bond_events")
+    for start in range(0, len(events), batch_size):
+        part = events[start:start + batch_size]
+        agent1, agent2 = part['agent1'].tolist(), part['agent2'].tolist()
+        if encoding == 'names':
+            agent1 = [names[i] for i in agent1]
+            agent2 = [names[i] for i in agent2]
+        rows = (
+            f'{{"time": {t}, "event_type": "{"formed" if formed else "broken"}", '
+            f'"agent1": {json.dumps(a1)}, "agent2": {json.dumps(a2)}}}'
+            for t, formed, a1, a2 in zip(_time_strings(part['time']), part['formed'].tolist(), agent1, agent2)
+        )
+        yield (", " if start else "") + ", ".join(rows)
+
+    yield '], "cluster_sizes": ['
+    samples = load_series(run_id, "cluster_sizes")
+    for start in range(0, len(samples), batch_size):
+        part = samples[start:start + batch_size]
+        rows = (
+            f'{{"time": {t}, "max_size": {m}, "cluster_count": {c}}}'
+            for t, m, c in zip(_time_strings(part['time']), part['max_size'].tolist(),
+                               part['cluster_count'].tolist())
+        )
+        yield (", " if start else "") + ", ".join(rows)
+    yield ']}}'
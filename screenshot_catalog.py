@@ -0,0 +1,339 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from param_store import DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+# Every stored frame is recorded here (session, capture, time, size, hash), so listings are
+# indexed queries instead of directory scans and survive restarts. A retention pass drops
+# frames past SCREENSHOT_MAX_AGE_S and then the oldest frames until the store fits in
+# SCREENSHOT_QUOTA_BYTES; each worker runs a retention thread, but a lease row in the
+# database lets only one of them run each pass.
+SCREENSHOT_DB_PATH = os.environ.get('SCREENSHOT_DB_PATH', os.path.join(DATA_DIR, 'screenshots.db'))
+SCREENSHOT_MAX_AGE_S = float(os.environ.get('SCREENSHOT_MAX_AGE_S', 14 * 24 * 3600))  # 0 keeps frames forever
+SCREENSHOT_QUOTA_BYTES = int(os.environ.get('SCREENSHOT_QUOTA_BYTES', 10 * 1024 ** 3))  # 0 disables the quota
+RETENTION_INTERVAL = float(os.environ.get('SCREENSHOT_RETENTION_INTERVAL', 300))  # seconds between passes
+DELETE_BATCH = 500
+# Per-capture counters kept in the captures table; unfinished counts frames queued or encoding
+CAPTURE_COUNTERS = ("captured", "encoded", "dropped", "late", "duplicates", "errors", "unfinished")
+
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_ready_pid = None
+_retention_lock = threading.Lock()
+_retention_pid = None
+
+
+def _connect():
+    """Return this thread's connection to the screenshot catalog"""
+    global _schema_ready_pid
+
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and _local.pid == os.getpid():
+        return conn
+
+    os.makedirs(os.path.dirname(SCREENSHOT_DB_PATH), exist_ok=True)
+    conn = sqlite3.connect(SCREENSHOT_DB_PATH, timeout=5.0, isolation_level=None, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+
+    with _schema_lock:
+        if _schema_ready_pid != os.getpid():
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS frames ("
+                " frame_id INTEGER PRIMARY KEY,"
+                " session_id TEXT NOT NULL,"
+                " capture_id TEXT NOT NULL,"
+                " path TEXT NOT NULL UNIQUE,"
+                " created_at REAL NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " sha256 TEXT"
+                ")"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS frames_session ON frames (session_id, created_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS frames_capture ON frames (capture_id, path)")
+            conn.execute("CREATE INDEX IF NOT EXISTS frames_created ON frames (created_at)")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value) WITHOUT ROWID")
+            # Capture control shared by every worker: whichever one handles /start-capture,
+            # /stop-capture, /upload-frames or /capture-stats sees the same capture
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS captures ("
+                " session_id TEXT PRIMARY KEY,"
+                " capture_id TEXT NOT NULL,"
+                " generation INTEGER NOT NULL DEFAULT 0,"
+                " active INTEGER NOT NULL DEFAULT 0,"
+                " options TEXT,"
+                + "".join(f" {name} INTEGER NOT NULL DEFAULT 0," for name in CAPTURE_COUNTERS) +
+                " updated_at REAL NOT NULL"
+                ") WITHOUT ROWID"
+            )
+            _schema_ready_pid = os.getpid()
+
+    _local.conn = conn
+    _local.pid = os.getpid()
+    return conn
+
+
+def new_capture_id():
+    return uuid.uuid4().hex
+
+
+def record_frame(session_id, capture_id, path, size, sha256=None, created_at=None):
+    """Catalog a frame written to disk"""
+    _connect().execute(
+        "INSERT OR REPLACE INTO frames (session_id, capture_id, path, created_at, size, sha256)"
+        " VALUES (?, ?, ?, ?, ?, ?)",
+        (session_id, capture_id, path, created_at or time.time(), size, sha256)
+    )
+
+
+def latest_capture(session_id):
+    """The capture ID of a session's most recent frame, or None"""
+    row = _connect().execute("SELECT capture_id FROM frames WHERE session_id = ? ORDER BY created_at DESC LIMIT 1",
+                             (session_id,)).fetchone()
+    return row["capture_id"] if row else None
+
+
+def _capture(row):
+    capture = dict(row)
+    capture["active"] = bool(capture["active"])
+    capture["options"] = json.loads(capture["options"]) if capture["options"] else None
+    return capture
+
+
+def get_capture(session_id, create=False):
+    """A session's shared capture state (capture ID, generation, active, options, counters), or None"""
+    conn = _connect()
+    if create:
+        # Sessions captured before this table existed continue their latest cataloged capture
+        conn.execute("INSERT OR IGNORE INTO captures (session_id, capture_id, updated_at) VALUES (?, ?, ?)",
+                     (session_id, latest_capture(session_id) or new_capture_id(), time.time()))
+    row = conn.execute("SELECT * FROM captures WHERE session_id = ?", (session_id,)).fetchone()
+    return _capture(row) if row is not None else None
+
+
+def open_capture(session_id, options):
+    """Start a new capture unless one is running; returns (capture, started)"""
+    conn = _connect()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute("SELECT * FROM captures WHERE session_id = ?", (session_id,)).fetchone()
+        started = row is None or not row["active"]
+        if started:
+            conn.execute(
+                "INSERT INTO captures (session_id, capture_id, generation, active, options, updated_at)"
+                " VALUES (?, ?, 1, 1, ?, ?)"
+                " ON CONFLICT(session_id) DO UPDATE SET capture_id = excluded.capture_id,"
+                " generation = generation + 1, active = 1, options = excluded.options,"
+                + ",".join(f" {name} = 0" for name in CAPTURE_COUNTERS) +
+                ", updated_at = excluded.updated_at",
+                (session_id, new_capture_id(), json.dumps(options), time.time())
+            )
+            row = conn.execute("SELECT * FROM captures WHERE session_id = ?", (session_id,)).fetchone()
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return _capture(row), started
+
+
+def close_capture(session_id):
+    """Stop a session's capture in every worker; returns (capture, was_active), capture None if unknown"""
+    conn = _connect()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute("SELECT * FROM captures WHERE session_id = ?", (session_id,)).fetchone()
+        was_active = row is not None and bool(row["active"])
+        if was_active:
+            conn.execute("UPDATE captures SET active = 0, generation = generation + 1, updated_at = ?"
+                         " WHERE session_id = ?", (time.time(), session_id))
+            row = conn.execute("SELECT * FROM captures WHERE session_id = ?", (session_id,)).fetchone()
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return (_capture(row) if row is not None else None), was_active
+
+
+def count_capture(session_id, capture_id, **deltas):
+    """Add to a capture's counters; counts for a capture that has since been replaced are dropped"""
+    for name in deltas:
+        if name not in CAPTURE_COUNTERS:
+            raise ValueError(f"Unknown capture counter {name}")
+    _connect().execute(
+        "UPDATE captures SET " + ", ".join(f"{name} = {name} + ?" for name in deltas)
+        + " WHERE session_id = ? AND capture_id = ?",
+        list(deltas.values()) + [session_id, capture_id]
+    )
+
+
+def capture_paths(capture_id):
+    """Paths of a capture's frames in capture order (frame names sort by capture time)"""
+    return [row["path"] for row in _connect().execute(
+        "SELECT path FROM frames WHERE capture_id = ? ORDER BY path", (capture_id,))]
+
+
+def query_frames(session_id, since=None, until=None, capture_id=None, limit=1000, offset=0):
+    """A session's frames, oldest first, optionally within [since, until) and one capture"""
+    query = "SELECT * FROM frames WHERE session_id = ?"
+    args = [session_id]
+    if capture_id:
+        query += " AND capture_id = ?"
+        args.append(capture_id)
+    if since is not None:
+        query += " AND created_at >= ?"
+        args.append(since)
+    if until is not None:
+        query += " AND created_at < ?"
+        args.append(until)
+    query += " ORDER BY created_at, path LIMIT ? OFFSET ?"
+    return [dict(row) for row in _connect().execute(query, args + [limit, offset])]
+
+
+def list_captures(session_id):
+    """A session's captures with frame counts, sizes and time spans, newest first"""
+    return [dict(row) for row in _connect().execute(
+        "SELECT capture_id, COUNT(*) AS frames, SUM(size) AS bytes, MIN(created_at) AS started_at,"
+        " MAX(created_at) AS last_frame_at FROM frames WHERE session_id = ?"
+        " GROUP BY capture_id ORDER BY last_frame_at DESC", (session_id,))]
+
+
+def backfill(directory):
+    """Catalog frames written before the catalog existed (once; one capture per session directory)"""
+    conn = _connect()
+    if conn.execute("SELECT 1 FROM meta WHERE name = 'backfilled'").fetchone():
+        return 0
+    count = 0
+    if os.path.isdir(directory):
+        for session_id in os.listdir(directory):
+            session_dir = os.path.join(directory, session_id)
+            if not os.path.isdir(session_dir):
+                continue
+            capture_id = new_capture_id()
+            rows = []
+            for name in sorted(os.listdir(session_dir)):
+                if name.startswith('screenshot_'):
+                    path = os.path.join(session_dir, name)
+                    stat = os.stat(path)
+                    rows.append((session_id, capture_id, path, stat.st_mtime, stat.st_size))
+            conn.executemany("INSERT OR IGNORE INTO frames (session_id, capture_id, path, created_at, size)"
+                             " VALUES (?, ?, ?, ?, ?)", rows)
+            count += len(rows)
+    conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('backfilled', ?)", (time.time(),))
+    if count:
+        logger.info(f"Cataloged {count} existing screenshots")
+    return count
+
+
+def _delete_rows(conn, rows):
+    """Remove frames from disk and the catalog; returns the bytes freed"""
+    freed = 0
+    for row in rows:
+        try:
+            os.remove(row["path"])
+        except FileNotFoundError:
+            pass
+        freed += row["size"]
+    conn.executemany("DELETE FROM frames WHERE frame_id = ?", [(row["frame_id"],) for row in rows])
+    # Drop session directories left empty
+    for directory in {os.path.dirname(row["path"]) for row in rows}:
+        try:
+            os.rmdir(directory)
+        except OSError:
+            pass
+    return freed
+
+
+def enforce_retention(max_age=None, quota=None):
+    """Delete frames older than max_age, then the oldest frames until the total fits in quota"""
+    max_age = SCREENSHOT_MAX_AGE_S if max_age is None else max_age
+    quota = SCREENSHOT_QUOTA_BYTES if quota is None else quota
+    conn = _connect()
+    expired = evicted = freed = 0
+
+    if max_age > 0:
+        cutoff = time.time() - max_age
+        while True:
+            rows = conn.execute("SELECT frame_id, path, size FROM frames WHERE created_at < ? ORDER BY created_at"
+                                " LIMIT ?", (cutoff, DELETE_BATCH)).fetchall()
+            if not rows:
+                break
+            freed += _delete_rows(conn, rows)
+            expired += len(rows)
+
+    if quota > 0:
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM frames").fetchone()[0]
+        while total > quota:
+            rows = conn.execute("SELECT frame_id, path, size FROM frames ORDER BY created_at LIMIT ?",
+                                (DELETE_BATCH,)).fetchall()
+            if not rows:
+                break
+            # Only as many of the oldest frames as it takes to get under the quota
+            needed = []
+            for row in rows:
+                if total <= quota:
+                    break
+                needed.append(row)
+                total -= row["size"]
+            freed += _delete_rows(conn, needed)
+            evicted += len(needed)
+
+    result = {"expired": expired, "evicted": evicted, "freed_bytes": freed, "at": time.time()}
+    conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('last_retention', ?)", (json.dumps(result),))
+    if expired or evicted:
+        logger.info(f"Screenshot retention removed {expired} expired and {evicted} over-quota frames"
+                    f" ({freed} bytes)")
+    return result
+
+
+def _claim_pass(conn):
+    """True for the one worker that gets to run the retention pass due now"""
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute("SELECT value FROM meta WHERE name = 'retention_due'").fetchone()
+        claimed = row is None or float(row["value"]) <= now
+        if claimed:
+            conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('retention_due', ?)",
+                         (now + RETENTION_INTERVAL,))
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return claimed
+
+
+def retention_loop():
+    while True:
+        try:
+            if _claim_pass(_connect()):
+                enforce_retention()
+        except Exception as e:
+            logger.error(f"Error enforcing screenshot retention: {str(e)}")
+        time.sleep(RETENTION_INTERVAL)
+
+
+def start_retention():
+    """Start this process's retention thread (once per process, so forked workers start their own)"""
+    global _retention_pid
+    with _retention_lock:
+        if _retention_pid == os.getpid():
+            return
+        _retention_pid = os.getpid()
+    threading.Thread(target=retention_loop, name='screenshot-retention', daemon=True).start()
+
+
+def stats():
+    """Catalog totals, limits and the outcome of the last retention pass"""
+    conn = _connect()
+    frames, size, oldest = conn.execute(
+        "SELECT COUNT(*), COALESCE(SUM(size), 0), MIN(created_at) FROM frames").fetchone()
+    last = conn.execute("SELECT value FROM meta WHERE name = 'last_retention'").fetchone()
+    return {"frames": frames, "bytes": size, "oldest_frame_at": oldest, "quota_bytes": SCREENSHOT_QUOTA_BYTES,
+            "max_age_s": SCREENSHOT_MAX_AGE_S, "last_retention": json.loads(last["value"]) if last else None}
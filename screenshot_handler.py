@@ -1,223 +1,457 @@
+import io
 import os
+import math
 import time
+import hashlib
+import heapq
+import queue
 import datetime
 import threading
-from io import BytesIO
-from zipfile import ZipFile
-from PIL import ImageGrab
+import itertools
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from PIL import Image, ImageGrab
+from zip_stream import build_zip_plan
+import screenshot_catalog
 
-# Create screenshots directory
-SCREENSHOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'screenshots')
+# Create screenshots directory (each capture session gets its own subdirectory)
+SCREENSHOT_DIR = os.environ.get('SCREENSHOT_DIR',
+                                os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'screenshots'))
 os.makedirs(SCREENSHOT_DIR, exist_ok=True)
 
-# Global variables for screenshot control
-screenshot_thread = None
-should_capture_screenshots = False
-screenshot_interval = 60  # seconds
-screenshots = []  # List to store paths to screenshots
-
-def capture_screenshot():
-    """Capture a screenshot of the entire screen"""
-    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"screenshot_{timestamp}.png"
-    filepath = os.path.join(SCREENSHOT_DIR, filename)
-    
-    # Capture screenshot
-    try:
-        img = ImageGrab.grab()
-        img.save(filepath)
-        screenshots.append(filepath)
-        print(f"Screenshot captured: {filepath}")
-        return filepath
-    except Exception as e:
-        print(f"Error capturing screenshot: {e}")
-        return None
+# Encoding pipeline: capture only grabs frames, a shared pool of encoder threads writes them
+ENCODER_THREADS = int(os.environ.get('SCREENSHOT_ENCODER_THREADS', '2'))
+CAPTURE_THREADS = int(os.environ.get('SCREENSHOT_CAPTURE_THREADS', '2'))
+FRAME_QUEUE_SIZE = int(os.environ.get('SCREENSHOT_QUEUE_SIZE', '8'))  # pending frames per session
+SESSION_TTL = float(os.environ.get('SCREENSHOT_SESSION_TTL', str(6 * 3600)))  # seconds idle before eviction
+QUEUE_POLICIES = ('drop_oldest', 'drop_newest', 'block')
 
-def capture_screenshots_thread():
-    """Thread function to capture screenshots at regular intervals"""
-    global should_capture_screenshots, screenshots
-    
-    while should_capture_screenshots:
-        try:
-            capture_screenshot()
-        except Exception as e:
-            print(f"Error in screenshot thread: {e}")
-        
-        # Sleep for the interval
-        time.sleep(screenshot_interval)
-
-def start_screenshot_capture():
-    """Start capturing screenshots at regular intervals"""
-    global screenshot_thread, should_capture_screenshots, screenshots
-    
-    if screenshot_thread is None or not screenshot_thread.is_alive():
-        # Clear previous screenshots
-        screenshots = []
-        
-        # Take initial screenshot immediately
+EXTENSIONS = {'png': 'png', 'webp': 'webp', 'jpeg': 'jpg'}
+DEFAULT_OPTIONS = {
+    "interval": 60.0,  # seconds; fractional values allow 1-5 Hz capture
+    # 'server' grabs this machine's screen; 'client' means browsers upload canvas frames (headless hosts)
+    "source": os.environ.get('SCREENSHOT_SOURCE', 'server'),
+    "format": os.environ.get('SCREENSHOT_FORMAT', 'png'),  # png, webp or jpeg
+    "compress_level": 1,  # PNG zlib level; 1 is several times faster than the default 6
+    "quality": 90,        # WebP/JPEG quality
+    "lossless": True,     # WebP only
+    "queue_policy": 'drop_oldest',
+    # Mean absolute difference (0-255 grey levels, on a small thumbnail) below which a frame
+    # counts as unchanged from the last kept frame and is skipped; 0 keeps every frame
+    "dedup_threshold": float(os.environ.get('SCREENSHOT_DEDUP_THRESHOLD', '1.5')),
+}
+DEDUP_SIZE = (64, 64)
+STAT_NAMES = ("captured", "encoded", "dropped", "late", "duplicates", "errors")
+
+
+class CaptureSession:
+    """This process's view of one browser session's capture: its queue, schedule and dedup state.
+
+    Whether the session is capturing, its capture ID, options and counters live in the shared
+    screenshot catalog, so every worker agrees on them; _sync() adopts the shared state.
+    """
+
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.directory = os.path.join(SCREENSHOT_DIR, session_id)
+        self.options = dict(DEFAULT_OPTIONS)
+        self.capture_id = None  # Set by _sync()
+        self.lock = threading.Lock()
+        self.cond = threading.Condition(self.lock)
+        self.pending = deque()  # Frames waiting for an encoder
+        self.unfinished = 0     # Frames queued or being encoded
+        self.active = False
+        self.generation = 0     # Bumped on start/stop so stale schedule entries are ignored
+        self.capturing = False  # A grab for this session is currently running
+        self.last_signature = None
+        self.last_used = time.monotonic()
+
+    def count(self, name, n=1):
+        screenshot_catalog.count_capture(self.session_id, self.capture_id, **{name: n})
+
+
+# Session registry and shared workers (created lazily so forked workers start their own)
+sessions = {}
+sessions_lock = threading.Lock()
+_ready = queue.Queue()  # One token per enqueued frame, naming the session to take it from
+_encoder_threads = []
+_capture_pool = None
+_schedule = []  # Heap of (deadline, seq, session, generation)
+_schedule_cond = threading.Condition()
+_schedule_seq = itertools.count()
+_scheduler_thread = None
+_frame_counter = itertools.count()
+_workers_lock = threading.Lock()
+_catalog_pid = None
+
+
+def _ensure_catalog():
+    """Catalog frames stored before the catalog existed and start retention, once per process"""
+    global _catalog_pid
+    if _catalog_pid == os.getpid():
+        return
+    with _workers_lock:
+        if _catalog_pid != os.getpid():
+            screenshot_catalog.backfill(SCREENSHOT_DIR)
+            screenshot_catalog.start_retention()
+            _catalog_pid = os.getpid()
+
+
+def _sync(session):
+    """Adopt the session's shared capture state, which any worker may have started or stopped"""
+    capture = screenshot_catalog.get_capture(session.session_id, create=True)
+    with session.lock:
+        if capture["capture_id"] != session.capture_id:
+            session.last_signature = None
+        session.capture_id = capture["capture_id"]
+        session.generation = capture["generation"]
+        session.active = capture["active"]
+        session.options = dict(DEFAULT_OPTIONS, **(capture["options"] or {}))
+    return capture
+
+
+def get_session(session_id, create=True):
+    """Look up (or create) this process's capture session for a session ID, synced with the catalog"""
+    _ensure_catalog()
+    with sessions_lock:
+        session = sessions.get(session_id)
+        if session is None and create:
+            session = sessions[session_id] = CaptureSession(session_id)
+        if session is not None:
+            session.last_used = time.monotonic()
+    if session is not None:
+        _sync(session)
+    return session
+
+
+def _encode_frame(img, filepath, options):
+    """Write one frame to disk with the configured format and compression; returns (size, sha256)"""
+    fmt = options["format"]
+    out = io.BytesIO()
+    if fmt == 'png':
+        img.save(out, 'PNG', compress_level=options["compress_level"])
+    elif fmt == 'webp':
+        img.save(out, 'WEBP', lossless=options["lossless"], quality=options["quality"])
+    else:
+        img.convert('RGB').save(out, 'JPEG', quality=options["quality"])
+    data = out.getbuffer()
+    with open(filepath, 'wb') as f:
+        f.write(data)
+    return len(data), hashlib.sha256(data).hexdigest()
+
+
+def encoder_worker():
+    """Encoder thread: take the next pending frame of whichever session is ready and write it"""
+    while True:
+        session = _ready.get()
+        with session.cond:
+            if not session.pending:
+                continue  # The frame behind this token was dropped
+            img, filepath, options, capture_id = session.pending.popleft()
+            session.cond.notify_all()
+
+        outcome = "errors"
         try:
-            capture_screenshot()
+            size, digest = _encode_frame(img, filepath, options)
+            screenshot_catalog.record_frame(session.session_id, capture_id, filepath, size, digest)
+            outcome = "encoded"
         except Exception as e:
-            print(f"Error capturing initial screenshot: {e}")
-        
-        # Start background thread for regular captures
-        should_capture_screenshots = True
-        screenshot_thread = threading.Thread(target=capture_screenshots_thread)
-        screenshot_thread.daemon = True
-        screenshot_thread.start()
-        
-        return {"status": "started", "message": "Screenshot capture started"}
-    
-    return {"status": "already_running", "message": "Screenshot capture already running"}
-
-def stop_screenshot_capture():
-    """Stop capturing screenshots"""
-    global should_capture_screenshots, screenshot_thread
-    
-    should_capture_screenshots = False
-    
-    # Take final screenshot
-    try:
-        capture_screenshot()
-    except Exception as e:
-        print(f"Error capturing final screenshot: {e}")
-    
-    if screenshot_thread and screenshot_thread.is_alive():
-        screenshot_thread.join(timeout=1.0)
-    
-    return {
-        "status": "stopped", 
-        "message": "Screenshot capture stopped", 
-        "screenshot_count": len(screenshots)
-    }
+            print(f"Error encoding screenshot {filepath}: {e}")
+        finally:
+            with session.cond:
+                session.unfinished -= 1
+                session.cond.notify_all()
+            try:
+                screenshot_catalog.count_capture(session.session_id, capture_id, unfinished=-1, **{outcome: 1})
+            except Exception as e:
+                print(f"Error counting screenshot {filepath}: {e}")
+
+
+def _ensure_workers():
+    """Start the encoder threads, capture pool and scheduler once per process"""
+    global _capture_pool, _scheduler_thread
+
+    with _workers_lock:
+        alive = [t for t in _encoder_threads if t.is_alive()]
+        for _ in range(ENCODER_THREADS - len(alive)):
+            thread = threading.Thread(target=encoder_worker, daemon=True)
+            thread.start()
+            alive.append(thread)
+        _encoder_threads[:] = alive
 
-def get_screenshots_zip():
-    """Create a ZIP file with all screenshots"""
-    global screenshots
-    
-    if not screenshots:
+        if _capture_pool is None:
+            _capture_pool = ThreadPoolExecutor(max_workers=CAPTURE_THREADS, thread_name_prefix='capture')
+        if _scheduler_thread is None or not _scheduler_thread.is_alive():
+            _scheduler_thread = threading.Thread(target=scheduler_loop, daemon=True)
+            _scheduler_thread.start()
+
+
+def frame_signature(img):
+    """Downsample a frame to a small greyscale array for cheap change detection"""
+    thumb = img.resize(DEDUP_SIZE, Image.BILINEAR, reducing_gap=2.0).convert('L')
+    return np.asarray(thumb, dtype=np.int16)
+
+
+def is_near_duplicate(session, img, threshold):
+    """True if img barely differs from the session's last kept frame; otherwise it becomes the reference"""
+    if threshold <= 0:
+        return False
+    signature = frame_signature(img)
+    with session.lock:
+        previous = session.last_signature
+        if previous is not None and previous.shape == signature.shape:
+            if np.abs(signature - previous).mean() < threshold:
+                return True
+        session.last_signature = signature
+    return False
+
+
+def enqueue_frame(session, img, options=None):
+    """Hand a captured frame to the encoders, applying the queue policy when they fall behind"""
+    options = dict(options or session.options)
+    # Settled simulations produce near-identical frames; don't store, zip or download those
+    if is_near_duplicate(session, img, options["dedup_threshold"]):
+        session.count("duplicates")
         return None
-    import os
-import time
-import datetime
-import threading
-from io import BytesIO
-from zipfile import ZipFile
-from PIL import ImageGrab
 
-# Create screenshots directory
-SCREENSHOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'screenshots')
-os.makedirs(SCREENSHOT_DIR, exist_ok=True)
+    now = datetime.datetime.now()
+    filename = f"screenshot_{now:%Y%m%d_%H%M%S}_{now.microsecond // 1000:03d}_{next(_frame_counter):06d}.{EXTENSIONS[options['format']]}"
+    filepath = os.path.join(session.directory, filename)
+    os.makedirs(session.directory, exist_ok=True)
 
-# Global variables for screenshot control
-screenshot_thread = None
-should_capture_screenshots = False
-screenshot_interval = 60  # seconds
-screenshots = []  # List to store paths to screenshots
-
-def capture_screenshot():
-    """Capture a screenshot of the entire screen"""
-    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"screenshot_{timestamp}.png"
-    filepath = os.path.join(SCREENSHOT_DIR, filename)
-    
-    # Capture screenshot
+    _ensure_workers()
+    policy = options["queue_policy"]
+    capture_id = session.capture_id
+    evicted = None  # capture of the oldest frame, when drop_oldest makes room by dropping it
+    rejected = False
+    with session.cond:
+        if len(session.pending) >= FRAME_QUEUE_SIZE:
+            if policy == 'block':
+                # Backpressure: the caller waits, and the scheduler records the missed slots as late
+                session.cond.wait_for(lambda: len(session.pending) < FRAME_QUEUE_SIZE)
+            elif policy == 'drop_newest':
+                rejected = True
+            else:
+                evicted = session.pending.popleft()[3]
+                session.unfinished -= 1
+        if not rejected:
+            session.pending.append((img, filepath, options, capture_id))
+            session.unfinished += 1
+    # Shared counters are written outside the session lock
+    if rejected:
+        session.count("dropped")
+        return None
+    if evicted is not None:
+        screenshot_catalog.count_capture(session.session_id, evicted, dropped=1, unfinished=-1)
+    screenshot_catalog.count_capture(session.session_id, capture_id, unfinished=1)
+    _ready.put(session)
+    return filepath
+
+
+def capture_screenshot(session):
+    """Capture a screenshot of the entire screen and queue it for encoding"""
     try:
         img = ImageGrab.grab()
-        img.save(filepath)
-        screenshots.append(filepath)
-        print(f"Screenshot captured: {filepath}")
-        return filepath
+        session.count("captured")
+        return enqueue_frame(session, img)
     except Exception as e:
+        session.count("errors")
         print(f"Error capturing screenshot: {e}")
         return None
+    finally:
+        session.capturing = False
 
-def capture_screenshots_thread():
-    """Thread function to capture screenshots at regular intervals"""
-    global should_capture_screenshots, screenshots
-    
-    while should_capture_screenshots:
-        try:
-            capture_screenshot()
-        except Exception as e:
-            print(f"Error in screenshot thread: {e}")
-        
-        # Sleep for the interval
-        time.sleep(screenshot_interval)
-
-def start_screenshot_capture():
-    """Start capturing screenshots at regular intervals"""
-    global screenshot_thread, should_capture_screenshots, screenshots
-    
-    if screenshot_thread is None or not screenshot_thread.is_alive():
-        # Clear previous screenshots
-        screenshots = []
-        
-        # Take initial screenshot immediately
-        try:
-            capture_screenshot()
-        except Exception as e:
-            print(f"Error capturing initial screenshot: {e}")
-        
-        # Start background thread for regular captures
-        should_capture_screenshots = True
-        screenshot_thread = threading.Thread(target=capture_screenshots_thread)
-        screenshot_thread.daemon = True
-        screenshot_thread.start()
-        
-        return {"status": "started", "message": "Screenshot capture started"}
-    
-    return {"status": "already_running", "message": "Screenshot capture already running"}
-
-def stop_screenshot_capture():
-    """Stop capturing screenshots"""
-    global should_capture_screenshots, screenshot_thread
-    
-    should_capture_screenshots = False
-    
-    # Take final screenshot
+
+def _schedule_capture(session, deadline):
+    with _schedule_cond:
+        heapq.heappush(_schedule, (deadline, next(_schedule_seq), session, session.generation))
+        _schedule_cond.notify()
+
+
+def _evict_idle_sessions():
+    """Forget stopped sessions nobody has touched for SESSION_TTL (their files stay on disk)"""
+    cutoff = time.monotonic() - SESSION_TTL
+    with sessions_lock:
+        for session_id in [sid for sid, s in sessions.items() if not s.active and s.last_used < cutoff]:
+            del sessions[session_id]
+
+
+def scheduler_loop():
+    """Single timer thread driving every session's captures on a fixed, drift-free timeline"""
+    next_sweep = time.monotonic() + 60
+    while True:
+        with _schedule_cond:
+            while True:
+                now = time.monotonic()
+                if now >= next_sweep or (_schedule and _schedule[0][0] <= now):
+                    break
+                timeout = next_sweep - now
+                if _schedule:
+                    timeout = min(timeout, _schedule[0][0] - now)
+                _schedule_cond.wait(timeout)
+
+            due = []
+            while _schedule and _schedule[0][0] <= now:
+                due.append(heapq.heappop(_schedule))
+
+        if now >= next_sweep:
+            _evict_idle_sessions()
+            next_sweep = now + 60
+
+        for deadline, _, session, generation in due:
+            try:
+                # /stop-capture (or a new /start-capture) may have been handled by another worker
+                _sync(session)
+            except Exception as e:
+                print(f"Error reading capture state for {session.session_id}: {e}")
+            if not session.active or generation != session.generation:
+                continue
+
+            # A grab still running from the previous slot means this slot is late
+            if session.capturing:
+                session.count("late")
+            else:
+                session.capturing = True
+                _capture_pool.submit(capture_screenshot, session)
+
+            # Schedule against the original timeline; slots we were too slow for are skipped and counted
+            interval = session.options["interval"]
+            next_deadline = deadline + interval
+            if now > next_deadline:
+                missed = int((now - next_deadline) // interval) + 1
+                session.count("late", missed)
+                next_deadline += missed * interval
+            _schedule_capture(session, next_deadline)
+
+
+def configure_capture(session, options):
+    """Apply interval and encoding options posted to /start-capture (ValueError if malformed)"""
+    if not options:
+        return
+    if not isinstance(options, dict):
+        raise ValueError("Capture options must be a JSON object")
+    # Validate everything before touching the session so a bad option changes nothing
+    settings = dict(session.options)
     try:
-        capture_screenshot()
-    except Exception as e:
-        print(f"Error capturing final screenshot: {e}")
-    
-    if screenshot_thread and screenshot_thread.is_alive():
-        screenshot_thread.join(timeout=1.0)
-    
+        if options.get("source") in ('server', 'client'):
+            settings["source"] = options["source"]
+        if "interval" in options:
+            settings["interval"] = max(0.2, float(options["interval"]))
+        if options.get("format") in EXTENSIONS:
+            settings["format"] = options["format"]
+        if "compress_level" in options:
+            settings["compress_level"] = min(9, max(0, int(options["compress_level"])))
+        if "quality" in options:
+            settings["quality"] = min(100, max(1, int(options["quality"])))
+        if "lossless" in options:
+            settings["lossless"] = bool(options["lossless"])
+        if options.get("queue_policy") in QUEUE_POLICIES:
+            settings["queue_policy"] = options["queue_policy"]
+        if "dedup_threshold" in options:
+            settings["dedup_threshold"] = max(0.0, float(options["dedup_threshold"]))
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError("Invalid capture options: interval, compress_level, quality and dedup_threshold must be numbers")
+    if not math.isfinite(settings["interval"]) or not math.isfinite(settings["dedup_threshold"]):
+        raise ValueError("Invalid capture options: interval and dedup_threshold must be finite")
+    session.options.update(settings)
+
+
+def start_screenshot_capture(session_id, options=None):
+    """Start capturing screenshots at regular intervals for one session"""
+    session = get_session(session_id)
+    if session.active:
+        return {"status": "already_running", "message": "Screenshot capture already running"}
+
+    configure_capture(session, options)
+
+    # Start a new capture for every worker; earlier captures stay cataloged until retention removes them
+    _, started = screenshot_catalog.open_capture(session_id, session.options)
+    _sync(session)
+    if not started:
+        return {"status": "already_running", "message": "Screenshot capture already running"}
+
+    # This worker grabs the frames; the others learn the capture from the catalog
+    settings = session.options
+    if settings["source"] == 'client':
+        # Frames arrive through /upload-frames; there is nothing to grab here
+        return {"status": "started", "message": "Waiting for uploaded frames", "source": settings["source"],
+                "format": settings["format"]}
+
+    # Take initial screenshot immediately, then hand the session to the shared scheduler
+    _ensure_workers()
+    session.capturing = True
+    _capture_pool.submit(capture_screenshot, session)
+    _schedule_capture(session, time.monotonic() + settings["interval"])
+
+    return {"status": "started", "message": "Screenshot capture started", "source": settings["source"],
+            "interval": settings["interval"], "format": settings["format"]}
+
+
+def _wait_for_encoders(session, timeout):
+    """Wait (bounded) until every queued frame of the session's capture has been written, in any worker"""
+    deadline = time.monotonic() + timeout
+    with session.cond:
+        session.cond.wait_for(lambda: session.unfinished == 0, timeout)
+    while time.monotonic() < deadline:
+        capture = screenshot_catalog.get_capture(session.session_id)
+        if capture is None or capture["unfinished"] <= 0:
+            return
+        time.sleep(0.05)
+
+
+def _describe_stats(capture):
+    if capture is None:
+        return dict(dict.fromkeys(STAT_NAMES, 0), queued=0, active=False)
+    stats = {name: capture[name] for name in STAT_NAMES}
+    stats["queued"] = max(0, capture["unfinished"])
+    stats["active"] = capture["active"]
+    return stats
+
+
+def stop_screenshot_capture(session_id):
+    """Stop capturing screenshots for one session, whichever worker is grabbing its frames"""
+    _ensure_catalog()
+    capture, was_active = screenshot_catalog.close_capture(session_id)
+    if capture is None:
+        return {"status": "stopped", "message": "No capture running", "screenshot_count": 0}
+    session = get_session(session_id)
+
+    # Take final screenshot (the grabbing worker stops at its next slot, when it sees the catalog)
+    if was_active and session.options["source"] == 'server':
+        session.capturing = True
+        capture_screenshot(session)
+
+    # Let the encoders finish so the ZIP includes every frame
+    _wait_for_encoders(session, timeout=10.0)
+
     return {
-        "status": "stopped", 
-        "message": "Screenshot capture stopped", 
-        "screenshot_count": len(screenshots)
+        "status": "stopped",
+        "message": "Screenshot capture stopped",
+        "screenshot_count": len(screenshot_catalog.capture_paths(capture["capture_id"])),
+        "stats": _describe_stats(screenshot_catalog.get_capture(session_id))
     }
 
-def get_screenshots_zip():
-    """Create a ZIP file with all screenshots"""
-    global screenshots
-    
-    if not screenshots:
+
+def get_capture_stats(session_id):
+    """Return a session's pipeline counters (captured, encoded, dropped, late, duplicates, errors)"""
+    _ensure_catalog()
+    return _describe_stats(screenshot_catalog.get_capture(session_id))
+
+
+def get_screenshot_paths(session_id):
+    """Paths of the frames of a session's current (or latest) capture, in order"""
+    _ensure_catalog()
+    capture = screenshot_catalog.get_capture(session_id)
+    capture_id = capture["capture_id"] if capture else screenshot_catalog.latest_capture(session_id)
+    return screenshot_catalog.capture_paths(capture_id) if capture_id else []
+
+
+def get_screenshots_zip(session_id):
+    """Lay out a ZIP of a session's screenshots for streaming; returns a ZipPlan or None"""
+    paths = get_screenshot_paths(session_id)
+    if not paths:
         return None
-    
-    # Create in-memory ZIP file
-    memory_file = BytesIO()
-    with ZipFile(memory_file, 'w') as zf:
-        for i, filepath in enumerate(screenshots):
-            if os.path.exists(filepath):
-                # Add file to the ZIP with a simplified name
-                filename = os.path.basename(filepath)
-                zf.write(filepath, filename)
-    
-    # Reset the file pointer
-    memory_file.seek(0)
-    return memory_file
-    # Create in-memory ZIP file
-    memory_file = BytesIO()
-    with ZipFile(memory_file, 'w') as zf:
-        for i, filepath in enumerate(screenshots):
-            if os.path.exists(filepath):
-                # Add file to the ZIP with a simplified name
-                filename = os.path.basename(filepath)
-                zf.write(filepath, filename)
-    
-    # Reset the file pointer
-    memory_file.seek(0)
-    return memory_file
\ No newline at end of file
+
+    # Entries are read from disk as the response streams, so memory stays flat
+    return build_zip_plan(paths)
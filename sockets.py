@@ -0,0 +1,170 @@
+import os
+import json
+import logging
+import threading
+from flask import request
+from flask_socketio import SocketIO, emit, join_room, leave_room
+from param_store import get_params_payload, set_params
+from routes import capture_session_id, run_start_capture, run_stop_capture
+
+logger = logging.getLogger(__name__)
+
+# Bound to the app by create_app(socketio=True); importing this module is what pulls in
+# Flask-SocketIO, so apps without Socket.IO never load it.
+socketio = SocketIO()
+
+
+def init_socketio(app):
+    """Attach Socket.IO to the app with explicit allowed origins (deployments add theirs via SOCKETIO_ALLOWED_ORIGINS)"""
+    socketio.init_app(
+        app,
+        cors_allowed_origins=["http://localhost:5001", "http://127.0.0.1:5001"]
+        + [origin for origin in os.environ.get('SOCKETIO_ALLOWED_ORIGINS', '').split(',') if origin],
+        # With several workers, pushes must go through a shared queue (e.g. redis://) to reach every room
+        message_queue=os.environ.get('SOCKETIO_MESSAGE_QUEUE') or None,
+        logger=os.environ.get('SOCKETIO_LOGGING') == '1',
+        engineio_logger=os.environ.get('SOCKETIO_LOGGING') == '1'
+    )
+    return socketio
+
+
+# Socket.IO event handlers: every socket joins the room of its parameter session, so
+# parameter and capture changes are pushed instead of polled. Handler return values
+# are sent back as the client's acknowledgement.
+socket_sessions = {}  # socket sid -> session ID
+
+def socket_session_id(auth=None):
+    """Sockets name their session in the connect auth payload, or send the usual cookie/header"""
+    session_id = auth.get('session') if isinstance(auth, dict) else None
+    if isinstance(session_id, str) and 0 < len(session_id) <= 64 and session_id.isalnum():
+        return session_id
+    return capture_session_id()
+
+def params_event(session_id):
+    """Payload of a params_updated push"""
+    payload, version = get_params_payload(session_id)
+    return {"session_id": session_id, "version": version, "params": json.loads(payload)}
+
+@socketio.on('connect')
+def handle_connect(auth=None):
+    session_id = socket_session_id(auth)
+    socket_sessions[request.sid] = session_id
+    join_room(session_id)
+    logger.info(f'Client connected to session {session_id}')
+    # Start the client off with the current parameters instead of making it fetch /get-data
+    emit('params_updated', params_event(session_id))
+
+@socketio.on('disconnect')
+def handle_disconnect():
+    socket_sessions.pop(request.sid, None)
+    drop_telemetry_subscriber(request.sid)
+    logger.info('Client disconnected')
+
+@socketio.on('set_params')
+def handle_set_params(data):
+    """Store parameters sent over the socket and push them to the rest of the session"""
+    params = data.get('params') if isinstance(data, dict) else None
+    if not isinstance(params, dict):
+        return {"status": "error", "error": "Expected a JSON object of simulation parameters"}
+    from run_store import params_hash
+
+    try:
+        session_id = socket_sessions.get(request.sid) or socket_session_id()
+        version = set_params(session_id, params)
+        socketio.emit('params_updated', {"session_id": session_id, "version": version, "params": params},
+                      to=session_id)
+        return {"status": "ok", "session_id": session_id, "version": version, "params_hash": params_hash(params)}
+    except Exception as e:
+        logger.error(f"Error storing socket parameters: {str(e)}")
+        return {"status": "error", "error": str(e)}
+
+@socketio.on('start_capture')
+def handle_start_capture(options=None):
+    try:
+        return run_start_capture(socket_sessions.get(request.sid) or socket_session_id(),
+                                 options if isinstance(options, dict) else None)
+    except Exception as e:
+        logger.error(f"Error starting capture: {str(e)}")
+        return {"status": "error", "error": str(e)}
+
+@socketio.on('stop_capture')
+def handle_stop_capture(data=None):
+    try:
+        return run_stop_capture(socket_sessions.get(request.sid) or socket_session_id())
+    except Exception as e:
+        logger.error(f"Error stopping capture: {str(e)}")
+        return {"status": "error", "error": str(e)}
+
+# Live telemetry: viewers subscribe to a run at a resolution. One background task tails the
+# watched runs and emits a single downsampled payload per (run, resolution) room, so the
+# cost does not grow with the number of viewers.
+TELEMETRY_INTERVAL = float(os.environ.get('TELEMETRY_INTERVAL', 0.5))  # seconds between pushes
+telemetry_rooms = {}  # room -> (run_id, points, method, subscriber sids)
+telemetry_lock = threading.Lock()
+telemetry_task = None
+
+def telemetry_loop():
+    import telemetry
+
+    while True:
+        socketio.sleep(TELEMETRY_INTERVAL)
+        with telemetry_lock:
+            views = [(room, run_id, points, method) for room, (run_id, points, method, _) in telemetry_rooms.items()]
+        changed = {}
+        for room, run_id, points, method in views:
+            state = telemetry.get_run_telemetry(run_id)
+            if state is None:
+                continue
+            if run_id not in changed:
+                try:
+                    changed[run_id] = state.refresh()
+                except Exception as e:
+                    logger.error(f"Error refreshing telemetry for run {run_id}: {str(e)}")
+                    changed[run_id] = False
+            if changed[run_id]:
+                socketio.emit('telemetry', state.snapshot(points, method), to=room)
+
+def drop_telemetry_subscriber(sid, room=None):
+    with telemetry_lock:
+        for name in [room] if room else list(telemetry_rooms):
+            view = telemetry_rooms.get(name)
+            if view is not None:
+                view[3].discard(sid)
+                if not view[3]:
+                    del telemetry_rooms[name]
+
+@socketio.on('subscribe_telemetry')
+def handle_subscribe_telemetry(data):
+    """Join a run's telemetry at {points, method}; the acknowledgement carries the current series"""
+    global telemetry_task
+    import telemetry
+
+    data = data if isinstance(data, dict) else {}
+    run_id = str(data.get('run_id', ''))
+    try:
+        points, method = telemetry.normalize_view(data.get('points'), data.get('method'))
+        result = telemetry.snapshot(run_id, points, method)
+    except ValueError as e:
+        return {"status": "error", "error": str(e)}
+    if result is None:
+        return {"status": "error", "error": "Unknown run"}
+
+    room = f"telemetry:{run_id}:{method}:{points}"
+    join_room(room)
+    with telemetry_lock:
+        telemetry_rooms.setdefault(room, (run_id, points, method, set()))[3].add(request.sid)
+        if telemetry_task is None:
+            telemetry_task = socketio.start_background_task(telemetry_loop)
+    return dict(result, status="ok", room=room)
+
+@socketio.on('unsubscribe_telemetry')
+def handle_unsubscribe_telemetry(data):
+    room = data.get('room') if isinstance(data, dict) else None
+    if isinstance(room, str):
+        leave_room(room)
+        drop_telemetry_subscriber(request.sid, room)
+    return {"status": "ok"}
+
+@socketio.on_error()
+def handle_error(e):
+    logger.error(f'SocketIO error: {str(e)}')
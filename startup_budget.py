@@ -0,0 +1,100 @@
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+# Startup budget check: measures, in fresh interpreters, how long building the app takes and
+# how much memory a preforked worker adds on top of the shared master. Exits non-zero when a
+# budget is exceeded, so it can run in CI or before a deploy:  python startup_budget.py
+COLD_START_BUDGET_S = float(os.environ.get('COLD_START_BUDGET_S', 0.75))  # import + create_app, unwarmed (measured 0.26s)
+WARM_START_BUDGET_S = float(os.environ.get('WARM_START_BUDGET_S', 1.5))  # master with preloaded subsystems (0.67s)
+WORKER_PRIVATE_MB_BUDGET = float(os.environ.get('WORKER_PRIVATE_MB_BUDGET', 16))  # per forked worker (10.5MB)
+
+# Runs in a child interpreter so module caches and allocator state start empty
+_MEASURE = r'''
+import os, sys, json, time, resource
+started = time.perf_counter()
+from app import create_app
+app = create_app(warm=WARM)
+elapsed = time.perf_counter() - started
+print(json.dumps({"seconds": elapsed, "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+                  "xgboost_loaded": "xgboost" in sys.modules, "pil_loaded": "PIL" in sys.modules}))
+'''
+
+_WORKERS = r'''
+import os, sys, json
+from app import create_app
+app = create_app(warm=True)
+
+
+def private_mb():
+    """Pages this process no longer shares with the master (smaps_rollup, Linux only)"""
+    with open('/proc/self/smaps_rollup') as f:
+        fields = dict(line.split(':', 1) for line in f if ':' in line)
+    return sum(int(fields[name].split()[0]) for name in ('Private_Dirty', 'Private_Clean')) / 1024
+
+
+results = []
+for _ in range(WORKERS):
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        client = app.test_client()
+        headers = {'X-Forwarded-Proto': 'https'}
+        for path in ('/healthz', '/', '/simulator', '/get-data', '/metrics'):
+            client.get(path, headers=headers)
+        os.write(write_fd, json.dumps(private_mb()).encode())
+        os._exit(0)
+    os.close(write_fd)
+    with os.fdopen(read_fd) as f:
+        results.append(json.loads(f.read()))
+    os.waitpid(pid, 0)
+print(json.dumps({"master_private_mb": private_mb(), "worker_private_mb": results}))
+'''
+
+
+def run(script, **constants):
+    """Run a measurement script in a fresh interpreter and return its JSON output"""
+    prelude = ''.join(f"{name} = {value!r}\n" for name, value in constants.items())
+    output = subprocess.run([sys.executable, '-c', prelude + script], cwd=os.path.dirname(os.path.abspath(__file__)),
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold start and per-worker memory against budgets")
+    parser.add_argument('--repeat', type=int, default=3, help="cold starts to measure (the best one counts)")
+    parser.add_argument('--workers', type=int, default=2, help="workers to fork for the memory check")
+    args = parser.parse_args()
+
+    cold = min((run(_MEASURE, WARM=False) for _ in range(args.repeat)), key=lambda r: r["seconds"])
+    warm = min((run(_MEASURE, WARM=True) for _ in range(args.repeat)), key=lambda r: r["seconds"])
+    memory = run(_WORKERS, WORKERS=args.workers) if sys.platform.startswith('linux') else None
+    worker_mb = max(memory["worker_private_mb"]) if memory else None
+
+    checks = [
+        ("cold start", cold["seconds"], COLD_START_BUDGET_S, "s"),
+        ("warm start", warm["seconds"], WARM_START_BUDGET_S, "s"),
+    ]
+    if worker_mb is not None:
+        checks.append(("worker private memory", worker_mb, WORKER_PRIVATE_MB_BUDGET, "MB"))
+
+    print(f"cold start: {cold['seconds']:.3f}s, {cold['max_rss_mb']:.0f}MB RSS"
+          f" (xgboost loaded: {cold['xgboost_loaded']}, Pillow loaded: {cold['pil_loaded']})")
+    print(f"warm start: {warm['seconds']:.3f}s, {warm['max_rss_mb']:.0f}MB RSS")
+    if memory:
+        print(f"forked workers: {', '.join(f'{mb:.1f}MB' for mb in memory['worker_private_mb'])} private"
+              f" (master {memory['master_private_mb']:.0f}MB)")
+
+    failed = False
+    for name, value, budget, unit in checks:
+        ok = value <= budget
+        failed = failed or not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {name}: {value:.2f}{unit} (budget {budget:g}{unit})")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -37,6 +37,19 @@ class MetricsDownloader {
         };
         
         this.isRecording = false;
+        
+        // Streaming: events are sent to the server in numbered chunks instead of piling up here
+        this.runId = null;
+        this.runReady = Promise.resolve(null);
+        this.nextSeq = 0;                // sequence number of the next sealed chunk
+        this.pending = { bond_events: [], cluster_sizes: [] };
+        this.unsent = [];                // sealed chunks not yet stored, oldest first
+        this.storedChunks = 0;
+        this.uploading = Promise.resolve();
+        this.chunkSize = 2000;           // flush after this many records
+        this.flushIntervalMs = 5000;     // ...or this often, whichever comes first
+        this.maxRetries = 5;
+        this.flushTimer = null;
     }
     
     // Get basic device info
@@ -75,9 +88,141 @@ class MetricsDownloader {
         this.metricsData.start_time = new Date().toISOString();
         this.metricsData.end_time = null;
         
+        this.openRun();
+        
         return true;
     }
     
+    // Create the server-side run that chunks are appended to
+    openRun() {
+        const { metrics, ...parameters } = this.metricsData;
+        
+        this.runId = null;
+        this.nextSeq = 0;
+        this.pending = { bond_events: [], cluster_sizes: [] };
+        this.unsent = [];
+        this.storedChunks = 0;
+        this.runReady = fetch('/runs', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            credentials: 'same-origin',
+            body: JSON.stringify(parameters)
+        })
+        .then(response => {
+            if (!response.ok) {
+                throw new Error(`Server responded with ${response.status}`);
+            }
+            return response.json();
+        })
+        .then(result => {
+            this.runId = result.run_id;
+            this.metricsData.run_id = result.run_id;
+            return result.run_id;
+        })
+        .catch(error => {
+            // Without a run we fall back to keeping everything in memory
+            console.warn("Metrics streaming unavailable:", error);
+            return null;
+        });
+        
+        clearInterval(this.flushTimer);
+        this.flushTimer = setInterval(() => this.flushChunk(), this.flushIntervalMs);
+    }
+    
+    // Buffer one record and flush once a chunk is full
+    queueRecord(series, record) {
+        this.pending[series].push(record);
+        if (this.pending.bond_events.length + this.pending.cluster_sizes.length >= this.chunkSize) {
+            this.flushChunk();
+        }
+    }
+    
+    // gzip the NDJSON body when the browser supports CompressionStream
+    encodeChunk(text) {
+        if (typeof CompressionStream === 'undefined') {
+            return Promise.resolve({ body: text, headers: {} });
+        }
+        const stream = new Blob([text]).stream().pipeThrough(new CompressionStream('gzip'));
+        return new Response(stream).blob().then(body => ({ body, headers: { 'Content-Encoding': 'gzip' } }));
+    }
+    
+    // Send one sealed chunk, retrying with the same sequence number and the same body (the server ignores replays)
+    sendChunk(runId, sealed, attempt = 0) {
+        if (!sealed.encoded) {
+            const { bond_events, cluster_sizes } = sealed.chunk;
+            const lines = bond_events.concat(cluster_sizes).map(record => JSON.stringify(record));
+            sealed.encoded = this.encodeChunk(lines.join('\n'));
+        }
+        
+        return sealed.encoded
+            .then(({ body, headers }) => fetch(`/runs/${runId}/chunks/${sealed.seq}`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/x-ndjson', ...headers },
+                credentials: 'same-origin',
+                body
+            }))
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error(`Server responded with ${response.status}`);
+                }
+            })
+            .catch(error => {
+                if (attempt >= this.maxRetries) {
+                    throw error;
+                }
+                const delay = Math.min(30000, 500 * 2 ** attempt);
+                return new Promise(resolve => setTimeout(resolve, delay))
+                    .then(() => this.sendChunk(runId, sealed, attempt + 1));
+            });
+    }
+    
+    // Send sealed chunks in order; a chunk that keeps failing stays first in line for the next flush
+    drainUnsent(runId) {
+        if (this.unsent.length === 0) {
+            return Promise.resolve();
+        }
+        return this.sendChunk(runId, this.unsent[0]).then(
+            () => {
+                this.unsent.shift();
+                this.storedChunks++;
+                return this.drainUnsent(runId);
+            },
+            error => console.error("Error uploading metrics chunk, keeping it for the next flush:", error)
+        );
+    }
+    
+    // Seal the buffered records as the next chunk and hand it to the upload chain, which keeps chunks in order.
+    // A sealed chunk never changes, so a retry can't mix newer records into a sequence number the server may have stored.
+    flushChunk() {
+        if (this.pending.bond_events.length > 0 || this.pending.cluster_sizes.length > 0) {
+            this.unsent.push({ seq: this.nextSeq++, chunk: this.pending, encoded: null });
+            this.pending = { bond_events: [], cluster_sizes: [] };
+        }
+        if (this.unsent.length === 0) {
+            return this.uploading;
+        }
+        
+        this.uploading = this.uploading
+            .then(() => this.runReady)
+            .then(runId => {
+                if (!runId) {
+                    this.unsent.forEach(sealed => this.keepInMemory(sealed.chunk));
+                    this.unsent = [];
+                    return;
+                }
+                return this.drainUnsent(runId);
+            });
+        
+        return this.uploading;
+    }
+    
+    keepInMemory(chunk) {
+        this.metricsData.metrics.bond_events.push(...chunk.bond_events);
+        this.metricsData.metrics.cluster_sizes.push(...chunk.cluster_sizes);
+    }
+    
     // Record a bond formation event
     recordBondFormed(time, agent1, agent2) {
         if (!this.isRecording) return false;
@@ -85,7 +230,7 @@ class MetricsDownloader {
         this.metricsData.metrics.bonds_formed++;
         this.metricsData.metrics.total_bonds++;
         
-        this.metricsData.metrics.bond_events.push({
+        this.queueRecord('bond_events', {
             time: time,
             event_type: 'formed',
             agent1: agent1,
@@ -102,7 +247,7 @@ class MetricsDownloader {
         this.metricsData.metrics.bonds_broken++;
         this.metricsData.metrics.total_bonds--;
         
-        this.metricsData.metrics.bond_events.push({
+        this.queueRecord('bond_events', {
             time: time,
             event_type: 'broken',
             agent1: agent1,
@@ -116,7 +261,7 @@ class MetricsDownloader {
     recordClusterSize(time, maxSize, clusterCount) {
         if (!this.isRecording) return false;
         
-        this.metricsData.metrics.cluster_sizes.push({
+        this.queueRecord('cluster_sizes', {
             time: time,
             max_size: maxSize,
             cluster_count: clusterCount
@@ -160,12 +305,88 @@ class MetricsDownloader {
         // Add some final calculations
         this.calculateDerivedMetrics();
         
-        // Trigger the download
-        this.downloadMetrics();
+        clearInterval(this.flushTimer);
+        this.flushChunk()
+            .then(() => this.unsent.length === 0 ? this.finishRun() : null)
+            .then(runId => {
+                if (runId) {
+                    // Everything is on the server, so stream the file from there
+                    this.downloadRun(runId);
+                } else {
+                    this.downloadLocally();
+                }
+            });
         
         return true;
     }
     
+    // Build the file here when the run could not be completed on the server: the chunks it did
+    // store are fetched back and put in front of the ones that never made it
+    downloadLocally() {
+        this.unsent.forEach(sealed => this.keepInMemory(sealed.chunk));
+        this.unsent = [];
+        this.keepInMemory(this.pending);
+        this.pending = { bond_events: [], cluster_sizes: [] };
+        
+        const stored = this.runId && this.storedChunks > 0
+            ? fetch(`/runs/${this.runId}/export`, { credentials: 'same-origin' })
+                .then(response => {
+                    if (!response.ok) {
+                        throw new Error(`Server responded with ${response.status}`);
+                    }
+                    return response.json();
+                })
+                .then(run => {
+                    const metrics = this.metricsData.metrics;
+                    metrics.bond_events = run.metrics.bond_events.concat(metrics.bond_events);
+                    metrics.cluster_sizes = run.metrics.cluster_sizes.concat(metrics.cluster_sizes);
+                })
+                .catch(error => {
+                    // Say where the rest of the run is instead of passing the file off as complete
+                    console.error("Error fetching the stored part of the metrics run:", error);
+                    this.metricsData.stored_on_server = { run_id: this.runId, chunks: this.storedChunks };
+                })
+            : Promise.resolve();
+        
+        return stored.then(() => {
+            this.calculateDerivedMetrics();
+            return this.downloadMetrics();
+        });
+    }
+    
+    // Store the summary metrics of the streamed run
+    finishRun() {
+        if (!this.runId) {
+            return Promise.resolve(null);
+        }
+        
+        const { bond_events, cluster_sizes, ...summary } = this.metricsData.metrics;
+        return fetch(`/runs/${this.runId}/finish`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            credentials: 'same-origin',
+            body: JSON.stringify({ metrics: summary, end_time: this.metricsData.end_time })
+        })
+        .then(response => response.ok ? this.runId : null)
+        .catch(error => {
+            console.error("Error finishing metrics run:", error);
+            return null;
+        });
+    }
+    
+    // Download a streamed run as JSON straight from the run store
+    downloadRun(runId) {
+        const link = document.createElement('a');
+        link.href = `/runs/${runId}/export`;
+        link.download = `vibration_simulation_metrics_${runId}.json`;
+        document.body.appendChild(link);
+        link.click();
+        setTimeout(() => document.body.removeChild(link), 100);
+        console.log(`Metrics for run ${runId} downloaded from server`);
+    }
+    
     // Calculate additional metrics before download
     calculateDerivedMetrics() {
         // Sort bond events by time
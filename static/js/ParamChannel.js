@@ -0,0 +1,97 @@
+// ParamChannel.js - Receives pushed parameter and capture events over Socket.IO instead of polling /get-data
+
+class ParamChannel {
+    constructor(options = {}) {
+        this.session = options.session || null;    // defaults to the session cookie sent with the handshake
+        this.onParams = options.onParams || (() => {});
+        this.onStartCapture = options.onStartCapture || (() => {});
+        this.onStopCapture = options.onStopCapture || (() => {});
+        this.ackTimeoutMs = options.ackTimeoutMs || 3000;
+
+        this.socket = null;
+        this.version = -1;
+    }
+
+    // Returns false when the Socket.IO client is unavailable, so callers keep using HTTP
+    connect() {
+        if (typeof io === 'undefined') {
+            console.warn("Socket.IO client not loaded; parameter updates will not be pushed");
+            return false;
+        }
+
+        this.socket = io({
+            auth: this.session ? { session: this.session } : {},
+            transports: ['websocket', 'polling'],
+            reconnectionAttempts: 10
+        });
+        this.socket.on('params_updated', event => {
+            // Replays (the connect push after a reconnect, our own echo) carry no new version
+            if (event.version <= this.version) {
+                return;
+            }
+            this.version = event.version;
+            this.onParams(event.params, event);
+        });
+        this.socket.on('start_capture', event => this.onStartCapture(event));
+        this.socket.on('stop_capture', event => this.onStopCapture(event));
+        this.socket.on('connect_error', error => console.warn("Parameter channel error:", error.message));
+        return true;
+    }
+
+    // Emit an event and resolve with the server's acknowledgement
+    request(name, data) {
+        if (!this.socket || !this.socket.connected) {
+            return Promise.reject(new Error("Parameter channel is not connected"));
+        }
+        return new Promise((resolve, reject) => {
+            const timer = setTimeout(() => reject(new Error(`No acknowledgement for ${name}`)), this.ackTimeoutMs);
+            this.socket.emit(name, data, ack => {
+                clearTimeout(timer);
+                if (ack && ack.status === 'error') {
+                    reject(new Error(ack.error));
+                } else {
+                    resolve(ack);
+                }
+            });
+        });
+    }
+
+    // Store new parameters; falls back to POST /set-data when the socket is down
+    setParams(params) {
+        return this.request('set_params', { params: params }).catch(() => fetch('/set-data', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            credentials: 'same-origin',
+            body: JSON.stringify(params)
+        }).then(response => response.json()));
+    }
+
+    startCapture(options = {}) {
+        return this.request('start_capture', options);
+    }
+
+    stopCapture() {
+        return this.request('stop_capture', {});
+    }
+
+    // Watch a run's downsampled telemetry; onData gets the initial series and every pushed update
+    subscribeTelemetry(runId, onData, options = {}) {
+        const view = { run_id: runId, points: options.points || 500, method: options.method || 'lttb' };
+        return this.request('subscribe_telemetry', view).then(ack => {
+            const listener = event => {
+                if (event.run_id === runId && event.method === ack.method && event.points === ack.points) {
+                    onData(event);
+                }
+            };
+            this.socket.on('telemetry', listener);
+            onData(ack);
+            // Returns the unsubscribe function
+            return () => {
+                this.socket.off('telemetry', listener);
+                return this.request('unsubscribe_telemetry', { room: ack.room });
+            };
+        });
+    }
+}
+
+window.ParamChannel = ParamChannel;
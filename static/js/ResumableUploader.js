@@ -0,0 +1,136 @@
+// ResumableUploader.js - Streams MediaRecorder chunks to /uploads as they are recorded, resuming after dropped connections
+
+class ResumableUploader {
+    constructor(options = {}) {
+        this.endpoint = options.endpoint || '/uploads';
+        this.filename = options.filename || 'simulation-recording.webm';
+        this.contentType = options.contentType || 'video/webm';
+        this.chunkSize = options.chunkSize || 4 * 1024 * 1024;   // bytes per request (server limit is 16MB)
+        this.maxRetries = options.maxRetries || 8;
+
+        this.uploadId = null;
+        this.offset = 0;            // bytes the server has confirmed
+        this.pending = [];          // recorded Blobs not yet confirmed, in order
+        this.pendingStart = 0;      // byte offset of pending[0] in the recording
+        this.uploading = null;
+        this.ready = null;
+    }
+
+    // Register the upload; the ID is remembered so a reloaded tab can still complete it
+    start() {
+        this.ready = fetch(this.endpoint, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            credentials: 'same-origin',
+            body: JSON.stringify({ filename: this.filename, content_type: this.contentType })
+        })
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error(`Server responded with ${response.status}`);
+                }
+                return response.json();
+            })
+            .then(upload => {
+                this.uploadId = upload.upload_id;
+                localStorage.setItem('resumableUpload', this.uploadId);
+                return upload;
+            });
+        return this.ready;
+    }
+
+    // Queue a recorded chunk; sends as soon as the previous request is done
+    append(blob) {
+        if (blob && blob.size > 0) {
+            this.pending.push(blob);
+            this.pump().catch(() => {});  // failures are logged by drain and surface in finish()
+        }
+    }
+
+    // Chain a drain after the current one, so a chunk queued while it finishes is never left behind
+    pump() {
+        if (!this.ready) {
+            return Promise.reject(new Error("Call start() before uploading"));
+        }
+        const previous = this.uploading ? this.uploading.catch(() => {}) : this.ready;
+        this.uploading = previous.then(() => this.drain());
+        return this.uploading;
+    }
+
+    async drain() {
+        let failures = 0;
+        while (this.pending.length > 0) {
+            // Send from the confirmed offset, so a retry never resends stored bytes
+            const data = new Blob(this.pending).slice(this.offset - this.pendingStart,
+                                                      this.offset - this.pendingStart + this.chunkSize);
+            try {
+                const response = await fetch(`${this.endpoint}/${this.uploadId}/chunks/${this.offset}`, {
+                    method: 'PUT',
+                    headers: { 'Content-Type': 'application/octet-stream' },
+                    credentials: 'same-origin',
+                    body: data
+                });
+                const result = await response.json();
+                const before = this.offset;
+                if (response.ok || response.status === 409) {
+                    // 409 tells us where the server actually is (a chunk partly arrived, or another request is writing)
+                    this.confirm(result.offset);
+                }
+                if (this.offset === before) {
+                    throw new Error(result.error || `Server responded with ${response.status}`);
+                }
+                failures = 0;
+            } catch (error) {
+                failures += 1;
+                if (failures > this.maxRetries) {
+                    console.error("Giving up on recording upload:", error);
+                    throw error;
+                }
+                console.warn(`Recording upload failed, retrying (${failures}/${this.maxRetries}):`, error.message);
+                await new Promise(resolve => setTimeout(resolve, Math.min(30000, 500 * 2 ** failures)));
+                await this.refreshOffset().catch(() => {});
+            }
+        }
+    }
+
+    // Drop the Blobs the server has fully stored
+    confirm(offset) {
+        this.offset = Math.max(this.offset, offset);
+        while (this.pending.length > 0 && this.pendingStart + this.pending[0].size <= this.offset) {
+            this.pendingStart += this.pending[0].size;
+            this.pending.shift();
+        }
+    }
+
+    refreshOffset() {
+        return fetch(`${this.endpoint}/${this.uploadId}`, { credentials: 'same-origin' })
+            .then(response => response.json())
+            .then(upload => this.confirm(upload.offset));
+    }
+
+    // Wait for every queued chunk, then publish the recording; resolves with its download URL
+    finish() {
+        return this.pump()
+            .then(() => fetch(`${this.endpoint}/${this.uploadId}/complete`, {
+                method: 'POST',
+                credentials: 'same-origin'
+            }))
+            .then(response => response.json())
+            .then(upload => {
+                localStorage.removeItem('resumableUpload');
+                return upload;
+            });
+    }
+
+    // Complete an upload left behind by a crashed or closed tab, keeping what reached the server
+    static recoverAbandoned(endpoint = '/uploads') {
+        const uploadId = localStorage.getItem('resumableUpload');
+        if (!uploadId) {
+            return Promise.resolve(null);
+        }
+        return fetch(`${endpoint}/${uploadId}/complete`, { method: 'POST', credentials: 'same-origin' })
+            .then(response => response.ok ? response.json() : null)
+            .finally(() => localStorage.removeItem('resumableUpload'));
+    }
+}
+
+window.ResumableUploader = ResumableUploader;
@@ -37,8 +37,10 @@ class UnityVideoRecorder {
     this.settings = {
       filename: 'simulation-recording',
       autoDownload: true,
+      upload: true, // stream chunks to the server while recording (needs ResumableUploader.js)
       format: 'webm'
     };
+    this.uploader = null;
     
     // Capture original Unity elements state
     this.originalState = {
@@ -67,6 +69,15 @@ class UnityVideoRecorder {
   initialize() {
     console.log('Initializing Unity Video Recorder...');
     
+    // Keep whatever an earlier, crashed tab managed to upload
+    if (window.ResumableUploader) {
+      ResumableUploader.recoverAbandoned().then(upload => {
+        if (upload && upload.url) {
+          console.log(`Recovered an interrupted recording: ${upload.url}`);
+        }
+      });
+    }
+    
     // Find Unity instance
     this.findUnityInstance();
     
@@ -364,10 +375,29 @@ class UnityVideoRecorder {
         videoBitsPerSecond: 2500000
       });
       
+      // Upload chunks as they arrive, so a crashed tab keeps the recording and memory stays flat
+      if (this.settings.upload && window.ResumableUploader) {
+        const timestamp = new Date().toISOString().replace(/[:.]/g, '-');
+        this.uploader = new ResumableUploader({
+          filename: `${this.settings.filename}-${timestamp}.${this.settings.format}`,
+          contentType: mimeType
+        });
+        const uploader = this.uploader;
+        uploader.start().catch(error => {
+          console.warn('Recording upload unavailable, keeping the recording in memory:', error);
+          this.recordedChunks = uploader.pending.concat(this.recordedChunks);
+          this.uploader = null;
+        });
+      }
+      
       // Set up event handlers
       this.mediaRecorder.ondataavailable = (event) => {
         if (event.data.size > 0) {
-          this.recordedChunks.push(event.data);
+          if (this.uploader) {
+            this.uploader.append(event.data);
+          } else {
+            this.recordedChunks.push(event.data);
+          }
         }
       };
       
@@ -375,8 +405,10 @@ class UnityVideoRecorder {
         // Clean up
         this.stream.getTracks().forEach(track => track.stop());
         
-        // Download if enabled
-        if (this.settings.autoDownload) {
+        // Finish the upload, or download if enabled
+        if (this.uploader) {
+          this.finishUpload();
+        } else if (this.settings.autoDownload) {
           this.downloadRecording();
         }
         
@@ -464,6 +496,38 @@ class UnityVideoRecorder {
     }
   }
   
+  /**
+   * Complete the server upload and download the stored recording
+   */
+  finishUpload() {
+    const uploader = this.uploader;
+    this.uploader = null;
+    
+    uploader.finish()
+      .then(upload => {
+        if (!upload.url) {
+          throw new Error(upload.error || 'Upload was not completed');
+        }
+        console.log(`Recording uploaded (${upload.size} bytes): ${upload.url}`);
+        this.showNotification('Recording saved', 'success', 3000);
+        
+        if (this.settings.autoDownload) {
+          const a = document.createElement('a');
+          a.style.display = 'none';
+          a.href = upload.url;
+          a.download = upload.filename;
+          document.body.appendChild(a);
+          a.click();
+          setTimeout(() => document.body.removeChild(a), 100);
+        }
+      })
+      .catch(error => {
+        console.error('Error uploading recording:', error);
+        // What reached the server is kept; the next page load completes it (ResumableUploader.recoverAbandoned)
+        this.showNotification('Error uploading recording', 'error', 3000);
+      });
+  }
+  
   /**
    * Download the recorded video
    */
@@ -0,0 +1,150 @@
+import os
+import time
+import logging
+import mimetypes
+import threading
+from collections import namedtuple
+from flask import request, send_file
+from precompress import ENCODINGS, variants_for
+
+logger = logging.getLogger(__name__)
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+
+# Directories under static/ left out of the manifest: captured frames (screenshot_handler's
+# SCREENSHOT_DIR) are written all the time and would keep triggering full rebuilds; they
+# are served by the screenshot routes and Flask's /static view instead.
+EXCLUDED_DIRS = ('screenshots',)
+
+# How often (seconds) each process's watcher thread stats the static directories to pick up
+# added, removed or replaced files; 0 disables it (call refresh_manifest() on deploy instead).
+# Requests never touch the filesystem to find a file: a hit is one dict lookup.
+MANIFEST_CHECK_INTERVAL = float(os.environ.get('MANIFEST_CHECK_INTERVAL', '2.0'))
+
+StaticEntry = namedtuple('StaticEntry', ['path', 'size', 'mtime_ns', 'etag', 'mimetype', 'variants'])
+
+# URL path relative to static/ (always '/'-separated) -> StaticEntry
+_manifest = {}
+_dir_mtimes = {}
+_root = STATIC_DIR
+_refresh_lock = threading.Lock()
+_watcher_lock = threading.Lock()
+_watcher_pid = None
+
+
+def _make_entry(path, st):
+    mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    etag = f"{st.st_mtime_ns:x}-{st.st_size:x}"
+    return StaticEntry(path, st.st_size, st.st_mtime_ns, etag, mimetype, variants_for(path))
+
+
+def build_manifest(root=STATIC_DIR):
+    """Walk root once and replace the manifest with every file found under it"""
+    global _manifest, _dir_mtimes, _root
+
+    manifest = {}
+    dir_mtimes = {}
+    for dirpath, dirnames, filenames in os.walk(root):
+        if dirpath == root:
+            dirnames[:] = [name for name in dirnames if name not in EXCLUDED_DIRS]
+        dir_mtimes[dirpath] = os.stat(dirpath).st_mtime_ns
+        names = set(filenames)
+        for name in filenames:
+            stem, ext = os.path.splitext(name)
+            # Precompressed siblings are served through their source entry, not on their own
+            if (ext in ('.br', '.gz') and stem in names) or name.endswith('.tmp'):
+                continue
+            path = os.path.join(dirpath, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            key = os.path.relpath(path, root).replace(os.sep, '/')
+            manifest[key] = _make_entry(path, st)
+
+    # Swap in whole dicts so concurrent lookups never see a half-built manifest
+    _manifest = manifest
+    _dir_mtimes = dir_mtimes
+    _root = root
+    logger.info(f"Static manifest built: {len(manifest)} files under {root}")
+    return len(manifest)
+
+
+def refresh_manifest():
+    """Rebuild the manifest now (e.g. after deploying new static files)"""
+    with _refresh_lock:
+        return build_manifest(_root)
+
+
+def _changed():
+    """Whether any directory mtime differs from the last build (files are deployed by rename)"""
+    for dirpath, mtime_ns in _dir_mtimes.items():
+        try:
+            if os.stat(dirpath).st_mtime_ns != mtime_ns:
+                return True
+        except OSError:
+            return True
+    return False
+
+
+def watch_loop():
+    while True:
+        time.sleep(MANIFEST_CHECK_INTERVAL)
+        try:
+            with _refresh_lock:
+                if _changed():
+                    build_manifest(_root)
+        except Exception as e:
+            logger.error(f"Error refreshing the static manifest: {str(e)}")
+
+
+def start_watcher():
+    """Start this process's manifest watcher (once per process, so forked workers start their own)"""
+    global _watcher_pid
+    with _watcher_lock:
+        if _watcher_pid == os.getpid():
+            return
+        _watcher_pid = os.getpid()
+    if not MANIFEST_CHECK_INTERVAL:
+        return
+    threading.Thread(target=watch_loop, name='static-manifest', daemon=True).start()
+
+
+def lookup(key):
+    """Return the StaticEntry for a path relative to static/, or None"""
+    if _watcher_pid != os.getpid():
+        start_watcher()
+    return _manifest.get(key)
+
+
+def _send_entry(entry):
+    """Send one manifest entry, preferring a precompressed variant the client accepts"""
+    if entry.variants:
+        for encoding, _ in ENCODINGS:
+            if encoding in entry.variants and request.accept_encodings[encoding]:
+                # Range/If-Range handling comes from send_file; the ETag is per representation
+                response = send_file(entry.variants[encoding], mimetype=entry.mimetype,
+                                     conditional=True, etag=f"{entry.etag}-{encoding}")
+                response.headers['Content-Encoding'] = encoding
+                response.vary.add('Accept-Encoding')
+                return response
+
+    response = send_file(entry.path, mimetype=entry.mimetype, conditional=True, etag=entry.etag)
+    if entry.variants:
+        response.vary.add('Accept-Encoding')
+    return response
+
+
+def send_static(*keys):
+    """Serve the first of keys (paths relative to static/) present in the manifest, else 404"""
+    for key in keys:
+        entry = lookup(key)
+        if entry is None:
+            continue
+        try:
+            return _send_entry(entry)
+        except FileNotFoundError:
+            # Removed since the watcher last looked; the next rebuild drops the entry
+            continue
+
+    return "", 404
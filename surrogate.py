@@ -0,0 +1,171 @@
+import os
+import json
+import math
+import time
+import uuid
+import logging
+import threading
+import numpy as np
+import xgboost as xgb
+from param_store import DATA_DIR, DEFAULT_PARAMS
+from run_store import PARAM_COLUMNS, load_run_columns
+
+logger = logging.getLogger(__name__)
+
+# Gradient-boosted surrogate of the Unity simulation: simulator-form parameters in,
+# predicted run outcomes out. Training writes a new model directory and then swaps
+# a small pointer file; every worker notices the pointer change and reloads.
+MODEL_DIR = os.environ.get('SURROGATE_MODEL_DIR', os.path.join(DATA_DIR, 'models'))
+POINTER_PATH = os.path.join(MODEL_DIR, 'surrogate.json')
+CHECK_INTERVAL = float(os.environ.get('SURROGATE_CHECK_INTERVAL', 2.0))
+MIN_TRAINING_RUNS = int(os.environ.get('SURROGATE_MIN_RUNS', 20))
+MAX_PREDICTION_POINTS = int(os.environ.get('SURROGATE_MAX_POINTS', 100000))
+KEEP_MODELS = 3
+
+FEATURES = list(PARAM_COLUMNS)
+TARGETS = ["max_cluster_size", "final_cluster_count", "bond_formation_rate"]
+TRAINING_PARAMS = {
+    "objective": "reg:squarederror",
+    "max_depth": 6,
+    "eta": 0.1,
+    "subsample": 0.9,
+    "tree_method": "hist",
+    "nthread": int(os.environ.get('SURROGATE_THREADS', 2)),
+}
+BOOST_ROUNDS = int(os.environ.get('SURROGATE_ROUNDS', 200))
+
+_lock = threading.Lock()
+_loaded = {"version": None, "booster": None, "meta": None, "checked_at": 0.0}
+
+
+def train(rounds=BOOST_ROUNDS):
+    """Fit the surrogate on all finished runs and publish it as the current model"""
+    columns = load_run_columns(FEATURES + TARGETS)
+    features = np.column_stack([columns[name] for name in FEATURES])
+
+    # One multi-output booster: a prediction costs a single inplace_predict call for all targets
+    labels = np.column_stack([columns[name] for name in TARGETS])
+    known = ~np.isnan(labels).any(axis=1)
+    if known.sum() < MIN_TRAINING_RUNS:
+        raise ValueError(f"Need at least {MIN_TRAINING_RUNS} finished runs to train the surrogate, have {int(known.sum())}")
+
+    # Missing parameters stay NaN; XGBoost learns a default direction for them
+    matrix = xgb.DMatrix(features[known], label=labels[known], missing=np.nan, feature_names=FEATURES)
+    booster = xgb.train(TRAINING_PARAMS, matrix, num_boost_round=rounds)
+    # Sorts by training time (for pruning); the random suffix keeps same-second trainings apart
+    version = time.strftime("%Y%m%d%H%M%S") + f"-{uuid.uuid4().hex[:12]}"
+    directory = os.path.join(MODEL_DIR, version)
+    os.makedirs(directory, exist_ok=True)
+    booster.save_model(os.path.join(directory, 'model.ubj'))
+    residual = booster.inplace_predict(features[known]).reshape(-1, len(TARGETS)) - labels[known]
+    rmse = np.sqrt(np.mean(residual ** 2, axis=0))
+    meta = {"version": version, "features": FEATURES, "targets": TARGETS, "runs": int(known.sum()),
+            "trained_at": time.time(), "rmse": dict(zip(TARGETS, rmse.tolist()))}
+
+    with open(os.path.join(directory, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+    tmp = f"{POINTER_PATH}.{os.getpid()}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump({"version": version}, f)
+    os.replace(tmp, POINTER_PATH)
+    _prune_models(version)
+    logger.info(f"Trained surrogate {version} on {meta['runs']} runs, RMSE {meta['rmse']}")
+    return meta
+
+
+def _prune_models(current):
+    """Delete all but the newest few model directories (workers may still be reading the last one)"""
+    versions = sorted(name for name in os.listdir(MODEL_DIR) if os.path.isdir(os.path.join(MODEL_DIR, name)))
+    for name in versions[:-KEEP_MODELS]:
+        if name == current:
+            continue
+        directory = os.path.join(MODEL_DIR, name)
+        for filename in os.listdir(directory):
+            os.remove(os.path.join(directory, filename))
+        os.rmdir(directory)
+
+
+def current_model():
+    """Return (version, booster, meta), reloading when another process published a new model"""
+    now = time.monotonic()
+    if _loaded["version"] is not None and now - _loaded["checked_at"] < CHECK_INTERVAL:
+        return _loaded["version"], _loaded["booster"], _loaded["meta"]
+
+    with _lock:
+        _loaded["checked_at"] = now
+        try:
+            with open(POINTER_PATH) as f:
+                version = json.load(f)["version"]
+        except (OSError, ValueError, KeyError):
+            return None, None, None
+        if version != _loaded["version"]:
+            directory = os.path.join(MODEL_DIR, version)
+            with open(os.path.join(directory, 'meta.json')) as f:
+                meta = json.load(f)
+            booster = xgb.Booster()
+            booster.load_model(os.path.join(directory, 'model.ubj'))
+            booster.set_param({"nthread": 1})
+            # Swap in one assignment so concurrent predictions see either model, never a mix
+            _loaded.update(version=version, booster=booster, meta=meta)
+            logger.info(f"Loaded surrogate model {version}")
+        return _loaded["version"], _loaded["booster"], _loaded["meta"]
+
+
+def feature_matrix(points=None, grid=None, base=None):
+    """Build the float32 feature matrix from explicit points and/or a grid around base values"""
+    if not isinstance(base or {}, dict):
+        raise ValueError("base must be an object")
+    if not isinstance(points or [], list) or not all(isinstance(point, dict) for point in points or []):
+        raise ValueError("points must be a list of objects")
+    if not isinstance(grid or {}, dict):
+        raise ValueError("grid must be an object of parameter lists")
+    defaults = dict(DEFAULT_PARAMS, **(base or {}))
+    rows = []
+    for point in points or []:
+        values = dict(defaults, **point)
+        rows.append([values.get(name) for name in FEATURES])
+    matrix = np.array(rows, dtype=np.float32).reshape(len(rows), len(FEATURES)) if rows else None
+
+    if grid:
+        axes = []
+        for name in FEATURES:
+            values = grid.get(name, [defaults.get(name)])
+            if not isinstance(values, list):
+                raise ValueError(f"grid.{name} must be a list of values")
+            axes.append(np.asarray(values, dtype=np.float32).ravel())
+        # Python ints: a NumPy product wraps around and can slip under the limit
+        size = math.prod(len(axis) for axis in axes)
+        if size > MAX_PREDICTION_POINTS:
+            raise ValueError(f"Grid has {size} points (limit {MAX_PREDICTION_POINTS})")
+        mesh = np.stack(np.meshgrid(*axes, indexing='ij'), axis=-1).reshape(-1, len(FEATURES))
+        matrix = mesh if matrix is None else np.concatenate((matrix, mesh))
+
+    if matrix is None or len(matrix) == 0:
+        raise ValueError("No points to predict")
+    if len(matrix) > MAX_PREDICTION_POINTS:
+        raise ValueError(f"{len(matrix)} points requested (limit {MAX_PREDICTION_POINTS})")
+    return matrix
+
+
+def predict(points=None, grid=None, base=None):
+    """Predict every target for a batch of parameter points"""
+    version, booster, meta = current_model()
+    if version is None:
+        raise LookupError("No surrogate model has been trained yet")
+    try:
+        matrix = feature_matrix(points, grid, base)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid parameters: {e}")
+    outputs = booster.inplace_predict(matrix, missing=np.nan).reshape(len(matrix), len(meta["targets"]))
+    predictions = {target: outputs[:, i].tolist() for i, target in enumerate(meta["targets"])}
+    return {"version": version, "count": len(matrix), "predictions": predictions}
+
+
+def status():
+    version, _, meta = current_model()
+    return {"version": version, "features": FEATURES, "model": meta}
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    print(json.dumps(train(), indent=2))
@@ -0,0 +1,54 @@
+import time
+import hashlib
+import numpy as np
+
+# Sweep workers run in child processes: each takes one canonical parameter dict and
+# returns a MetricsDownloader-style payload for run_store.ingest_run. Keep this module
+# light, it is imported by every pool process.
+
+
+def local_worker(params, duration=60.0, delay=0.0):
+    """Stand-in for a Unity run: a fast, deterministic random bond process shaped by the parameters"""
+    seed = int.from_bytes(hashlib.sha256(repr(sorted(params.items())).encode()).digest()[:8], 'little')
+    rng = np.random.default_rng(seed)
+    if delay:
+        time.sleep(delay)
+
+    agents = max(2, int(sum(params.get(name, 0) for name in (
+        "sphereCount", "rectangleCount", "quartersphereCount", "halfsphereCount", "pyramidCount"))) or 20)
+    amplitude = float(np.linalg.norm([params.get("AmpX", 0), params.get("AmpY", 0), params.get("AmpZ", 0)]))
+    frequency = float(np.mean([params.get("freqX", 0), params.get("freqY", 0), params.get("freqZ", 0)]))
+
+    # Stronger bonds relative to the shaking make bonds form more and break less
+    stiffness = params.get("BF", 300) / (1.0 + params.get("SC", 800) / 1000.0)
+    agitation = amplitude * (1.0 + frequency)
+    form_rate = agents * (0.2 + agitation) * 0.5
+    break_rate = form_rate * agitation / (agitation + stiffness / 100.0 + 1e-9)
+
+    count = int(rng.poisson((form_rate + break_rate) * duration))
+    times = np.sort(rng.uniform(0, duration, count))
+    formed = rng.random(count) < form_rate / (form_rate + break_rate)
+    pairs = rng.integers(0, agents, size=(count, 2))
+
+    bonds_formed = int(formed.sum())
+    bonds_broken = count - bonds_formed
+    max_cluster = int(min(agents, 1 + bonds_formed * agents // max(1, count + agents)))
+    bond_events = [
+        {"time": round(float(t), 3), "event_type": "formed" if f else "broken", "agent1": int(a), "agent2": int(b)}
+        for t, f, (a, b) in zip(times, formed, pairs)
+    ]
+
+    return dict(params, **{
+        "metrics": {
+            "simulation_duration": duration,
+            "total_bonds": max(0, bonds_formed - bonds_broken),
+            "bonds_formed": bonds_formed,
+            "bonds_broken": bonds_broken,
+            "max_cluster_size": max_cluster,
+            "final_cluster_count": int(max(1, agents // max(1, max_cluster))),
+            "bond_formation_rate": bonds_formed / duration,
+            "bond_events": bond_events,
+            "cluster_sizes": [],
+        },
+        "device_info": {"worker": "local"},
+    })
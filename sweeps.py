@@ -0,0 +1,439 @@
+import os
+import json
+import math
+import time
+import uuid
+import sqlite3
+import logging
+import importlib
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+import cluster_timeline
+from param_store import DATA_DIR
+from run_store import PARAM_COLUMNS, SYNTHETIC_PREFIX, canonical_params, params_hash, ingest_run
+
+logger = logging.getLogger(__name__)
+
+# Parameter sweeps: a design (grid, random or Latin hypercube) is expanded into deduplicated
+# jobs stored in SQLite. Every process runs a runner thread, but only the one holding the
+# lease in the database dispatches: it owns the single process pool on the host, picks up
+# unfinished sweeps after a restart and never runs more than a sweep's concurrency cap at once.
+SWEEP_DB_PATH = os.environ.get('SWEEP_DB_PATH', os.path.join(DATA_DIR, 'sweeps.db'))
+POOL_SIZE = int(os.environ.get('SWEEP_POOL_SIZE', max(1, (os.cpu_count() or 2) - 1)))
+MAX_SWEEP_JOBS = int(os.environ.get('MAX_SWEEP_JOBS', 10000))
+POLL_INTERVAL = 0.5
+IDLE_INTERVAL = 1.0  # how often processes without the lease try to claim it
+RUNNER_LEASE_S = float(os.environ.get('SWEEP_RUNNER_LEASE_S', 15))
+
+# Worker name -> "module:function"; extra backends can be added with
+# SWEEP_WORKERS="unity=unity_bridge:run,..." or register_worker()
+WORKERS = {"local": "sweep_workers:local_worker"}
+for spec in filter(None, os.environ.get('SWEEP_WORKERS', '').split(',')):
+    name, _, target = spec.partition('=')
+    WORKERS[name.strip()] = target.strip()
+# Workers that only imitate a simulation; their runs are stored as synthetic (see run_store)
+STAND_IN_WORKERS = {"local"}
+
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_ready_pid = None
+_pool = None
+_pool_lock = threading.Lock()
+_runner_pid = None
+_runner_lock = threading.Lock()
+
+
+def _connect():
+    """Return this thread's connection to the sweep database"""
+    global _schema_ready_pid
+
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and _local.pid == os.getpid():
+        return conn
+
+    os.makedirs(os.path.dirname(SWEEP_DB_PATH), exist_ok=True)
+    conn = sqlite3.connect(SWEEP_DB_PATH, timeout=5.0, isolation_level=None, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+
+    with _schema_lock:
+        if _schema_ready_pid != os.getpid():
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sweeps ("
+                " sweep_id TEXT PRIMARY KEY,"
+                " created_at REAL NOT NULL,"
+                " finished_at REAL,"
+                " status TEXT NOT NULL,"
+                " worker TEXT NOT NULL,"
+                " max_concurrency INTEGER NOT NULL,"
+                " spec TEXT NOT NULL"
+                ")"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sweep_jobs ("
+                " sweep_id TEXT NOT NULL,"
+                " job_index INTEGER NOT NULL,"
+                " params_hash TEXT NOT NULL,"
+                " params TEXT NOT NULL,"
+                " status TEXT NOT NULL,"
+                " run_id TEXT,"
+                " error TEXT,"
+                " started_at REAL,"
+                " finished_at REAL,"
+                " PRIMARY KEY (sweep_id, job_index)"
+                ") WITHOUT ROWID"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS sweep_jobs_status ON sweep_jobs (sweep_id, status)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS runner ("
+                " name TEXT PRIMARY KEY,"
+                " owner TEXT NOT NULL,"
+                " expires_at REAL NOT NULL"
+                ")"
+            )
+            _schema_ready_pid = os.getpid()
+
+    _local.conn = conn
+    _local.pid = os.getpid()
+    return conn
+
+
+def register_worker(name, target, stand_in=False):
+    """Make a worker ("module:function") selectable by name in sweep requests"""
+    WORKERS[name] = target
+    if stand_in:
+        STAND_IN_WORKERS.add(name)
+    else:
+        STAND_IN_WORKERS.discard(name)
+
+
+def _run_source(worker):
+    return f"{SYNTHETIC_PREFIX}{worker}" if worker in STAND_IN_WORKERS else f"sweep:{worker}"
+
+
+def _resolve_worker(target):
+    module, _, function = target.partition(':')
+    return getattr(importlib.import_module(module), function)
+
+
+def _run_job(target, params):
+    """Entry point inside a pool process"""
+    return _resolve_worker(target)(params)
+
+
+def _get_pool(broken=None):
+    """The process pool shared by every sweep; only the lease holder creates one"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool is broken:
+            # A worker process died; the executor refuses new work, so start a fresh one
+            _pool.shutdown(wait=False)
+            _pool = None
+        if _pool is None:
+            # spawn: the parent has live threads and SQLite handles that must not be forked
+            _pool = ProcessPoolExecutor(POOL_SIZE, mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def _shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def _axis(name, spec):
+    """Values for one grid axis: an explicit list or {"min", "max", "steps"}"""
+    if isinstance(spec, list):
+        return spec
+    if isinstance(spec, dict):
+        steps = int(spec.get("steps", 5))
+        if not 1 <= steps <= MAX_SWEEP_JOBS:
+            raise ValueError(f"{name}: steps must be between 1 and {MAX_SWEEP_JOBS}")
+        return np.linspace(float(spec["min"]), float(spec["max"]), steps).tolist()
+    raise ValueError(f"{name}: expected a list of values or {{min, max, steps}}")
+
+
+def _bounds(name, spec):
+    if not isinstance(spec, dict) or "min" not in spec or "max" not in spec:
+        raise ValueError(f"{name}: expected {{min, max}}")
+    return float(spec["min"]), float(spec["max"])
+
+
+def expand_design(design, base=None):
+    """Expand a sweep design into canonical parameter dicts, dropping duplicate configurations"""
+    kind = design.get("type", "grid")
+    parameters = design.get("parameters") or {}
+    if not parameters:
+        raise ValueError("Design has no parameters")
+    for name in parameters:
+        if name not in PARAM_COLUMNS:
+            raise ValueError(f"Unknown parameter {name}")
+    names = list(parameters)
+
+    if kind == "grid":
+        axes = [_axis(name, parameters[name]) for name in names]
+        # Python ints: a NumPy product wraps around and can slip under the limit
+        size = math.prod(len(axis) for axis in axes)
+        if size > MAX_SWEEP_JOBS:
+            raise ValueError(f"Grid has {size} points (limit {MAX_SWEEP_JOBS})")
+        points = np.stack(np.meshgrid(*[np.asarray(axis, dtype=float) for axis in axes], indexing='ij'),
+                          axis=-1).reshape(-1, len(names))
+    elif kind in ("random", "lhs"):
+        samples = int(design.get("samples", 0))
+        if not 1 <= samples <= MAX_SWEEP_JOBS:
+            raise ValueError(f"samples must be between 1 and {MAX_SWEEP_JOBS}")
+        rng = np.random.default_rng(design.get("seed"))
+        low, high = np.array([_bounds(name, parameters[name]) for name in names]).T
+        if kind == "random":
+            unit = rng.random((samples, len(names)))
+        else:
+            # Latin hypercube: one sample per stratum in every dimension, strata shuffled independently
+            strata = np.argsort(rng.random((samples, len(names))), axis=0)
+            unit = (strata + rng.random((samples, len(names)))) / samples
+        points = low + unit * (high - low)
+    else:
+        raise ValueError(f"Unknown design type {kind}")
+
+    jobs, seen = [], set()
+    for row in points:
+        params = canonical_params(dict(base or {}, **dict(zip(names, row.tolist()))))
+        key = params_hash(params)
+        if key not in seen:
+            seen.add(key)
+            jobs.append((key, params))
+    return jobs, len(points) - len(jobs)
+
+
+def create_sweep(spec):
+    """Validate and store a sweep, start dispatching it, and return its summary"""
+    worker = spec.get("worker", "local")
+    if worker not in WORKERS:
+        raise ValueError(f"Unknown worker {worker}")
+    max_concurrency = int(spec.get("max_concurrency", POOL_SIZE))
+    if max_concurrency < 1:
+        raise ValueError("max_concurrency must be at least 1")
+    jobs, duplicates = expand_design(spec.get("design") or {}, spec.get("base"))
+
+    sweep_id = uuid.uuid4().hex
+    conn = _connect()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute(
+            "INSERT INTO sweeps (sweep_id, created_at, status, worker, max_concurrency, spec)"
+            " VALUES (?, ?, 'running', ?, ?, ?)",
+            (sweep_id, time.time(), worker, max_concurrency, json.dumps(spec))
+        )
+        conn.executemany(
+            "INSERT INTO sweep_jobs (sweep_id, job_index, params_hash, params, status) VALUES (?, ?, ?, ?, 'queued')",
+            [(sweep_id, i, key, json.dumps(params)) for i, (key, params) in enumerate(jobs)]
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+    start_runner()
+    return dict(get_sweep(sweep_id), duplicates=duplicates)
+
+
+def _finish_job(sweep_id, index, status, run_id=None, error=None):
+    _connect().execute(
+        "UPDATE sweep_jobs SET status = ?, run_id = ?, error = ?, finished_at = ? WHERE sweep_id = ? AND job_index = ?",
+        (status, run_id, error, time.time(), sweep_id, index)
+    )
+
+
+def _claim_runner(conn, owner):
+    """Take or renew the runner lease; True while this process holds it"""
+    now = time.time()
+    cursor = conn.execute(
+        "INSERT INTO runner (name, owner, expires_at) VALUES ('dispatch', ?, ?)"
+        " ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at"
+        " WHERE runner.owner = excluded.owner OR runner.expires_at < ?",
+        (owner, now + RUNNER_LEASE_S, now)
+    )
+    return cursor.rowcount > 0
+
+
+def _recover(conn):
+    """Requeue jobs left running by a previous runner; those of cancelled sweeps are cancelled"""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("UPDATE sweep_jobs SET status = 'queued', started_at = NULL WHERE status = 'running'")
+        conn.execute(
+            "UPDATE sweep_jobs SET status = 'cancelled', finished_at = ? WHERE status = 'queued'"
+            " AND sweep_id IN (SELECT sweep_id FROM sweeps WHERE status = 'cancelled')", (time.time(),)
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def _dispatch(conn, owner):
+    """Feed queued jobs of every unfinished sweep to the pool until none are left or the lease is lost"""
+    running = {}  # future -> (sweep_id, job_index, worker)
+    renewed = time.time()
+
+    while True:
+        if time.time() - renewed > RUNNER_LEASE_S / 3:
+            if not _claim_runner(conn, owner):
+                # Another process took over and has requeued our jobs; their results would be duplicates
+                logger.error("Sweep runner lease lost; abandoning running jobs")
+                _shutdown_pool()
+                return
+            renewed = time.time()
+
+        sweeps = conn.execute(
+            "SELECT sweep_id, status, worker, max_concurrency FROM sweeps WHERE finished_at IS NULL ORDER BY created_at"
+        ).fetchall()
+        in_flight = {}
+        for sweep_id, _, _ in running.values():
+            in_flight[sweep_id] = in_flight.get(sweep_id, 0) + 1
+
+        for sweep in sweeps:
+            sweep_id = sweep["sweep_id"]
+            if sweep["status"] == 'cancelled':
+                for future, (owner_id, index, _) in list(running.items()):
+                    if owner_id == sweep_id and future.cancel():
+                        running.pop(future)
+                        _finish_job(sweep_id, index, 'cancelled')
+                continue
+            free = min(sweep["max_concurrency"] - in_flight.get(sweep_id, 0), POOL_SIZE - len(running))
+            if free <= 0:
+                continue
+            target = WORKERS.get(sweep["worker"])
+            jobs = conn.execute(
+                "SELECT job_index, params FROM sweep_jobs WHERE sweep_id = ? AND status = 'queued'"
+                " ORDER BY job_index LIMIT ?", (sweep_id, free)
+            ).fetchall()
+            for job in jobs:
+                if target is None:
+                    _finish_job(sweep_id, job["job_index"], 'failed', error=f"Unknown worker {sweep['worker']}")
+                    continue
+                conn.execute("UPDATE sweep_jobs SET status = 'running', started_at = ? WHERE sweep_id = ? AND job_index = ?",
+                             (time.time(), sweep_id, job["job_index"]))
+                pool = _get_pool()
+                try:
+                    future = pool.submit(_run_job, target, json.loads(job["params"]))
+                except BrokenProcessPool:
+                    future = _get_pool(broken=pool).submit(_run_job, target, json.loads(job["params"]))
+                running[future] = (sweep_id, job["job_index"], sweep["worker"])
+
+        if not running:
+            # Nothing in flight: every unfinished sweep with no queued job left is done
+            for sweep in sweeps:
+                _finalize(conn, sweep["sweep_id"])
+            if not conn.execute("SELECT 1 FROM sweeps WHERE finished_at IS NULL LIMIT 1").fetchone():
+                return
+            time.sleep(POLL_INTERVAL)
+            continue
+
+        done, _ = wait(list(running), timeout=POLL_INTERVAL, return_when=FIRST_COMPLETED)
+        for future in done:
+            sweep_id, index, worker = running.pop(future)
+            try:
+                run_id = ingest_run(future.result(), session_id=sweep_id, source=_run_source(worker))
+                cluster_timeline.precompute(run_id)
+                _finish_job(sweep_id, index, 'done', run_id=run_id)
+            except Exception as e:
+                logger.error(f"Sweep {sweep_id} job {index} failed: {str(e)}")
+                _finish_job(sweep_id, index, 'failed', error=str(e))
+        busy = {sweep_id for sweep_id, _, _ in running.values()}
+        for sweep in sweeps:
+            if sweep["sweep_id"] not in busy:
+                _finalize(conn, sweep["sweep_id"])
+
+
+def _finalize(conn, sweep_id):
+    """Mark a sweep finished (or keep it cancelled) once none of its jobs are queued or running"""
+    cursor = conn.execute(
+        "UPDATE sweeps SET status = CASE WHEN status = 'cancelled' THEN status ELSE 'finished' END,"
+        " finished_at = ? WHERE sweep_id = ? AND finished_at IS NULL AND NOT EXISTS ("
+        "SELECT 1 FROM sweep_jobs WHERE sweep_id = ? AND status IN ('queued', 'running'))",
+        (time.time(), sweep_id, sweep_id)
+    )
+    if cursor.rowcount:
+        logger.info(f"Sweep {sweep_id} done")
+
+
+def runner_loop(owner):
+    conn = _connect()
+    held = False
+    while True:
+        try:
+            if _claim_runner(conn, owner):
+                if not held:
+                    _recover(conn)
+                    held = True
+                _dispatch(conn, owner)
+            elif held:
+                held = False
+                _shutdown_pool()
+        except Exception as e:
+            # In-flight results are lost with the dispatcher's state; requeue them on the next claim
+            logger.error(f"Error dispatching sweeps: {str(e)}")
+            held = False
+            _shutdown_pool()
+        time.sleep(IDLE_INTERVAL)
+
+
+def start_runner():
+    """Start this process's runner thread (once per process, so forked workers start their own)"""
+    global _runner_pid
+    with _runner_lock:
+        if _runner_pid == os.getpid():
+            return
+        _runner_pid = os.getpid()
+    owner = f"{os.getpid()}-{uuid.uuid4().hex}"
+    threading.Thread(target=runner_loop, args=(owner,), name='sweep-runner', daemon=True).start()
+
+
+def cancel_sweep(sweep_id):
+    """Stop a sweep: queued jobs are dropped, jobs already running are allowed to finish"""
+    conn = _connect()
+    cursor = conn.execute("UPDATE sweeps SET status = 'cancelled' WHERE sweep_id = ? AND status = 'running'", (sweep_id,))
+    if cursor.rowcount:
+        conn.execute("UPDATE sweep_jobs SET status = 'cancelled', finished_at = ? WHERE sweep_id = ? AND status = 'queued'",
+                     (time.time(), sweep_id))
+    return get_sweep(sweep_id)
+
+
+def get_sweep(sweep_id, include_jobs=False):
+    """Sweep status with per-state job counts (and optionally the jobs themselves), or None"""
+    start_runner()
+    conn = _connect()
+    row = conn.execute("SELECT * FROM sweeps WHERE sweep_id = ?", (sweep_id,)).fetchone()
+    if row is None:
+        return None
+    sweep = dict(row)
+    sweep["spec"] = json.loads(sweep["spec"])
+    counts = dict(conn.execute(
+        "SELECT status, COUNT(*) FROM sweep_jobs WHERE sweep_id = ? GROUP BY status", (sweep_id,)
+    ).fetchall())
+    sweep["jobs_by_status"] = counts
+    sweep["total"] = sum(counts.values())
+    sweep["completed"] = counts.get("done", 0) + counts.get("failed", 0) + counts.get("cancelled", 0)
+    sweep["progress"] = sweep["completed"] / sweep["total"] if sweep["total"] else 1.0
+    if include_jobs:
+        sweep["jobs"] = [
+            dict(job, params=json.loads(job["params"])) for job in conn.execute(
+                "SELECT job_index, params, status, run_id, error, started_at, finished_at"
+                " FROM sweep_jobs WHERE sweep_id = ? ORDER BY job_index", (sweep_id,))
+        ]
+    return sweep
+
+
+def list_sweeps(limit=50):
+    start_runner()
+    rows = _connect().execute(
+        "SELECT sweep_id, created_at, finished_at, status, worker, max_concurrency FROM sweeps"
+        " ORDER BY created_at DESC LIMIT ?", (limit,)
+    )
+    return [dict(row) for row in rows]
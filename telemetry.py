@@ -0,0 +1,196 @@
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+from run_store import SERIES_DTYPES, run_dir, get_run
+
+# Live run telemetry: each watched run keeps fixed-size NumPy ring buffers of its recent
+# samples, refilled by tailing the run's packed series files as chunks are committed (from
+# any worker). Viewers get a downsampled copy, computed once per (version, method, points).
+TELEMETRY_CAPACITY = int(os.environ.get('TELEMETRY_CAPACITY', 50000))  # samples kept per series
+TELEMETRY_MAX_RUNS = int(os.environ.get('TELEMETRY_MAX_RUNS', 64))
+MAX_POINTS = 5000
+DOWNSAMPLERS = ('lttb', 'minmax')
+SERIES = ('bonds', 'max_cluster_size', 'cluster_count')
+
+_runs = OrderedDict()
+_runs_lock = threading.Lock()
+
+
+class RingBuffer:
+    """Fixed-capacity (time, value) samples; the oldest are overwritten once full"""
+
+    def __init__(self, capacity=TELEMETRY_CAPACITY):
+        self.times = np.zeros(capacity, dtype=np.float64)
+        self.values = np.zeros(capacity, dtype=np.float64)
+        self.start = 0
+        self.count = 0
+
+    def extend(self, times, values):
+        capacity = len(self.times)
+        if len(times) >= capacity:
+            times, values = times[-capacity:], values[-capacity:]
+            self.start, self.count = 0, 0
+        end = (self.start + self.count) % capacity
+        first = min(len(times), capacity - end)
+        self.times[end:end + first], self.values[end:end + first] = times[:first], values[:first]
+        rest = len(times) - first
+        self.times[:rest], self.values[:rest] = times[first:], values[first:]
+        overflow = max(0, self.count + len(times) - capacity)
+        self.start = (self.start + overflow) % capacity
+        self.count = min(capacity, self.count + len(times))
+
+    def view(self):
+        """Samples in time order (a copy once the buffer has wrapped)"""
+        end = self.start + self.count
+        if end <= len(self.times):
+            return self.times[self.start:end], self.values[self.start:end]
+        order = np.r_[self.start:len(self.times), 0:end - len(self.times)]
+        return self.times[order], self.values[order]
+
+
+def lttb(x, y, points):
+    """Largest-Triangle-Three-Buckets: keep the points that best preserve the curve's shape"""
+    n = len(x)
+    if points >= n or points < 3:
+        return x, y
+    # Interior buckets split points 1..n-2; the first and last points are always kept
+    edges = np.linspace(1, n - 1, points - 1).astype(np.intp)
+    csum_x, csum_y = np.r_[0, np.cumsum(x)], np.r_[0, np.cumsum(y)]
+    sizes = np.maximum(np.diff(edges), 1)
+    mean_x = (csum_x[edges[1:]] - csum_x[edges[:-1]]) / sizes
+    mean_y = (csum_y[edges[1:]] - csum_y[edges[:-1]]) / sizes
+    mean_x, mean_y = np.r_[mean_x, x[-1]], np.r_[mean_y, y[-1]]
+
+    selected = np.empty(points, dtype=np.intp)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(points - 2):
+        lo, hi = edges[i], max(edges[i + 1], edges[i] + 1)
+        # Twice the triangle area between the last kept point, each candidate and the next bucket's mean
+        area = np.abs((x[a] - mean_x[i + 1]) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (mean_y[i + 1] - y[a]))
+        a = lo + int(area.argmax())
+        selected[i + 1] = a
+    return x[selected], y[selected]
+
+
+def minmax(x, y, points):
+    """Keep each bucket's minimum and maximum, so spikes survive any zoom level"""
+    n = len(x)
+    buckets = points // 2
+    if points >= n or buckets < 1:
+        return x, y
+    size = -(-n // buckets)
+    padded = np.full(buckets * size, np.nan)
+    padded[:n] = y
+    blocks = padded.reshape(buckets, size)
+    offsets = np.arange(buckets) * size
+    valid = offsets < n
+    keep = np.unique(np.r_[offsets[valid] + np.nanargmin(blocks[valid], axis=1),
+                           offsets[valid] + np.nanargmax(blocks[valid], axis=1)])
+    return x[keep], y[keep]
+
+
+class RunTelemetry:
+    """Ring buffers of one run plus the offsets of the series records already consumed"""
+
+    def __init__(self, run_id):
+        self.run_id = run_id
+        self.buffers = {name: RingBuffer() for name in SERIES}
+        self.offsets = {"bond_events": 0, "cluster_sizes": 0}
+        self.bonds = 0
+        self.version = 0
+        self.lock = threading.Lock()
+        self._snapshots = {}
+
+    def _read(self, name, committed):
+        """Committed records of a series beyond what has been consumed (never an uncommitted tail)"""
+        dtype = SERIES_DTYPES[name]
+        offset = self.offsets[name]
+        if committed <= offset:
+            return np.zeros(0, dtype=dtype)
+        with open(os.path.join(run_dir(self.run_id), f"{name}.bin"), 'rb') as f:
+            f.seek(offset * dtype.itemsize)
+            data = f.read((committed - offset) * dtype.itemsize)
+        records = np.frombuffer(data, dtype=dtype, count=len(data) // dtype.itemsize)
+        self.offsets[name] = offset + len(records)
+        return records
+
+    def refresh(self):
+        """Pull newly committed chunks into the buffers; returns True when anything changed"""
+        run = get_run(self.run_id)
+        if run is None:
+            return False
+        with self.lock:
+            events = self._read("bond_events", run["bond_event_count"])
+            samples = self._read("cluster_sizes", run["cluster_sample_count"])
+            if len(events):
+                live = self.bonds + np.cumsum(np.where(events['formed'], 1, -1))
+                self.bonds = int(live[-1])
+                self.buffers["bonds"].extend(events['time'].astype(np.float64), live)
+            if len(samples):
+                times = samples['time'].astype(np.float64)
+                self.buffers["max_cluster_size"].extend(times, samples['max_size'])
+                self.buffers["cluster_count"].extend(times, samples['cluster_count'])
+            if len(events) or len(samples):
+                self.version += 1
+                self._snapshots.clear()
+                return True
+        return False
+
+    def snapshot(self, points=500, method='lttb'):
+        """Downsampled series, shared by every viewer asking for the same resolution"""
+        key = (points, method)
+        with self.lock:
+            cached = self._snapshots.get(key)
+            if cached is not None:
+                return cached
+            downsample = lttb if method == 'lttb' else minmax
+            series = {}
+            for name, buffer in self.buffers.items():
+                times, values = downsample(*buffer.view(), points)
+                series[name] = {"t": times.tolist(), "v": values.tolist(), "samples": buffer.count}
+            result = {"run_id": self.run_id, "version": self.version, "method": method, "points": points,
+                      "bonds": self.bonds, "series": series}
+            self._snapshots[key] = result
+            return result
+
+
+def normalize_view(points=None, method=None):
+    """Validate a requested (points, method) resolution"""
+    try:
+        points = int(points or 500)
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError("points must be an integer")
+    method = method or 'lttb'
+    if not 3 <= points <= MAX_POINTS:
+        raise ValueError(f"points must be between 3 and {MAX_POINTS}")
+    if not isinstance(method, str) or method not in DOWNSAMPLERS:
+        raise ValueError(f"method must be one of {', '.join(DOWNSAMPLERS)}")
+    return points, method
+
+
+def get_run_telemetry(run_id):
+    """The telemetry state of a run, created on first use; None for unknown runs"""
+    with _runs_lock:
+        telemetry = _runs.get(run_id)
+        if telemetry is not None:
+            _runs.move_to_end(run_id)
+            return telemetry
+    if not run_id.isalnum() or get_run(run_id) is None:
+        return None
+    with _runs_lock:
+        telemetry = _runs.setdefault(run_id, RunTelemetry(run_id))
+        while len(_runs) > TELEMETRY_MAX_RUNS:
+            _runs.popitem(last=False)
+    return telemetry
+
+
+def snapshot(run_id, points=None, method=None):
+    """Refresh a run and return its downsampled series, or None for unknown runs"""
+    points, method = normalize_view(points, method)
+    telemetry = get_run_telemetry(run_id)
+    if telemetry is None:
+        return None
+    telemetry.refresh()
+    return telemetry.snapshot(points, method)
@@ -0,0 +1,8 @@
+import os
+import sys
+import tempfile
+
+# Stores read their paths at import time, so point them at a scratch directory first
+os.environ.setdefault('DATA_DIR', tempfile.mkdtemp(prefix='sim-tests-'))
+os.environ.setdefault('SCREENSHOT_DIR', os.path.join(os.environ['DATA_DIR'], 'screenshots'))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+from run_store import SERIES_DTYPES
+from cluster_timeline import ClusterTracker
+
+
+def random_events(seed, count=3000, agents=80):
+    """Bond events where breaks only hit live bonds, so window netting matches event order"""
+    rng = np.random.default_rng(seed)
+    ids = rng.choice(10 ** 6, agents, replace=False)
+    live = {}
+    events = np.zeros(count, dtype=SERIES_DTYPES["bond_events"])
+    events['time'] = np.sort(rng.uniform(0, 60, count)).astype(np.float32)
+    for i in range(count):
+        if live and rng.random() < 0.45:
+            pair = list(live)[rng.integers(len(live))]
+            live[pair] -= 1
+            if not live[pair]:
+                del live[pair]
+            formed = False
+        else:
+            a, b = rng.choice(ids, 2, replace=False)
+            pair = (min(a, b), max(a, b))
+            live[pair] = live.get(pair, 0) + 1
+            formed = True
+        first, second = pair if rng.random() < 0.5 else pair[::-1]
+        events[i] = (events['time'][i], formed, first, second)
+    return events
+
+
+def replay(events, resolution):
+    """Component sizes recomputed from scratch after each window's events"""
+    live, seen, samples = {}, set(), []
+    windows = np.floor(events['time'].astype(np.float64) / resolution).astype(np.int64)
+    for i, event in enumerate(events):
+        a, b = int(event['agent1']), int(event['agent2'])
+        seen.update((a, b))
+        pair = (min(a, b), max(a, b))
+        live[pair] = live.get(pair, 0) + (1 if event['formed'] else -1)
+        if i + 1 < len(events) and windows[i + 1] == windows[i]:
+            continue
+        neighbours = {agent: set() for agent in seen}
+        for (x, y), n in live.items():
+            if n > 0:
+                neighbours[x].add(y)
+                neighbours[y].add(x)
+        sizes, visited = [], set()
+        for agent in seen:
+            if agent in visited:
+                continue
+            stack, size = [agent], 0
+            visited.add(agent)
+            while stack:
+                size += 1
+                for other in neighbours[stack.pop()] - visited:
+                    visited.add(other)
+                    stack.append(other)
+            sizes.append(size)
+        census = {}
+        for size in sizes:
+            if size > 1:
+                census[size] = census.get(size, 0) + 1
+        samples.append(((windows[i] + 1) * resolution, census))
+    return samples
+
+
+@pytest.mark.parametrize('seed,resolution', [(0, 1.0), (1, 0.25), (2, 5.0)])
+def test_tracker_matches_replay(seed, resolution):
+    events = random_events(seed)
+    tracker = ClusterTracker(resolution)
+    # Arbitrary chunking, including cuts inside a window
+    for chunk in np.array_split(events, [1, 17, 500, 501, 1800]):
+        tracker.feed(chunk)
+    timeline, histograms = tracker.samples()
+
+    expected = replay(events, resolution)
+    assert len(timeline) == len(expected)
+    for sample, (record, (time, census)) in enumerate(zip(timeline, expected)):
+        assert record['time'] == pytest.approx(time)
+        assert record['cluster_count'] == sum(census.values())
+        assert record['max_size'] == (max(census) if census else 1)
+        rows = histograms[histograms['sample'] == sample]
+        assert dict(zip(rows['size'].tolist(), rows['count'].tolist())) == census
+
+
+def test_saved_tracker_resumes(tmp_path):
+    events = random_events(3)
+    whole = ClusterTracker()
+    whole.feed(events)
+
+    tracker = ClusterTracker()
+    tracker.feed(events[:1200])
+    tracker.save(str(tmp_path))
+    tracker = ClusterTracker.load(str(tmp_path))
+    tracker.feed(events[1200:])
+    for got, want in zip(tracker.samples(), whole.samples()):
+        np.testing.assert_array_equal(got, want)
@@ -0,0 +1,44 @@
+import io
+import pytest
+from PIL import Image
+import frame_ingest
+from app import create_app
+
+HEADERS = {'X-Forwarded-Proto': 'https', 'X-Session-ID': 'frametests'}
+
+
+@pytest.fixture(scope='module')
+def client():
+    return create_app(socketio=False).test_client()
+
+
+def png(size):
+    buffer = io.BytesIO()
+    Image.new('RGBA', size, (255, 0, 0, 255)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def upload(client, *frames):
+    data = {'frame': [(io.BytesIO(frame), f'{i}.png', 'image/png') for i, frame in enumerate(frames)]}
+    return client.post('/upload-frames', data=data, headers=HEADERS, content_type='multipart/form-data')
+
+
+def test_multipart_frames(client):
+    response = upload(client, png((8, 8)), png((16, 4)))
+    assert response.status_code == 200
+    assert response.get_json()["accepted"] == 2
+
+
+def test_oversized_multipart_part(client, monkeypatch):
+    monkeypatch.setattr(frame_ingest, 'MAX_FRAME_BYTES', 1000)
+    assert upload(client, png((8, 8)), b'x' * 1001).status_code == 413
+
+
+def test_oversized_multipart_body(client, monkeypatch):
+    monkeypatch.setattr(frame_ingest, 'MAX_MULTIPART_BYTES', 1000)
+    assert upload(client, png((8, 8)), b'x' * 2000).status_code == 413
+
+
+def test_canvas_dimension_is_checked_before_decoding():
+    with pytest.raises(ValueError):
+        frame_ingest.decode_frame('png', png((frame_ingest.MAX_FRAME_DIMENSION + 1, 1)))
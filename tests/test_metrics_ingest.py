@@ -0,0 +1,35 @@
+import gzip
+import json
+import pytest
+from flask import Flask, request
+import metrics_ingest
+from metrics_ingest import ChunkTooLargeError, read_body
+
+app = Flask(__name__)
+
+
+def body(data, **headers):
+    return app.test_request_context(method='POST', data=data, headers=headers)
+
+
+def test_identity_and_gzip_bodies():
+    data = b"\n".join(json.dumps({"time": i, "max_size": 1, "cluster_count": 1}).encode() for i in range(1000))
+    with body(data):
+        assert read_body(request) == data
+    with body(gzip.compress(data), **{'Content-Encoding': 'gzip'}):
+        assert read_body(request) == data
+
+
+def test_size_limits(monkeypatch):
+    monkeypatch.setattr(metrics_ingest, 'MAX_CHUNK_BYTES', 1000)
+    with body(b'x' * 1001):
+        with pytest.raises(ChunkTooLargeError):
+            read_body(request)
+    # Small on the wire, too large once inflated
+    with body(gzip.compress(b'x' * 5000), **{'Content-Encoding': 'gzip'}):
+        with pytest.raises(ChunkTooLargeError):
+            read_body(request)
+    # Without a declared length there is nothing to check up front
+    with body(b'x' * 10, **{'Transfer-Encoding': 'chunked'}):
+        with pytest.raises(ValueError):
+            read_body(request)
@@ -0,0 +1,69 @@
+import time
+import pytest
+import param_store
+from app import create_app
+
+HEADERS = {'X-Forwarded-Proto': 'https'}
+
+
+@pytest.fixture(scope='module')
+def client():
+    return create_app(socketio=False).test_client()
+
+
+def get_data(client, session_id, etag=None):
+    headers = dict(HEADERS, **{param_store.SESSION_HEADER: session_id})
+    if etag:
+        headers['If-None-Match'] = etag
+    return client.get('/get-data', headers=headers)
+
+
+def test_unchanged_params_answer_304(client):
+    session_id = param_store.new_session_id()
+    first = get_data(client, session_id)
+    assert first.status_code == 200
+    assert first.get_json() == param_store.DEFAULT_PARAMS
+    assert first.headers['Cache-Control'] == 'no-cache'
+
+    again = get_data(client, session_id, first.headers['ETag'])
+    assert again.status_code == 304
+    assert again.headers['ETag'] == first.headers['ETag']
+    assert again.data == b''
+
+
+def test_new_params_change_the_etag(client):
+    session_id = param_store.new_session_id()
+    etag = get_data(client, session_id).headers['ETag']
+    params = dict(param_store.DEFAULT_PARAMS, SC=900)
+    response = client.post('/set-data', json=params,
+                           headers=dict(HEADERS, **{param_store.SESSION_HEADER: session_id}))
+    assert response.get_json()["version"] == 1
+
+    changed = get_data(client, session_id, etag)
+    assert changed.status_code == 200
+    assert changed.get_json() == params
+    assert changed.headers['ETag'] != etag
+    assert get_data(client, session_id, changed.headers['ETag']).status_code == 304
+
+
+def test_prune_sessions():
+    stale, fresh = param_store.new_session_id(), param_store.new_session_id()
+    param_store.set_params(stale, {"SC": 1})
+    param_store._connect().execute("UPDATE params SET updated_at = ? WHERE session_id = ?",
+                                   (time.time() - 3600, stale))
+    param_store.set_params(fresh, {"SC": 2})
+    assert param_store.prune_sessions(max_age=60) >= 1
+    assert param_store.get_params(stale) == param_store.DEFAULT_PARAMS
+    assert param_store.get_params(fresh) == {"SC": 2}
+
+
+def test_etag_survives_a_pruned_session(client):
+    session_id = param_store.new_session_id()
+    param_store.set_params(session_id, {"SC": 1})
+    etag = get_data(client, session_id).headers['ETag']
+    param_store._connect().execute("DELETE FROM params WHERE session_id = ?", (session_id,))
+    # The recreated session restarts at version 1 with different parameters
+    assert param_store.set_params(session_id, {"SC": 2}) == 1
+    response = get_data(client, session_id, etag)
+    assert response.status_code == 200
+    assert response.get_json() == {"SC": 2}
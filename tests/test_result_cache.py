@@ -0,0 +1,75 @@
+import os
+import threading
+import pytest
+import result_cache
+from param_store import DEFAULT_PARAMS
+
+
+@pytest.fixture
+def frames(tmp_path):
+    paths = []
+    for i in range(3):
+        path = tmp_path / f"frame_{i}.png"
+        path.write_bytes(bytes([i]) * 100)
+        paths.append(str(path))
+    return paths
+
+
+def params(**changes):
+    return dict(DEFAULT_PARAMS, **changes)
+
+
+def test_replacing_a_set_never_leaves_it_missing(frames):
+    key = result_cache.store_screenshots(params(SC=801), frames)
+    first = result_cache.screenshot_paths(key)
+    assert [os.path.basename(path) for path in first] == ["frame_0.png", "frame_1.png", "frame_2.png"]
+
+    seen, done = [], threading.Event()
+
+    def read():
+        while not done.is_set():
+            seen.append(len(result_cache.screenshot_paths(key)))
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    for _ in range(20):
+        result_cache.store_screenshots(params(SC=801), frames[:2])
+    done.set()
+    reader.join()
+    assert seen and set(seen) <= {2, 3}
+    # Earlier versions are removed once replaced
+    assert not os.path.exists(os.path.dirname(first[0]))
+    assert len([name for name in os.listdir(result_cache.RESULT_DIR) if name.startswith(key)]) == 1
+
+
+def test_concurrent_stores_keep_one_set(frames):
+    threads = [threading.Thread(target=result_cache.store_screenshots, args=(params(SC=802), frames))
+               for _ in range(8)]
+    [thread.start() for thread in threads]
+    [thread.join() for thread in threads]
+    key = result_cache.params_hash(params(SC=802))
+    assert len(result_cache.screenshot_paths(key)) == 3
+    assert len([name for name in os.listdir(result_cache.RESULT_DIR) if name.startswith(key)]) == 1
+
+
+def test_usage_is_flushed_in_batches(frames):
+    key = result_cache.store_screenshots(params(SC=803), frames)
+    before = result_cache.stats()
+    for _ in range(5):
+        assert result_cache.lookup_hash(key) is not None
+    assert result_cache.lookup_hash("0" * 64) is None
+    assert result_cache._usage["hits"] >= 5
+    after = result_cache.stats()
+    assert after["hits"] - before["hits"] == 5
+    assert after["misses"] - before["misses"] == 1
+
+
+def test_expire_removes_unused_entries(frames):
+    key = result_cache.store_screenshots(params(SC=804), frames)
+    directory = os.path.dirname(result_cache.screenshot_paths(key)[0])
+    assert result_cache.expire(max_age=3600) == 0
+    result_cache._connect().execute("UPDATE results SET last_used = 0 WHERE params_hash = ?", (key,))
+    assert result_cache.expire(max_age=3600) >= 1
+    assert not os.path.exists(directory)
+    assert result_cache.screenshot_paths(key) == []
+    assert result_cache.lookup_hash(key) is None
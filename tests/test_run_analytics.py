@@ -0,0 +1,25 @@
+import pytest
+import run_analytics
+
+
+@pytest.mark.parametrize("query", [
+    {"stats": [50]},
+    {"stats": "mean"},
+    {"group_by": "num_agents"},
+    {"bins": [1, 2]},
+    {"filters": ["num_agents"]},
+])
+def test_malformed_query_is_rejected(query):
+    with pytest.raises(ValueError):
+        run_analytics.normalize_query(query)
+
+
+def test_result_from_newer_runs_is_not_cached_under_older_key(monkeypatch):
+    generations = iter(["1-1.0", "2-2.0", "2-2.0"])
+    monkeypatch.setattr(run_analytics, "runs_generation", lambda: next(generations))
+    monkeypatch.setattr(run_analytics, "run_query", lambda query, generation: {"generation": generation})
+    run_analytics._cache.clear()
+
+    key, result = run_analytics.cached_query({})
+    assert result == {"generation": "1-1.0"}
+    assert key not in run_analytics._cache
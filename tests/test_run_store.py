@@ -0,0 +1,106 @@
+import json
+import pytest
+import run_store
+from param_store import DEFAULT_PARAMS
+
+
+def bond(time, a, b, event_type='formed'):
+    return {"time": time, "event_type": event_type, "agent1": a, "agent2": b}
+
+
+@pytest.fixture
+def run_id():
+    return run_store.create_run(DEFAULT_PARAMS)
+
+
+def test_chunks_append_in_sequence(run_id):
+    assert run_store.append_chunk(run_id, 0, [bond(0.5, 1, 2)], [{"time": 1, "max_size": 2, "cluster_count": 1}]) == {
+        "duplicate": False, "next_seq": 1, "bond_events": 1, "cluster_sizes": 1}
+    run_store.append_chunk(run_id, 1, [bond(1.5, 2, 3), bond(1.7, 1, 2, 'broken')])
+    events = run_store.load_series(run_id, "bond_events")
+    assert events['agent1'].tolist() == [1, 2, 1]
+    assert events['formed'].tolist() == [1, 1, 0]
+    assert len(run_store.load_series(run_id, "cluster_sizes")) == 1
+
+
+def test_retried_chunk_is_ignored(run_id):
+    run_store.append_chunk(run_id, 0, [bond(0.5, 1, 2)])
+    run_store.append_chunk(run_id, 1, [bond(1.5, 2, 3)])
+    assert run_store.append_chunk(run_id, 0, [bond(0.5, 1, 2)]) == {"duplicate": True, "next_seq": 2}
+    assert len(run_store.load_series(run_id, "bond_events")) == 2
+    assert run_store.get_run(run_id)["bond_event_count"] == 2
+
+
+def test_chunk_ahead_of_sequence_is_rejected(run_id):
+    run_store.append_chunk(run_id, 0, [bond(0.5, 1, 2)])
+    with pytest.raises(run_store.SequenceError) as error:
+        run_store.append_chunk(run_id, 2, [bond(2.5, 3, 4)])
+    assert error.value.expected == 1
+    assert len(run_store.load_series(run_id, "bond_events")) == 1
+    # The gap can still be filled in order
+    run_store.append_chunk(run_id, 1, [bond(1.5, 2, 3)])
+    assert run_store.append_chunk(run_id, 2, [bond(2.5, 3, 4)])["next_seq"] == 3
+
+
+def test_unknown_run():
+    with pytest.raises(KeyError):
+        run_store.append_chunk("0" * 32, 0, [bond(0.5, 1, 2)])
+
+
+def exported_agents(run_id):
+    export = json.loads("".join(run_store.iter_run_export(run_id)))
+    return [(event["agent1"], event["agent2"]) for event in export["metrics"]["bond_events"]]
+
+
+def test_numeric_ids_are_stored_as_is(run_id):
+    assert run_store._agent_codes(run_id, [7, -3, 2 ** 31 - 1]).tolist() == [7, -3, 2 ** 31 - 1]
+    assert run_store._agent_encoding(run_id) == ('ids', [])
+    # Names cannot join a run that already stores raw IDs
+    with pytest.raises(ValueError):
+        run_store._agent_codes(run_id, [1, "drone-a"])
+    assert run_store._agent_encoding(run_id) == ('ids', [])
+
+
+def test_mixed_ids_fix_the_run_on_names(run_id):
+    run_store.append_chunk(run_id, 0, [bond(0.5, 4, "drone-a"), bond(0.7, 2 ** 40, 4)])
+    encoding, names = run_store._agent_encoding(run_id)
+    assert encoding == 'names'
+    # Codes follow first appearance, first endpoints before second ones
+    assert names == ["4", str(2 ** 40), "drone-a"]
+    # Later numeric IDs are codes into the same name table, not raw IDs
+    run_store.append_chunk(run_id, 1, [bond(1.5, 4, 9)])
+    assert run_store.load_series(run_id, "bond_events")['agent1'].tolist() == [0, 1, 0]
+    assert exported_agents(run_id) == [("4", "drone-a"), (str(2 ** 40), "4"), ("4", "9")]
+
+
+def test_binary_chunks_need_numeric_ids(run_id):
+    run_store.append_chunk(run_id, 0, [bond(0.5, "drone-a", "drone-b")])
+    records = run_store.pack_bond_events(run_store.create_run(DEFAULT_PARAMS), [bond(1.5, 1, 2)])
+    with pytest.raises(ValueError):
+        run_store.append_chunk(run_id, 1, records)
+    assert run_store.get_run(run_id)["next_seq"] == 1
+
+
+def test_fractional_ids_are_names(run_id):
+    run_store.append_chunk(run_id, 0, [bond(0.5, 1, 1.5)])
+    assert run_store._agent_encoding(run_id) == ('names', ["1", "1.5"])
+    assert exported_agents(run_id) == [("1", "1.5")]
+
+
+def test_export_writes_non_finite_values_as_null(run_id):
+    run_store.append_chunk(run_id, 0, [bond(float('nan'), 1, 2)],
+                           [{"time": float('inf'), "max_size": 2, "cluster_count": 1}])
+    run_store.update_run_metrics(run_id, {"simulation_duration": float('inf')})
+    export = json.loads("".join(run_store.iter_run_export(run_id)), parse_constant=pytest.fail)
+    assert export["metrics"]["simulation_duration"] is None
+    assert export["metrics"]["bond_events"][0]["time"] is None
+    assert export["metrics"]["cluster_sizes"][0]["time"] is None
+
+
+@pytest.mark.parametrize('metrics', [[1], {"bond_events": [1]}, {"bond_events": {"a": 1}},
+                                     {"cluster_sizes": ["x"]}, {"bond_events": [bond("soon", 1, 2)]}])
+def test_malformed_runs_are_rejected(metrics):
+    before = len(run_store.list_runs(limit=1000))
+    with pytest.raises(ValueError):
+        run_store.ingest_run(dict(DEFAULT_PARAMS, metrics=metrics))
+    assert len(run_store.list_runs(limit=1000)) == before
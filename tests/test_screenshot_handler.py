@@ -0,0 +1,23 @@
+import pytest
+import param_store
+import screenshot_handler
+from app import create_app
+
+HEADERS = {'X-Forwarded-Proto': 'https'}
+
+
+@pytest.fixture(scope='module')
+def client():
+    return create_app(socketio=False).test_client()
+
+
+@pytest.mark.parametrize("body", [{"interval": "fast"}, {"quality": None}, {"compress_level": [1]},
+                                  {"interval": 5, "dedup_threshold": "inf"}, ["interval", 5]])
+def test_malformed_capture_options_are_rejected(client, body):
+    session_id = param_store.new_session_id()
+    response = client.post('/start-capture', json=body,
+                           headers=dict(HEADERS, **{param_store.SESSION_HEADER: session_id}))
+    assert response.status_code == 400
+    session = screenshot_handler.get_session(session_id)
+    assert not session.active
+    assert session.options["interval"] == screenshot_handler.DEFAULT_OPTIONS["interval"]
@@ -0,0 +1,63 @@
+import os
+import time
+import threading
+import pytest
+from flask import Flask
+import static_manifest
+
+
+@pytest.fixture
+def root(tmp_path, monkeypatch):
+    (tmp_path / 'js').mkdir()
+    (tmp_path / 'js' / 'app.js').write_text('console.log(1)')
+    (tmp_path / 'screenshots').mkdir()
+    (tmp_path / 'screenshots' / 'frame.png').write_bytes(b'png')
+    monkeypatch.setattr(static_manifest, 'MANIFEST_CHECK_INTERVAL', 0.05)
+    static_manifest.build_manifest(str(tmp_path))
+    yield tmp_path
+    static_manifest.build_manifest(static_manifest.STATIC_DIR)
+
+
+def wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_hits_do_not_touch_the_filesystem(root):
+    static_manifest.start_watcher()
+    caller = threading.get_ident()
+    calls = []
+    stat = os.stat
+
+    def counting_stat(*args, **kwargs):
+        if threading.get_ident() == caller:
+            calls.append(args)
+        return stat(*args, **kwargs)
+
+    os.stat = counting_stat
+    try:
+        assert static_manifest.lookup('js/app.js') is not None
+        assert static_manifest.lookup('screenshots/frame.png') is None
+    finally:
+        os.stat = stat
+    assert calls == []
+
+
+def test_watcher_picks_up_changes(root):
+    static_manifest.start_watcher()
+    (root / 'js' / 'new.js').write_text('console.log(2)')
+    assert wait_for(lambda: static_manifest.lookup('js/new.js') is not None)
+    os.remove(root / 'js' / 'app.js')
+    assert wait_for(lambda: static_manifest.lookup('js/app.js') is None)
+
+
+def test_file_removed_before_the_rebuild_is_a_404(root, monkeypatch):
+    monkeypatch.setattr(static_manifest, 'MANIFEST_CHECK_INTERVAL', 3600)
+    time.sleep(0.1)  # let the watcher settle into the long sleep
+    os.remove(root / 'js' / 'app.js')
+    with Flask(__name__).test_request_context():
+        assert static_manifest.send_static('js/app.js') == ("", 404)
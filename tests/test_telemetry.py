@@ -0,0 +1,14 @@
+import pytest
+import telemetry
+
+
+@pytest.mark.parametrize("points, method", [([500], None), ({"n": 500}, None), ("many", None),
+                                            (float("inf"), None), (500, ["lttb"]), (2, None)])
+def test_malformed_view_is_rejected(points, method):
+    with pytest.raises(ValueError):
+        telemetry.normalize_view(points, method)
+
+
+def test_view_defaults():
+    assert telemetry.normalize_view() == (500, 'lttb')
+    assert telemetry.normalize_view("40", None) == (40, 'lttb')
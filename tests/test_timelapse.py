@@ -0,0 +1,22 @@
+from PIL import Image
+import timelapse
+
+
+def test_default_format_streams_before_encoding(tmp_path, monkeypatch):
+    monkeypatch.setattr(timelapse, "TIMELAPSE_DIR", str(tmp_path / "timelapses"))
+    paths = []
+    for i in range(3):
+        paths.append(str(tmp_path / f"frame_{i}.png"))
+        Image.new('RGB', (64, 48), (i * 80, 0, 0)).save(paths[-1])
+
+    settings = timelapse.parse_settings({})
+    assert settings["format"] == 'gif'
+    encoded = []
+    monkeypatch.setattr(timelapse, "encode_frame", lambda *args, encode=timelapse.encode_frame:
+                        encoded.append(args[0]) or encode(*args))
+    _, path, mimetype, chunks = timelapse.build_timelapse("tests", paths, settings)
+    assert mimetype == 'image/gif'
+    assert next(chunks).startswith(b'GIF89a') and not encoded
+    data = b''.join(chunks)
+    assert data.endswith(b';') and len(encoded) == 3
+    assert Image.open(path).n_frames == 3
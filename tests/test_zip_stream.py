@@ -0,0 +1,69 @@
+import io
+import zipfile
+import pytest
+from flask import Flask
+import zip_stream
+
+
+@pytest.fixture
+def plan(tmp_path):
+    contents = {'a.png': b'\x89PNG' + bytes(range(256)) * 40, 'b.jpg': b'', 'c.webp': b'RIFF' * 5000}
+    paths = []
+    for name, data in contents.items():
+        path = tmp_path / name
+        path.write_bytes(data)
+        paths.append(str(path))
+    # A second file with a clashing name gets a unique one in the archive
+    (tmp_path / 'dup').mkdir()
+    (tmp_path / 'dup' / 'a.png').write_bytes(b'second')
+    paths.append(str(tmp_path / 'dup' / 'a.png'))
+    contents['a_1.png'] = b'second'
+    zip_stream._crc_cache.clear()
+    return zip_stream.build_zip_plan(paths), contents
+
+
+def read_back(data):
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        assert archive.testzip() is None
+        return {info.filename: archive.read(info) for info in archive.infolist()}
+
+
+def test_archive_reads_back(plan):
+    plan, contents = plan
+    data = b''.join(zip_stream.iter_zip(plan))
+    assert len(data) == plan.total_size
+    assert read_back(data) == contents
+
+
+def test_ranges_concatenate_to_the_archive(plan):
+    plan, _ = plan
+    whole = b''.join(zip_stream.iter_zip(plan))
+    # Cut points inside headers, file data, descriptors and the central directory
+    cuts = sorted({0, 7, 31, 1000, 10000, plan.central_offset - 3, plan.central_offset + 5, plan.total_size})
+    zip_stream._crc_cache.clear()
+    parts = [b''.join(zip_stream.iter_zip(plan, lo, hi)) for lo, hi in zip(cuts[:-1], cuts[1:])]
+    assert b''.join(parts) == whole
+
+
+def test_range_responses(plan):
+    plan, contents = plan
+    app = Flask(__name__)
+    whole = b''.join(zip_stream.iter_zip(plan))
+
+    with app.test_request_context(headers={'Range': 'bytes=100-199'}):
+        response = zip_stream.zip_response(plan, 'shots "1".zip')
+        assert response.status_code == 206
+        assert response.headers['Content-Range'] == f'bytes 100-199/{plan.total_size}'
+        assert b''.join(response.response) == whole[100:200]
+        assert response.headers['Content-Disposition'] == 'attachment; filename="shots \\"1\\".zip"'
+
+    with app.test_request_context(headers={'Range': 'bytes=0-9,20-29'}):
+        response = zip_stream.zip_response(plan, 'shots.zip')
+        assert response.status_code == 200
+        assert read_back(b''.join(response.response)) == contents
+
+    with app.test_request_context(headers={'Range': 'bytes=100-', 'If-Range': '"stale"'}):
+        assert zip_stream.zip_response(plan, 'shots.zip').status_code == 200
+
+    with app.test_request_context(headers={'Range': f'bytes={plan.total_size}-'}):
+        assert zip_stream.zip_response(plan, 'shots.zip').status_code == 416
@@ -0,0 +1,206 @@
+import io
+import os
+import time
+import hashlib
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from PIL import Image
+from param_store import DATA_DIR
+from screenshot_handler import SCREENSHOT_DIR
+
+logger = logging.getLogger(__name__)
+
+# Downscaled previews and contact sheets of captured frames, so a gallery loads tens of KB
+# per frame instead of full-size PNGs. Each derivative is rendered once by a thread pool
+# (concurrent requests for the same one wait on the same job), stored in THUMBNAIL_DIR
+# under a hash of its source and settings, and evicted least recently used first.
+THUMBNAIL_DIR = os.environ.get('THUMBNAIL_DIR', os.path.join(DATA_DIR, 'thumbnails'))
+THUMBNAIL_THREADS = int(os.environ.get('THUMBNAIL_THREADS', min(4, os.cpu_count() or 1)))
+THUMBNAIL_CACHE_MAX_BYTES = int(os.environ.get('THUMBNAIL_CACHE_MAX_BYTES', 512 * 1024 ** 2))
+EVICT_EVERY = 64  # derivatives written between eviction passes
+MAX_SHEET_TILES = 400
+
+FORMATS = {"webp": ("image/webp", "WEBP"), "jpeg": ("image/jpeg", "JPEG")}
+
+_executor = None
+_executor_lock = threading.Lock()
+_jobs = {}  # derivative key -> Future, while it renders
+_jobs_lock = threading.Lock()
+_writes = 0
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=THUMBNAIL_THREADS, thread_name_prefix='thumbnail')
+        return _executor
+
+
+def frame_path(session_id, name):
+    """Path of one of a session's frames; ValueError for anything that is not a frame name"""
+    if os.path.basename(name) != name or not name.startswith('screenshot_'):
+        raise ValueError(f"Invalid frame name {name!r}")
+    path = os.path.join(SCREENSHOT_DIR, session_id, name)
+    if not os.path.isfile(path):
+        raise KeyError(name)
+    return path
+
+
+def parse_options(args, default_width=320):
+    """Validate derivative query arguments (width, format, quality)"""
+    fmt = args.get('format', 'webp').lower()
+    if fmt not in FORMATS:
+        raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+    try:
+        width, quality = int(args.get('width', default_width)), int(args.get('quality', 75))
+    except (TypeError, ValueError):
+        raise ValueError("width and quality must be numbers")
+    if not 16 <= width <= 1024:
+        raise ValueError("width must be between 16 and 1024")
+    if not 1 <= quality <= 100:
+        raise ValueError("quality must be between 1 and 100")
+    return {"width": width, "format": fmt, "quality": quality}
+
+
+def _source_signature(path):
+    stat = os.stat(path)
+    return f"{path}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def _key(*parts):
+    return hashlib.sha256("\n".join(map(str, parts)).encode()).hexdigest()[:32]
+
+
+def _cache_path(key, options):
+    return os.path.join(THUMBNAIL_DIR, key[:2], f"{key}.{options['format']}")
+
+
+def _save(img, path, options):
+    """Encode to a temp file and publish it atomically"""
+    out = io.BytesIO()
+    img.save(out, format=FORMATS[options["format"]][1], quality=options["quality"])
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(out.getvalue())
+    os.replace(tmp, path)
+
+
+def _render_thumbnail(source, path, options):
+    with Image.open(source) as img:
+        # thumbnail() decodes JPEG sources at reduced scale (draft) before resampling
+        img.thumbnail((options["width"], options["width"] * 4), reducing_gap=2.0)
+        frame = img.convert('RGB')
+    _save(frame, path, options)
+    return path
+
+
+def _render_sheet(tiles, path, options, columns):
+    """Paste rendered thumbnails into a grid"""
+    images = []
+    for tile in tiles:
+        with Image.open(tile) as img:
+            images.append(img.convert('RGB'))
+    cell_width = max(img.width for img in images)
+    cell_height = max(img.height for img in images)
+    rows = -(-len(images) // columns)
+    sheet = Image.new('RGB', (cell_width * columns, cell_height * rows), (0, 0, 0))
+    for index, img in enumerate(images):
+        sheet.paste(img, ((index % columns) * cell_width, (index // columns) * cell_height))
+    _save(sheet, path, options)
+    return path
+
+
+def _run(key, render, *args):
+    global _writes
+
+    try:
+        return render(*args)
+    finally:
+        with _jobs_lock:
+            _jobs.pop(key, None)
+            _writes += 1
+            due = _writes % EVICT_EVERY == 1
+        if due:
+            evict()
+
+
+def _submit(key, path, render, *args):
+    """Future of a derivative's path: already done when cached, shared while it renders"""
+    try:
+        # Last use is tracked in atime, so mtime (and Last-Modified) stay put
+        os.utime(path, (time.time(), os.stat(path).st_mtime))
+        done = Future()
+        done.set_result(path)
+        return done
+    except FileNotFoundError:
+        pass
+    with _jobs_lock:
+        job = _jobs.get(key)
+        if job is None:
+            job = _jobs[key] = _get_executor().submit(_run, key, render, *args)
+    return job
+
+
+def _thumbnail_job(session_id, name, options):
+    source = frame_path(session_id, name)
+    key = _key("thumbnail", _source_signature(source), options["width"], options["format"], options["quality"])
+    path = _cache_path(key, options)
+    return key, _submit(key, path, _render_thumbnail, source, path, options)
+
+
+def thumbnail(session_id, name, options):
+    """(ETag key, path) of a frame's preview at options' width and format"""
+    key, job = _thumbnail_job(session_id, name, options)
+    return key, job.result()
+
+
+def contact_sheet(session_id, paths, options, columns=8):
+    """(ETag key, path) of a grid of the given frames' thumbnails"""
+    if not paths:
+        raise ValueError("No frames to put on a contact sheet")
+    if len(paths) > MAX_SHEET_TILES:
+        raise ValueError(f"Contact sheets hold at most {MAX_SHEET_TILES} frames")
+    if not 1 <= columns <= 32:
+        raise ValueError("columns must be between 1 and 32")
+    key = _key("sheet", columns, options["width"], options["format"], options["quality"],
+               *(_source_signature(path) for path in paths))
+    sheet_path = _cache_path(key, options)
+    tiles = None
+    if not os.path.exists(sheet_path):
+        # Tiles go through the thumbnail cache (rendered in parallel), so a sheet over an
+        # already browsed gallery decodes no full-size frames
+        tile_options = dict(options, format='webp', quality=90)
+        jobs = [_thumbnail_job(session_id, os.path.basename(path), tile_options)[1] for path in paths]
+        tiles = [job.result() for job in jobs]
+    return key, _submit(key, sheet_path, _render_sheet, tiles, sheet_path, options, columns).result()
+
+
+def evict(max_bytes=None):
+    """Remove the least recently used derivatives until the cache fits in max_bytes"""
+    max_bytes = THUMBNAIL_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    entries = []
+    for root, _, names in os.walk(THUMBNAIL_DIR):
+        for name in names:
+            if not name.endswith('.tmp'):
+                try:
+                    stat = os.stat(os.path.join(root, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_atime, stat.st_size, os.path.join(root, name)))
+    total = sum(size for _, size, _ in entries)
+    evicted = 0
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        evicted += 1
+    if evicted:
+        logger.info(f"Evicted {evicted} thumbnails")
+    return evicted
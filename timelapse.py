@@ -0,0 +1,284 @@
+import io
+import os
+import json
+import time
+import struct
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from param_store import DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+# Timelapses of a capture session's stored frames. Frames are decoded, resized and encoded
+# by a shared thread pool (Pillow releases the GIL while it works) and assembled in order:
+# GIF (the default) and MJPEG are streamed frame by frame as they come out of the pool, so
+# the first bytes go out with the first frame however long the capture. Animated WebP is
+# opt-in: its RIFF header carries the total length, so it is spooled to disk before anything
+# is sent. Every output is written to TIMELAPSE_DIR as it streams, so the same session and
+# settings are served from disk afterwards.
+TIMELAPSE_DIR = os.environ.get('TIMELAPSE_DIR', os.path.join(DATA_DIR, 'timelapses'))
+TIMELAPSE_THREADS = int(os.environ.get('TIMELAPSE_THREADS', min(4, os.cpu_count() or 1)))
+TIMELAPSE_MAX_FRAMES = int(os.environ.get('TIMELAPSE_MAX_FRAMES', 3000))
+TIMELAPSE_CACHE_MAX_BYTES = int(os.environ.get('TIMELAPSE_CACHE_MAX_BYTES', 1024 ** 3))
+READ_BLOCK = 256 * 1024
+
+FORMATS = {
+    "gif": ("image/gif", "gif"),
+    "webp": ("image/webp", "webp"),
+    "mjpeg": ("multipart/x-mixed-replace; boundary=frame", "mjpeg"),
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=TIMELAPSE_THREADS, thread_name_prefix='timelapse')
+        return _executor
+
+
+def parse_settings(args):
+    """Validate timelapse query arguments (format, fps, width, quality, step, loop)"""
+    fmt = args.get('format', 'gif').lower()
+    if fmt not in FORMATS:
+        raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+    try:
+        settings = {"format": fmt, "fps": float(args.get('fps', 10)), "width": int(args.get('width', 640)),
+                    "quality": int(args.get('quality', 80)), "step": int(args.get('step', 1)),
+                    "loop": int(args.get('loop', 0))}
+    except (TypeError, ValueError):
+        raise ValueError("fps, width, quality, step and loop must be numbers")
+    if not 0.1 <= settings["fps"] <= 60:
+        raise ValueError("fps must be between 0.1 and 60")
+    if not 16 <= settings["width"] <= 3840:
+        raise ValueError("width must be between 16 and 3840")
+    if not 1 <= settings["quality"] <= 100:
+        raise ValueError("quality must be between 1 and 100")
+    if not 1 <= settings["step"] <= 1000:
+        raise ValueError("step must be between 1 and 1000")
+    if not 0 <= settings["loop"] <= 65535:
+        raise ValueError("loop must be between 0 (forever) and 65535")
+    return settings
+
+
+def _canvas_size(path, width):
+    """Output size: the first frame scaled down to width (never up), even for the WebP/JPEG encoders"""
+    with Image.open(path) as img:
+        src_width, src_height = img.size
+    width = min(width, src_width)
+    height = max(2, round(src_height * width / src_width))
+    return width - width % 2, height - height % 2
+
+
+def _split_gif(data):
+    """Return (color table, interlace flag, LZW image data) of a single-frame GIF"""
+    packed = data[10]
+    offset = 13
+    table = b''
+    if packed & 0x80:
+        table = data[offset:offset + 3 * (2 << (packed & 7))]
+        offset += len(table)
+    while data[offset:offset + 1] == b'!':
+        offset += 2
+        while data[offset]:
+            offset += data[offset] + 1
+        offset += 1
+    if data[offset:offset + 1] != b',':
+        raise ValueError("Unexpected GIF block")
+    descriptor_flags = data[offset + 9]
+    start = offset + 10
+    if descriptor_flags & 0x80:
+        table = data[start:start + 3 * (2 << (descriptor_flags & 7))]
+        start += len(table)
+    end = len(data) - 1 if data.endswith(b';') else len(data)
+    return table, descriptor_flags & 0x40, data[start:end]
+
+
+def _riff_chunks(data, offset=12):
+    """Yield (fourcc, chunk bytes including header and padding) from a RIFF payload"""
+    while offset + 8 <= len(data):
+        fourcc, size = data[offset:offset + 4], struct.unpack_from('<I', data, offset + 4)[0]
+        end = offset + 8 + size + (size & 1)
+        yield fourcc, data[offset:end]
+        offset = end
+
+
+def encode_frame(path, size, settings):
+    """Decode, resize and encode one frame into the piece the assembler splices in"""
+    with Image.open(path) as img:
+        frame = img.convert('RGB')
+    if frame.size != size:
+        frame = frame.resize(size, Image.BILINEAR, reducing_gap=2.0)
+
+    out = io.BytesIO()
+    fmt = settings["format"]
+    if fmt == 'mjpeg':
+        frame.save(out, format='JPEG', quality=settings["quality"])
+        return out.getvalue()
+    if fmt == 'gif':
+        # Every frame gets its own 256-color palette, written as a local color table
+        frame.quantize(colors=256, method=Image.Quantize.FASTOCTREE).save(out, format='GIF', interlace=False)
+        return _split_gif(out.getvalue())
+    lossless = settings["quality"] == 100
+    frame.save(out, format='WEBP', quality=settings["quality"], lossless=lossless, method=4)
+    return b''.join(chunk for fourcc, chunk in _riff_chunks(out.getvalue()) if fourcc in (b'VP8 ', b'VP8L'))
+
+
+def _encoded_frames(paths, size, settings):
+    """Encode frames on the pool, a bounded window ahead, and yield them in order"""
+    executor = _get_executor()
+    window = TIMELAPSE_THREADS * 2
+    pending = []
+    try:
+        for path in paths:
+            pending.append(executor.submit(encode_frame, path, size, settings))
+            if len(pending) >= window:
+                yield pending.pop(0).result()
+        while pending:
+            yield pending.pop(0).result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def _gif_stream(paths, size, settings):
+    width, height = size
+    delay = max(2, round(100 / settings["fps"]))  # centiseconds; browsers clamp anything below 2
+    yield b'GIF89a' + struct.pack('<HHBBB', width, height, 0, 0, 0)
+    yield b'!\xff\x0bNETSCAPE2.0\x03\x01' + struct.pack('<H', settings["loop"]) + b'\x00'
+    for table, interlace, data in _encoded_frames(paths, size, settings):
+        flags = 0x80 | interlace | (len(table) // 3).bit_length() - 2
+        yield (b'!\xf9\x04\x00' + struct.pack('<H', delay) + b'\x00\x00'
+               + b',' + struct.pack('<HHHHB', 0, 0, width, height, flags) + table + data)
+    yield b';'
+
+
+def _mjpeg_stream(paths, size, settings):
+    for jpeg in _encoded_frames(paths, size, settings):
+        yield b'--frame\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\n\r\n' % len(jpeg) + jpeg + b'\r\n'
+    yield b'--frame--\r\n'
+
+
+def _write_webp(f, paths, size, settings):
+    """Write an animated WebP, patching the RIFF length once every frame is in"""
+    width, height = size
+    duration = round(1000 / settings["fps"])
+    f.write(b'RIFF\x00\x00\x00\x00WEBP')
+    f.write(b'VP8X' + struct.pack('<I', 10) + b'\x02\x00\x00\x00'
+            + (width - 1).to_bytes(3, 'little') + (height - 1).to_bytes(3, 'little'))
+    f.write(b'ANIM' + struct.pack('<I', 6) + b'\xff\xff\xff\xff' + struct.pack('<H', settings["loop"]))
+    for data in _encoded_frames(paths, size, settings):
+        # No blending, no disposal: each frame covers the whole canvas
+        header = (b'\x00' * 6 + (width - 1).to_bytes(3, 'little') + (height - 1).to_bytes(3, 'little')
+                  + duration.to_bytes(3, 'little') + b'\x02')
+        f.write(b'ANMF' + struct.pack('<I', len(header) + len(data)) + header + data)
+    riff_size = f.tell() - 8
+    f.seek(4)
+    f.write(struct.pack('<I', riff_size))
+
+
+def cache_key(session_id, paths, settings):
+    """Hash of the settings and the frames (names, sizes, mtimes) a timelapse is built from"""
+    digest = hashlib.sha256(json.dumps([session_id, settings], sort_keys=True).encode())
+    for path in paths:
+        stat = os.stat(path)
+        digest.update(f"{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()[:32]
+
+
+def cache_path(session_id, key, settings):
+    return os.path.join(TIMELAPSE_DIR, f"{session_id}-{key}.{FORMATS[settings['format']][1]}")
+
+
+def _read_file(path):
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(READ_BLOCK)
+            if not block:
+                return
+            yield block
+
+
+def _stream_and_cache(chunks, path):
+    """Yield chunks while writing them to a temp file, published to path once complete"""
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    completed = False
+    try:
+        with open(tmp, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+                yield chunk
+        os.replace(tmp, path)
+        completed = True
+        evict()
+    finally:
+        if not completed and os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def _webp_then_stream(paths, size, settings, path):
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp, 'wb') as f:
+            _write_webp(f, paths, size, settings)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    evict()
+    yield from _read_file(path)
+
+
+def build_timelapse(session_id, paths, settings):
+    """Plan a session's timelapse: (key, path, mimetype, chunks); chunks is None on a cache hit"""
+    paths = paths[::settings["step"]]
+    if len(paths) > TIMELAPSE_MAX_FRAMES:
+        raise ValueError(f"{len(paths)} frames exceed the limit of {TIMELAPSE_MAX_FRAMES}; use a larger step")
+    mimetype = FORMATS[settings["format"]][0]
+    key = cache_key(session_id, paths, settings)
+    path = cache_path(session_id, key, settings)
+    try:
+        # Eviction goes by last use (atime), leaving mtime, and with it Last-Modified, alone
+        os.utime(path, (time.time(), os.stat(path).st_mtime))
+        return key, path, mimetype, None
+    except FileNotFoundError:
+        pass
+
+    os.makedirs(TIMELAPSE_DIR, exist_ok=True)
+    size = _canvas_size(paths[0], settings["width"])
+    logger.info(f"Encoding {settings['format']} timelapse of {len(paths)} frames at {size[0]}x{size[1]}"
+                f" for session {session_id}")
+    if settings["format"] == 'webp':
+        return key, path, mimetype, _webp_then_stream(paths, size, settings, path)
+    stream = _gif_stream if settings["format"] == 'gif' else _mjpeg_stream
+    return key, path, mimetype, _stream_and_cache(stream(paths, size, settings), path)
+
+
+def evict(max_bytes=None):
+    """Remove the least recently used timelapses until the cache fits in max_bytes"""
+    max_bytes = TIMELAPSE_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    try:
+        entries = [entry for entry in os.scandir(TIMELAPSE_DIR) if entry.is_file() and not entry.name.endswith('.tmp')]
+    except FileNotFoundError:
+        return 0
+    stats = sorted((entry.stat().st_atime, entry.stat().st_size, entry.path) for entry in entries)
+    total = sum(size for _, size, _ in stats)
+    evicted = 0
+    for _, size, path in stats:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        evicted += 1
+    if evicted:
+        logger.info(f"Evicted {evicted} timelapses")
+    return evicted
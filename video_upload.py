@@ -0,0 +1,233 @@
+import os
+import time
+import uuid
+import fcntl
+import sqlite3
+import logging
+import threading
+from param_store import DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+# Resumable uploads of MediaRecorder video. Each upload is a part file that chunks are
+# appended to straight from the request stream; its size on disk is the upload offset, so
+# whatever reached the disk before a dropped connection is kept, in any worker. Completing
+# an upload moves the part file into VIDEO_DIR.
+UPLOAD_DB_PATH = os.environ.get('UPLOAD_DB_PATH', os.path.join(DATA_DIR, 'uploads.db'))
+UPLOAD_DIR = os.environ.get('UPLOAD_DIR', os.path.join(DATA_DIR, 'uploads'))
+VIDEO_DIR = os.environ.get('VIDEO_DIR', os.path.join(DATA_DIR, 'videos'))
+MAX_UPLOAD_BYTES = int(os.environ.get('MAX_UPLOAD_BYTES', 8 * 1024 ** 3))
+UPLOAD_EXPIRY_S = float(os.environ.get('UPLOAD_EXPIRY_S', 7 * 24 * 3600))  # unfinished uploads are dropped after
+READ_BLOCK = 64 * 1024
+
+EXTENSIONS = {"video/webm": "webm", "video/mp4": "mp4", "video/x-matroska": "mkv"}
+
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_ready_pid = None
+
+
+class OffsetError(ValueError):
+    """A chunk starts beyond the bytes the server has stored"""
+
+    def __init__(self, expected, received):
+        super().__init__(f"Expected a chunk at offset {expected}, got {received}")
+        self.expected = expected
+
+
+class UploadBusyError(ValueError):
+    """Another request is still writing to the upload"""
+
+
+def _connect():
+    """Return this thread's connection to the upload database"""
+    global _schema_ready_pid
+
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and _local.pid == os.getpid():
+        return conn
+
+    os.makedirs(os.path.dirname(UPLOAD_DB_PATH), exist_ok=True)
+    conn = sqlite3.connect(UPLOAD_DB_PATH, timeout=5.0, isolation_level=None, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+
+    with _schema_lock:
+        if _schema_ready_pid != os.getpid():
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS uploads ("
+                " upload_id TEXT PRIMARY KEY,"
+                " session_id TEXT,"
+                " filename TEXT NOT NULL,"
+                " content_type TEXT NOT NULL,"
+                " total_size INTEGER,"
+                " size INTEGER NOT NULL DEFAULT 0,"
+                " status TEXT NOT NULL DEFAULT 'uploading',"
+                " created_at REAL NOT NULL,"
+                " updated_at REAL NOT NULL"
+                ")"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS uploads_session ON uploads (session_id, created_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS uploads_status ON uploads (status, updated_at)")
+            _schema_ready_pid = os.getpid()
+
+    _local.conn = conn
+    _local.pid = os.getpid()
+    return conn
+
+
+def _part_path(upload_id):
+    return os.path.join(UPLOAD_DIR, f"{upload_id}.part")
+
+
+def video_path(upload):
+    return os.path.join(VIDEO_DIR, f"{upload['upload_id']}.{EXTENSIONS.get(upload['content_type'], 'bin')}")
+
+
+def _describe(row):
+    upload = dict(row)
+    if upload["status"] == 'uploading':
+        # The part file is the source of truth; the row may lag behind a dropped connection
+        try:
+            upload["size"] = os.path.getsize(_part_path(upload["upload_id"]))
+        except FileNotFoundError:
+            pass
+    upload["offset"] = upload["size"]
+    upload["url"] = f"/uploads/{upload['upload_id']}/file" if upload["status"] == 'complete' else None
+    return upload
+
+
+def create_upload(filename, content_type, total_size=None, session_id=None):
+    """Register a new upload and create its empty part file"""
+    content_type = (content_type or 'video/webm').split(';')[0].strip().lower()
+    if content_type not in EXTENSIONS:
+        raise ValueError(f"Unsupported content type {content_type}")
+    if total_size is not None and not 0 <= int(total_size) <= MAX_UPLOAD_BYTES:
+        raise ValueError(f"Uploads are limited to {MAX_UPLOAD_BYTES} bytes")
+    expire_uploads()
+
+    upload_id = uuid.uuid4().hex
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    open(_part_path(upload_id), 'xb').close()
+    now = time.time()
+    _connect().execute(
+        "INSERT INTO uploads (upload_id, session_id, filename, content_type, total_size, created_at, updated_at)"
+        " VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (upload_id, session_id, os.path.basename(str(filename or 'recording'))[:200], content_type,
+         None if total_size is None else int(total_size), now, now)
+    )
+    return get_upload(upload_id)
+
+
+def get_upload(upload_id):
+    """Return an upload's state (offset = bytes stored), or None"""
+    row = _connect().execute("SELECT * FROM uploads WHERE upload_id = ?", (upload_id,)).fetchone()
+    return _describe(row) if row is not None else None
+
+
+def list_uploads(session_id, status=None):
+    """A session's uploads, newest first (a reloaded tab finds its unfinished recording here)"""
+    query = "SELECT * FROM uploads WHERE session_id IS ?"
+    args = [session_id]
+    if status:
+        query += " AND status = ?"
+        args.append(status)
+    return [_describe(row) for row in _connect().execute(query + " ORDER BY created_at DESC LIMIT 100", args)]
+
+
+def append_chunk(upload_id, offset, stream, length=None):
+    """Append the request stream to an upload at offset; returns the new upload state"""
+    upload = get_upload(upload_id)
+    if upload is None:
+        raise KeyError(upload_id)
+    if upload["status"] != 'uploading':
+        raise ValueError(f"Upload is {upload['status']}")
+
+    try:
+        f = open(_part_path(upload_id), 'r+b')
+    except FileNotFoundError:
+        raise ValueError("Upload is no longer accepting data")
+    with f:
+        try:
+            # Serializes writers across workers; a stale connection still writing makes the retry wait for it
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise UploadBusyError("Another request is writing to this upload; retry shortly")
+        stored = f.seek(0, os.SEEK_END)
+        if offset > stored:
+            raise OffsetError(stored, offset)
+        limit = upload["total_size"] if upload["total_size"] is not None else MAX_UPLOAD_BYTES
+        if length is not None and offset + length > limit:
+            raise ValueError(f"Chunk ends at {offset + length}, beyond the upload size {limit}")
+
+        # A retry of a chunk that partly arrived starts before the stored end: skip what is already here
+        skip = stored - offset
+        written = 0
+        try:
+            while True:
+                block = stream.read(READ_BLOCK)
+                if not block:
+                    break
+                if skip:
+                    dropped = min(skip, len(block))
+                    block, skip = block[dropped:], skip - dropped
+                if stored + written + len(block) > limit:
+                    raise ValueError(f"Upload exceeds its size of {limit} bytes")
+                f.write(block)
+                written += len(block)
+        finally:
+            # Keep whatever arrived, even when the client dropped mid-chunk
+            f.flush()
+            os.fsync(f.fileno())
+            _connect().execute("UPDATE uploads SET size = ?, updated_at = ? WHERE upload_id = ?",
+                               (stored + written, time.time(), upload_id))
+    return get_upload(upload_id)
+
+
+def complete_upload(upload_id):
+    """Publish a finished upload to VIDEO_DIR; completing twice returns the stored state"""
+    upload = get_upload(upload_id)
+    if upload is None:
+        raise KeyError(upload_id)
+    if upload["status"] == 'complete':
+        return upload
+    if upload["status"] != 'uploading':
+        raise ValueError(f"Upload is {upload['status']}")
+    if upload["total_size"] is not None and upload["size"] != upload["total_size"]:
+        raise OffsetError(upload["size"], upload["total_size"])
+
+    os.makedirs(VIDEO_DIR, exist_ok=True)
+    with open(_part_path(upload_id), 'rb') as f:
+        # Waits for a request still appending, so no chunk lands after the move
+        fcntl.flock(f, fcntl.LOCK_EX)
+        size = os.fstat(f.fileno()).st_size
+        os.replace(_part_path(upload_id), video_path(upload))
+    _connect().execute("UPDATE uploads SET status = 'complete', size = ?, updated_at = ? WHERE upload_id = ?",
+                       (size, time.time(), upload_id))
+    logger.info(f"Upload {upload_id} complete ({size} bytes)")
+    return get_upload(upload_id)
+
+
+def abort_upload(upload_id):
+    """Drop an upload and its data; returns False for unknown uploads"""
+    upload = get_upload(upload_id)
+    if upload is None:
+        return False
+    for path in (_part_path(upload_id), video_path(upload)):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    _connect().execute("DELETE FROM uploads WHERE upload_id = ?", (upload_id,))
+    return True
+
+
+def expire_uploads(max_age=None):
+    """Drop unfinished uploads that have not received data for max_age seconds"""
+    max_age = UPLOAD_EXPIRY_S if max_age is None else max_age
+    rows = _connect().execute("SELECT upload_id FROM uploads WHERE status = 'uploading' AND updated_at < ?",
+                              (time.time() - max_age,)).fetchall()
+    for row in rows:
+        abort_upload(row["upload_id"])
+    return len(rows)
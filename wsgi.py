@@ -0,0 +1,6 @@
+import os
+from app import create_app
+
+# gunicorn entry point (see gunicorn.conf.py). With preload_app the master builds this app,
+# warmed subsystems included, once; forked workers then share it copy-on-write.
+app = create_app(warm=os.environ.get('WARM_SUBSYSTEMS', '1') == '1')
@@ -0,0 +1,246 @@
+import os
+import time
+import zlib
+import struct
+import hashlib
+import threading
+from collections import OrderedDict, namedtuple
+from flask import Response, request
+from werkzeug.http import quote_header_value
+
+CHUNK_SIZE = 64 * 1024
+ZIP64_LIMIT = 0xFFFFFFFF
+ZIP64_COUNT_LIMIT = 0xFFFF
+CRC_CACHE_SIZE = int(os.environ.get('ZIP_CRC_CACHE_SIZE', 65536))  # files whose CRC is remembered
+
+# Every entry is written ZIP_STORED: screenshots are PNG/JPEG/WebP and would not shrink
+# further, and stored entries give a byte-exact layout we can compute (and seek into) upfront.
+# CRCs go in a data descriptor after each file (general purpose flag bit 3) and in the central
+# directory, so they are computed while the file streams instead of before the first byte.
+ZipEntry = namedtuple('ZipEntry', ['name', 'path', 'size', 'mtime_ns', 'dos_time', 'dos_date', 'offset', 'header',
+                                   'descriptor_size'])
+ZipPlan = namedtuple('ZipPlan', ['entries', 'central_offset', 'central_size', 'total_size', 'etag'])
+
+DATA_DESCRIPTOR = struct.Struct('<4s3L')
+DATA_DESCRIPTOR64 = struct.Struct('<4sL2Q')
+FLAG_DATA_DESCRIPTOR = 0x0008
+FLAG_UTF8 = 0x0800
+
+# (path, size, mtime_ns) -> crc32, so repeated and resumed downloads don't re-read files
+_crc_cache = OrderedDict()
+_crc_cache_lock = threading.Lock()
+
+
+def _remember_crc(key, crc):
+    with _crc_cache_lock:
+        _crc_cache[key] = crc
+        _crc_cache.move_to_end(key)
+        while len(_crc_cache) > CRC_CACHE_SIZE:
+            _crc_cache.popitem(last=False)
+
+
+def _file_crc(entry):
+    """CRC of an entry's file, read from disk unless remembered"""
+    key = (entry.path, entry.size, entry.mtime_ns)
+    with _crc_cache_lock:
+        crc = _crc_cache.get(key)
+        if crc is not None:
+            _crc_cache.move_to_end(key)
+            return crc
+    crc = 0
+    with open(entry.path, 'rb') as f:
+        _check_unchanged(entry, f)
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            crc = zlib.crc32(chunk, crc)
+    _remember_crc(key, crc)
+    return crc
+
+
+def _check_unchanged(entry, f):
+    st = os.fstat(f.fileno())
+    if st.st_size != entry.size or st.st_mtime_ns != entry.mtime_ns:
+        raise IOError(f"{entry.path} changed while it was being zipped")
+
+
+def _dos_datetime(mtime):
+    t = time.localtime(max(mtime, 315532800))  # ZIP can't represent dates before 1980
+    dos_time = (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+    dos_date = ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+    return dos_time, dos_date
+
+
+def _unique_name(name, used):
+    candidate, n = name, 1
+    while candidate in used:
+        stem, ext = os.path.splitext(name)
+        candidate = f"{stem}_{n}{ext}"
+        n += 1
+    used.add(candidate)
+    return candidate
+
+
+def _flags(name):
+    return FLAG_DATA_DESCRIPTOR | (0 if name.isascii() else FLAG_UTF8)
+
+
+def _descriptor(entry, crc):
+    if entry.descriptor_size == DATA_DESCRIPTOR64.size:
+        return DATA_DESCRIPTOR64.pack(b'PK\x07\x08', crc, entry.size, entry.size)
+    return DATA_DESCRIPTOR.pack(b'PK\x07\x08', crc, entry.size, entry.size)
+
+
+def _central_directory(entries, crcs, cd_offset):
+    """Central directory and end records; the same length whatever the CRC values"""
+    central = []
+    for entry, crc in zip(entries, crcs):
+        encoded_name = entry.name.encode('utf-8')
+        zip64_fields = []
+        size_field = entry.size
+        offset_field = entry.offset
+        if entry.size >= ZIP64_LIMIT:
+            zip64_fields += [entry.size, entry.size]
+            size_field = ZIP64_LIMIT
+        if entry.offset >= ZIP64_LIMIT:
+            zip64_fields.append(entry.offset)
+            offset_field = ZIP64_LIMIT
+        extra = struct.pack(f'<2H{len(zip64_fields)}Q', 0x0001, 8 * len(zip64_fields), *zip64_fields) if zip64_fields else b''
+        version = 45 if zip64_fields else 20
+
+        central.append(struct.pack('<4s6H3L5HLL', b'PK\x01\x02', version, version, _flags(entry.name), 0,
+                                   entry.dos_time, entry.dos_date, crc, size_field, size_field,
+                                   len(encoded_name), len(extra), 0, 0, 0, 0o644 << 16, offset_field)
+                       + encoded_name + extra)
+
+    central_directory = b''.join(central)
+    cd_size = len(central_directory)
+    count = len(entries)
+
+    if count >= ZIP64_COUNT_LIMIT or cd_offset >= ZIP64_LIMIT or cd_size >= ZIP64_LIMIT:
+        zip64_end = struct.pack('<4sQ2H2L4Q', b'PK\x06\x06', 44, 45, 45, 0, 0,
+                                count, count, cd_size, cd_offset)
+        locator = struct.pack('<4sLQL', b'PK\x06\x07', 0, cd_offset + cd_size, 1)
+        end = struct.pack('<4s4H2LH', b'PK\x05\x06', 0, 0, ZIP64_COUNT_LIMIT, ZIP64_COUNT_LIMIT,
+                          ZIP64_LIMIT, ZIP64_LIMIT, 0)
+        return central_directory + zip64_end + locator + end
+    return central_directory + struct.pack('<4s4H2LH', b'PK\x05\x06', 0, 0, count, count, cd_size, cd_offset, 0)
+
+
+def build_zip_plan(paths):
+    """Lay out a stored ZIP of paths from their metadata alone; returns a ZipPlan or None"""
+    entries = []
+    used_names = set()
+    offset = 0
+
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+
+        name = _unique_name(os.path.basename(path), used_names)
+        encoded_name = name.encode('utf-8')
+        dos_time, dos_date = _dos_datetime(st.st_mtime)
+
+        if st.st_size >= ZIP64_LIMIT:
+            extra = struct.pack('<2H2Q', 0x0001, 16, st.st_size, st.st_size)
+            size_field, version, descriptor_size = ZIP64_LIMIT, 45, DATA_DESCRIPTOR64.size
+        else:
+            extra = b''
+            size_field, version, descriptor_size = st.st_size, 20, DATA_DESCRIPTOR.size
+
+        # The CRC field stays zero; sizes are known, so streaming readers can still skip entries
+        header = struct.pack('<4s5H3L2H', b'PK\x03\x04', version, _flags(name), 0, dos_time, dos_date,
+                             0, size_field, size_field, len(encoded_name), len(extra)) + encoded_name + extra
+        entries.append(ZipEntry(name, path, st.st_size, st.st_mtime_ns, dos_time, dos_date, offset, header,
+                                descriptor_size))
+        offset += len(header) + st.st_size + descriptor_size
+
+    if not entries:
+        return None
+
+    central_size = len(_central_directory(entries, [0] * len(entries), offset))
+    # The ETag identifies the exact byte layout (and the file versions in it), so If-Range resumes are safe
+    digest = hashlib.sha1(repr([(entry.name, entry.size, entry.mtime_ns) for entry in entries]).encode()).hexdigest()
+    return ZipPlan(entries, offset, central_size, offset + central_size, digest)
+
+
+def iter_zip(plan, start=0, stop=None):
+    """Yield the bytes of plan in [start, stop), reading each file from disk in chunks"""
+    stop = plan.total_size if stop is None else stop
+    crcs = {}  # entry index -> CRC of a file streamed whole by this response
+
+    def crc_of(index):
+        crc = crcs.get(index)
+        return _file_crc(plan.entries[index]) if crc is None else crc
+
+    def segments():
+        # (start, length, bytes producer or None, index of the entry whose file this is)
+        for index, entry in enumerate(plan.entries):
+            data_start = entry.offset + len(entry.header)
+            yield entry.offset, len(entry.header), lambda entry=entry: entry.header, index
+            yield data_start, entry.size, None, index
+            yield (data_start + entry.size, entry.descriptor_size,
+                   lambda entry=entry, index=index: _descriptor(entry, crc_of(index)), index)
+        yield (plan.central_offset, plan.central_size,
+               lambda: _central_directory(plan.entries, [crc_of(i) for i in range(len(plan.entries))],
+                                          plan.central_offset), None)
+
+    for seg_start, seg_len, produce, index in segments():
+        seg_end = seg_start + seg_len
+        if seg_end <= start:
+            continue
+        if seg_start >= stop:
+            break
+
+        lo = max(start, seg_start) - seg_start
+        hi = min(stop, seg_end) - seg_start
+        if produce is not None:
+            yield produce()[lo:hi]
+            continue
+
+        entry = plan.entries[index]
+        whole = lo == 0 and hi == entry.size
+        crc = 0
+        with open(entry.path, 'rb') as f:
+            _check_unchanged(entry, f)
+            f.seek(lo)
+            remaining = hi - lo
+            while remaining > 0:
+                chunk = f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    raise IOError(f"{entry.path} shrank while it was being zipped")
+                remaining -= len(chunk)
+                if whole:
+                    crc = zlib.crc32(chunk, crc)
+                yield chunk
+        if whole:
+            crcs[index] = crc
+            _remember_crc((entry.path, entry.size, entry.mtime_ns), crc)
+
+
+def zip_response(plan, download_name):
+    """Stream plan as an attachment, honouring Range/If-Range so interrupted downloads can resume"""
+    headers = {
+        'Content-Disposition': f'attachment; filename={quote_header_value(download_name, allow_token=False)}',
+        'Accept-Ranges': 'bytes',
+    }
+    start, stop, status = 0, plan.total_size, 200
+
+    if_range = request.if_range
+    # A stale If-Range (different layout, or a date we can't compare) falls back to the full body
+    range_valid = if_range.etag == plan.etag if (if_range.etag or if_range.date) else True
+    # Multipart byteranges are not produced; several ranges get the whole body instead
+    if request.range and len(request.range.ranges) == 1 and range_valid:
+        byte_range = request.range.range_for_length(plan.total_size)
+        if byte_range is None:
+            headers['Content-Range'] = f'bytes */{plan.total_size}'
+            return Response(status=416, headers=headers)
+        start, stop = byte_range
+        headers['Content-Range'] = f'bytes {start}-{stop - 1}/{plan.total_size}'
+        status = 206
+
+    headers['Content-Length'] = str(stop - start)
+    response = Response(iter_zip(plan, start, stop), status=status, headers=headers,
+                        mimetype='application/zip', direct_passthrough=True)
+    response.set_etag(plan.etag)
+    return response